@@ -0,0 +1,251 @@
+"""
+Load test: both FastAPI apps, with a stored baseline to catch regressions.
+
+Drives `main.py` and `youtube/main.py` through an in-process ASGI
+transport (no sockets, no server) with `--concurrency` closed-loop
+clients.  Each app runs two workloads:
+
+    read    list a page of items / fetch one item by ID
+    mixed   the same reads plus `--write-ratio` creates and updates
+
+Every scenario reports requests per second and p50/p95/p99 latency.
+`--baseline` compares the run against a stored JSON file and exits with
+status 1 when any scenario is worse than `--threshold` (default 25%):
+throughput lower, a latency percentile higher, or any error response.
+Each metric is the best of `--rounds` runs.  `--save` writes the
+current run as the new baseline.  Baselines are machine-specific - record
+one on the machine that runs the comparison.
+
+Run with:
+    python bench_apps.py --requests 2000 --concurrency 32 \\
+        --baseline bench_baseline.json
+"""
+
+import argparse
+import asyncio
+import importlib
+import json
+import os
+import random
+import sys
+import time
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Dict, List, Tuple
+
+import httpx
+
+from metrics import LatencyHistogram
+
+SEED_ITEMS = 1000
+PERCENTILES = (("p50_ms", 0.5), ("p95_ms", 0.95), ("p99_ms", 0.99))
+
+Op = Callable[[httpx.AsyncClient, random.Random], Awaitable[httpx.Response]]
+
+
+@dataclass
+class Scenario:
+    name: str
+    app: object
+    reset: Callable[[], None]  # fresh, seeded store before each run
+    reads: List[Op]
+    writes: List[Op]
+
+
+# -- the two apps -----------------------------------------------------------
+
+
+def load_main():
+    import main
+
+    # One synthetic client would trip the per-client rate limit; measure
+    # the app, keep its load shedding.
+    main.limiter.client_limit = None
+
+    def reset():
+        main.items = main.ItemStore()
+        main.items.add_many(main.Item(text=f"item {i}", is_done=i % 3 == 0)
+                            for i in range(SEED_ITEMS))
+
+    reads = [
+        lambda c, r: c.get("/items", params={"limit": 20}),
+        lambda c, r: c.get(f"/items/{r.randrange(SEED_ITEMS)}"),
+        lambda c, r: c.get("/items", params={"limit": 20, "prefix": "item 1"}),
+    ]
+    writes = [
+        lambda c, r: c.post("/items", json={"text": f"new {r.random()}"[:60]}),
+    ]
+    return main.app, reset, reads, writes
+
+
+def load_youtube():
+    # Both apps are called `main`; the tutorial's lives in the `youtube`
+    # package, so it imports as `youtube.main` and cannot shadow ours.
+    youtube = importlib.import_module("youtube.main")
+
+    def reset():
+        youtube.items = youtube.TombstoneStore()
+        for i in range(SEED_ITEMS):
+            youtube.items.append(youtube.Item(text=f"item {i}"))
+
+    reads = [
+        lambda c, r: c.get("/items", params={"limit": 20}),
+        lambda c, r: c.get(f"/items/{r.randrange(SEED_ITEMS)}"),
+    ]
+    writes = [
+        lambda c, r: c.post("/items", params={"is_done": False},
+                            json={"text": f"new {r.random()}"}),
+        lambda c, r: c.put(f"/update-item/{r.randrange(SEED_ITEMS)}",
+                           params={"is_done": True}),
+    ]
+    return youtube.app, reset, reads, writes
+
+
+def scenarios(write_ratio: float) -> List[Tuple[Scenario, float]]:
+    found = []
+    for app_name, loader in (("main", load_main), ("youtube", load_youtube)):
+        app, reset, reads, writes = loader()
+        for mix, ratio in (("read", 0.0), ("mixed", write_ratio)):
+            found.append((Scenario(f"{app_name}-{mix}", app, reset, reads,
+                                   writes), ratio))
+    return found
+
+
+# -- running ----------------------------------------------------------------
+
+
+async def run(scenario: Scenario, write_ratio: float, requests: int,
+              concurrency: int, seed: int) -> Dict[str, float]:
+    scenario.reset()
+    latency = LatencyHistogram()
+    errors = 0
+    remaining = iter(range(requests))
+
+    async def client_loop(client: httpx.AsyncClient, rng: random.Random):
+        nonlocal errors
+        for _ in remaining:
+            ops = scenario.writes if rng.random() < write_ratio else \
+                scenario.reads
+            start = time.perf_counter_ns()
+            response = await rng.choice(ops)(client, rng)
+            latency.record((time.perf_counter_ns() - start) // 1000)
+            if response.status_code >= 400:
+                errors += 1
+
+    transport = httpx.ASGITransport(app=scenario.app)
+    async with scenario.app.router.lifespan_context(scenario.app):
+        async with httpx.AsyncClient(transport=transport,
+                                     base_url="http://bench") as client:
+            # Warm-up: route compilation, serializer caches, first imports.
+            for op in scenario.reads + scenario.writes:
+                await op(client, random.Random(seed))
+            scenario.reset()
+            start = time.perf_counter()
+            await asyncio.gather(*(
+                client_loop(client, random.Random(seed + n))
+                for n in range(concurrency)))
+            elapsed = time.perf_counter() - start
+    result = {"rps": round(requests / elapsed, 1), "errors": errors}
+    q = latency.quantiles([q for _, q in PERCENTILES])
+    for key, quantile in PERCENTILES:
+        result[key] = round(q[quantile] / 1000, 3)
+    return result
+
+
+def best_of(rounds: List[Dict[str, float]]) -> Dict[str, float]:
+    """Best value of every metric across rounds.
+
+    Scheduler noise only ever makes a round slower, so the best round is
+    the most repeatable estimate - what keeps a baseline comparison from
+    failing on one unlucky run.
+    """
+    best = {"rps": max(r["rps"] for r in rounds),
+            "errors": max(r["errors"] for r in rounds)}
+    for key, _ in PERCENTILES:
+        best[key] = min(r[key] for r in rounds)
+    return best
+
+
+# -- baseline comparison ----------------------------------------------------
+
+
+def compare(current: Dict[str, Dict[str, float]],
+            baseline: Dict[str, Dict[str, float]],
+            threshold: float) -> List[str]:
+    """Human-readable regressions; empty when the run is within threshold."""
+    regressions = []
+    for name, now in current.items():
+        before = baseline.get(name)
+        if before is None:
+            continue  # new scenario: nothing to compare with yet
+        if now["rps"] < before["rps"] * (1 - threshold):
+            regressions.append(f"{name}: rps {before['rps']} -> {now['rps']}")
+        for key, _ in PERCENTILES:
+            if now[key] > before[key] * (1 + threshold):
+                regressions.append(
+                    f"{name}: {key} {before[key]} -> {now[key]}")
+        if now.get("errors"):
+            regressions.append(f"{name}: {now['errors']} error responses")
+    return regressions
+
+
+def report(name: str, result: Dict[str, float],
+           before: Dict[str, float] = None) -> None:
+    line = (f"{name:<14} {result['rps']:9.1f} req/s  "
+            + "  ".join(f"{key[:3]}={result[key]:7.3f}ms"
+                        for key, _ in PERCENTILES)
+            + f"  errors={result['errors']}")
+    if before:
+        line += f"   (baseline {before['rps']:.1f} req/s, " \
+                f"p99 {before['p99_ms']:.3f}ms)"
+    print(line)
+
+
+async def amain(args) -> int:
+    os.environ.setdefault("CPU_POOL_WORKERS", "1")  # main's lifespan pool
+    settings = {"requests": args.requests, "concurrency": args.concurrency,
+                "write_ratio": args.write_ratio}
+    baseline = {}
+    if args.baseline and os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            stored = json.load(f)
+        if stored["settings"] != settings:
+            print(f"baseline was recorded with {stored['settings']}; "
+                  f"rerun with the same settings to compare")
+            return 2
+        baseline = stored["scenarios"]
+
+    current = {}
+    for scenario, ratio in scenarios(args.write_ratio):
+        if args.only and scenario.name not in args.only:
+            continue
+        rounds = [await run(scenario, ratio, args.requests, args.concurrency,
+                            args.seed) for _ in range(args.rounds)]
+        current[scenario.name] = best_of(rounds)
+        report(scenario.name, current[scenario.name],
+               baseline.get(scenario.name))
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump({"settings": settings, "scenarios": current}, f,
+                      indent=2, sort_keys=True)
+            f.write("\n")
+        print(f"baseline written to {args.save}")
+
+    regressions = compare(current, baseline, args.threshold)
+    for regression in regressions:
+        print(f"REGRESSION {regression}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--write-ratio", type=float, default=0.2)
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--only", nargs="*", help="scenario names to run")
+    parser.add_argument("--baseline", help="JSON file to compare against")
+    parser.add_argument("--threshold", type=float, default=0.25)
+    parser.add_argument("--save", help="write this run as a baseline")
+    sys.exit(asyncio.run(amain(parser.parse_args())))
@@ -0,0 +1,82 @@
+"""
+Benchmark: event-loop responsiveness while CPU-bound work runs.
+
+Checks `--numbers` large odd integers for primality (the `/primes`
+workload) three ways while a heartbeat task wakes every millisecond and
+records how late it woke up:
+
+    inline        check_primes() called straight from the coroutine
+    to_thread     asyncio.to_thread - off the loop, but still under the GIL
+    process pool  CPUPool.map over chunks, as the endpoint does
+
+Heartbeat lag is what every other request on the loop would have seen.
+
+Run with:
+    python bench_cpu_pool.py --numbers 200000 --workers 4
+"""
+
+import argparse
+import asyncio
+import random
+import time
+
+from cpu_pool import CPUPool
+from metrics import LatencyHistogram
+from primes import check_primes
+
+CHUNK = 2_000
+
+
+async def heartbeat(histogram: LatencyHistogram, stop: asyncio.Event) -> None:
+    while not stop.is_set():
+        due = time.perf_counter() + 0.001
+        await asyncio.sleep(0.001)
+        histogram.record(max(0, int((time.perf_counter() - due) * 1e6)))
+
+
+async def measure(label: str, job) -> None:
+    lag = LatencyHistogram()
+    stop = asyncio.Event()
+    beat = asyncio.ensure_future(heartbeat(lag, stop))
+    await asyncio.sleep(0.01)
+    start = time.perf_counter()
+    await job()
+    elapsed = time.perf_counter() - start
+    stop.set()
+    await beat
+    q = lag.quantiles((0.5, 0.99, 1.0))
+    print(f"{label:<13} job={elapsed * 1000:8.1f} ms  heartbeats={lag.count:6d}  "
+          f"lag p50={q[0.5] / 1000:6.2f} ms  p99={q[0.99] / 1000:8.2f} ms  "
+          f"max={q[1.0] / 1000:8.2f} ms")
+
+
+async def amain(args) -> None:
+    rng = random.Random(0)
+    numbers = [rng.randrange(2**40, 2**41) | 1 for _ in range(args.numbers)]
+    chunks = [(numbers[i:i + CHUNK],) for i in range(0, len(numbers), CHUNK)]
+
+    async def inline():
+        check_primes(numbers)
+
+    async def threaded():
+        await asyncio.to_thread(check_primes, numbers)
+
+    pool = await CPUPool(max_workers=args.workers, max_pending=len(chunks),
+                         warm_up_module="primes").start()
+
+    async def pooled():
+        await pool.map(check_primes, chunks)
+
+    try:
+        await measure("inline", inline)
+        await measure("to_thread", threaded)
+        await measure("process pool", pooled)
+    finally:
+        pool.shutdown()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--numbers", type=int, default=200_000)
+    parser.add_argument("--workers", type=int, default=4)
+    asyncio.run(amain(parser.parse_args()))
@@ -0,0 +1,70 @@
+"""
+Benchmark: per-request overhead of `MetricsMiddleware`.
+
+Calls a trivial ASGI app directly (no HTTP, no routing) with and without
+the middleware wrapped around it, so the difference is the middleware's
+own cost: two `perf_counter_ns` calls, a wrapped `send` and one histogram
+record.
+
+Run with:
+    python bench_metrics.py --requests 200000
+"""
+
+import argparse
+import asyncio
+import time
+
+from metrics import LatencyHistogram, MetricsMiddleware, MetricsRegistry
+
+
+class FakeRoute:
+    path_format = "/items/{item_id}"
+
+
+async def bare_app(scope, receive, send):
+    scope["route"] = FakeRoute
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b"{}"})
+
+
+async def receive():
+    return {"type": "http.request", "body": b"", "more_body": False}
+
+
+async def send(message):
+    pass
+
+
+async def per_request_ns(app, n: int) -> float:
+    scope = {"type": "http", "method": "GET", "path": "/items/1"}
+    start = time.perf_counter_ns()
+    for _ in range(n):
+        await app(scope, receive, send)
+    return (time.perf_counter_ns() - start) / n
+
+
+def record_ns(n: int) -> float:
+    histogram = LatencyHistogram()
+    start = time.perf_counter_ns()
+    for i in range(n):
+        histogram.record(i & 0xFFFF)
+    return (time.perf_counter_ns() - start) / n
+
+
+async def main(n: int, rounds: int) -> None:
+    wrapped = MetricsMiddleware(bare_app, MetricsRegistry())
+    # Best of several rounds to keep scheduler noise out of the numbers.
+    bare = min([await per_request_ns(bare_app, n) for _ in range(rounds)])
+    timed = min([await per_request_ns(wrapped, n) for _ in range(rounds)])
+    print(f"bare app             {bare / 1000:6.2f} µs/request")
+    print(f"with MetricsMiddleware {timed / 1000:6.2f} µs/request")
+    print(f"middleware overhead  {(timed - bare) / 1000:6.2f} µs/request")
+    print(f"histogram.record     {record_ns(n) / 1000:6.2f} µs/call")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--requests", type=int, default=200_000)
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+    asyncio.run(main(args.requests, args.rounds))
@@ -0,0 +1,145 @@
+"""
+Benchmark: per-request `httpx.AsyncClient` vs the shared `Scraper` pool.
+
+Starts a tiny keep-alive HTTP/1.1 server on localhost (in its own thread
+and event loop, so it does not compete with the client loop), then fires
+N concurrent "scrapes" of a few URLs each and reports how many TCP
+connections the server saw plus p50/p99 latency per scrape.
+
+Run with:
+    python bench_scrape.py --scrapes 1000 --urls-per-scrape 5
+"""
+
+import argparse
+import asyncio
+import statistics
+import threading
+import time
+from typing import Callable, List
+
+import httpx
+
+from scrape_pool import Scraper
+
+
+class StandInServer:
+    """Minimal HTTP/1.1 server that honours keep-alive and counts sockets."""
+
+    def __init__(self, delay: float = 0.005) -> None:
+        self.delay = delay
+        self.connections = 0
+        self.requests = 0
+        self.port = 0
+        self._ready = threading.Event()
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def __enter__(self) -> "StandInServer":
+        self._thread.start()
+        self._ready.wait()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        asyncio.run_coroutine_threadsafe(self._shutdown(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+
+    def _run(self) -> None:
+        asyncio.set_event_loop(self._loop)
+        self._server = self._loop.run_until_complete(
+            asyncio.start_server(self._handle, "127.0.0.1", 0, backlog=4096))
+        self.port = self._server.sockets[0].getsockname()[1]
+        self._ready.set()
+        self._loop.run_forever()
+
+    async def _shutdown(self) -> None:
+        self._server.close()
+        tasks = [t for t in asyncio.all_tasks() if t is not asyncio.current_task()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def _handle(self, reader, writer) -> None:
+        self.connections += 1
+        try:
+            while True:
+                head = await reader.readuntil(b"\r\n\r\n")
+                if not head:
+                    break
+                self.requests += 1
+                await asyncio.sleep(self.delay)
+                body = b"<html>" + head.split(b" ", 2)[1] + b"</html>"
+                writer.write(b"HTTP/1.1 200 OK\r\nContent-Length: %d\r\n"
+                             b"Connection: keep-alive\r\n\r\n%s"
+                             % (len(body), body))
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError,
+                asyncio.CancelledError):
+            pass  # client went away, or we are shutting down
+        finally:
+            writer.close()
+
+
+async def per_request_client(urls: List[str]) -> List[str]:
+    """The original `fetch_many`: new client, unbounded gather."""
+    async with httpx.AsyncClient() as session:
+        async def one(url):
+            resp = await session.get(url, timeout=10)
+            resp.raise_for_status()
+            return resp.text[:80]
+        return await asyncio.gather(*(one(u) for u in urls))
+
+
+async def run(label: str, fetch: Callable, server: StandInServer,
+              scrapes: int, urls_per_scrape: int, distinct: int) -> None:
+    base = f"http://127.0.0.1:{server.port}"
+    jobs = [[f"{base}/page/{(i * urls_per_scrape + j) % distinct}"
+             for j in range(urls_per_scrape)] for i in range(scrapes)]
+    latencies: List[float] = []
+
+    async def timed(urls):
+        start = time.perf_counter()
+        await fetch(urls)
+        latencies.append(time.perf_counter() - start)
+
+    conns, reqs = server.connections, server.requests
+    start = time.perf_counter()
+    await asyncio.gather(*(timed(urls) for urls in jobs))
+    wall = time.perf_counter() - start
+    latencies.sort()
+    p99 = latencies[int(len(latencies) * 0.99) - 1]
+    print(f"{label:<20} wall={wall:6.2f}s "
+          f"p50={statistics.median(latencies) * 1e3:7.1f}ms "
+          f"p99={p99 * 1e3:7.1f}ms "
+          f"upstream_requests={server.requests - reqs:6d} "
+          f"tcp_connections={server.connections - conns:6d}")
+
+
+async def main(args) -> None:
+    with StandInServer(delay=args.delay) as server:
+        if not args.skip_baseline:
+            await run("per-request client", per_request_client, server,
+                      args.scrapes, args.urls_per_scrape, args.distinct)
+        scraper = Scraper(max_connections=args.max_connections,
+                          max_per_host=args.max_per_host)
+        try:
+            await run("shared Scraper", scraper.fetch_many, server,
+                      args.scrapes, args.urls_per_scrape, args.distinct)
+        finally:
+            await scraper.aclose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--scrapes", type=int, default=1000)
+    parser.add_argument("--urls-per-scrape", type=int, default=5)
+    parser.add_argument("--distinct", type=int, default=200,
+                        help="number of distinct upstream URLs")
+    parser.add_argument("--delay", type=float, default=0.005,
+                        help="upstream response delay in seconds")
+    parser.add_argument("--max-connections", type=int, default=100)
+    parser.add_argument("--max-per-host", type=int, default=10,
+                        help="per upstream host; the stand-in is one host")
+    parser.add_argument("--skip-baseline", action="store_true",
+                        help="only run the shared Scraper")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,90 @@
+"""
+Benchmark: tail latency under overload, with and without load shedding.
+
+An in-process app whose handler needs one of `--capacity` slots of a
+backend (think database connections) for `--service-ms`.  Requests arrive
+open-loop - on a fixed schedule, whether or not earlier ones finished -
+at `--overload` times what the backend can serve.  Latency is measured
+from each request's scheduled arrival, so queueing time is included.
+
+Without protection the backlog grows for the whole run and so does
+everyone's latency.  With `RateLimitMiddleware` in front, excess requests
+are shed with 503 and the admitted ones wait at most `max_queue_delay`.
+
+Run with:
+    python bench_shedding.py --seconds 5 --overload 2
+"""
+
+import argparse
+import asyncio
+import time
+
+import httpx
+from fastapi import FastAPI
+
+from metrics import LatencyHistogram
+from ratelimit import Limiter, RateLimitMiddleware
+
+
+def make_app(capacity: int, service: float, limiter) -> FastAPI:
+    bench_app = FastAPI()
+    backend = asyncio.Semaphore(capacity)
+
+    @bench_app.get("/work")
+    async def work():
+        async with backend:
+            await asyncio.sleep(service)
+        return {}
+
+    if limiter is not None:
+        bench_app.add_middleware(RateLimitMiddleware, limiter=limiter)
+    return bench_app
+
+
+async def run(label: str, limiter, args) -> None:
+    service = args.service_ms / 1000
+    rate = args.overload * args.capacity / service  # arrivals per second
+    total = int(rate * args.seconds)
+    bench_app = make_app(args.capacity, service, limiter)
+    latency = LatencyHistogram()
+    statuses = {}
+
+    async def one(client, due: float) -> None:
+        r = await client.get("/work")
+        statuses[r.status_code] = statuses.get(r.status_code, 0) + 1
+        if r.status_code == 200:
+            latency.record(int((time.perf_counter() - due) * 1e6))
+
+    transport = httpx.ASGITransport(app=bench_app)
+    async with httpx.AsyncClient(transport=transport,
+                                 base_url="http://bench") as client:
+        start = time.perf_counter()
+        tasks = []
+        for i in range(total):
+            due = start + i / rate
+            delay = due - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            tasks.append(asyncio.ensure_future(one(client, due)))
+        await asyncio.gather(*tasks)
+    q = latency.quantiles((0.5, 0.99))
+    print(f"{label:<16} admitted={statuses.get(200, 0):6d} "
+          f"shed={statuses.get(503, 0):6d}  "
+          f"p50={q[0.5] / 1000:8.1f} ms  p99={q[0.99] / 1000:8.1f} ms")
+
+
+async def amain(args) -> None:
+    await run("unprotected", None, args)
+    limiter = Limiter(max_concurrency=args.capacity, max_queue=4 * args.capacity,
+                      max_queue_delay=args.max_queue_delay)
+    await run("load shedding", limiter, args)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--seconds", type=float, default=5)
+    parser.add_argument("--capacity", type=int, default=32)
+    parser.add_argument("--service-ms", type=float, default=100)
+    parser.add_argument("--overload", type=float, default=2.0)
+    parser.add_argument("--max-queue-delay", type=float, default=0.1)
+    asyncio.run(amain(parser.parse_args()))
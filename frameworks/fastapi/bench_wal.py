@@ -0,0 +1,63 @@
+"""
+Benchmark: group commit vs one fsync per write.
+
+Drives `POST /items` on the demo app through an in-process ASGI transport
+with N concurrent writers and a write-ahead log at durability `fsync`.
+The baseline caps every flush at one record (`max_batch=1`), which is what
+"fsync per request" costs; the group-commit run lets the flusher take
+everything that queued up while the previous fsync was running.
+
+Run with:
+    python bench_wal.py --writes 2000 --concurrency 64
+"""
+
+import argparse
+import asyncio
+import tempfile
+import time
+
+import httpx
+
+import main
+from item_store import ItemStore
+from wal import Durability, WriteAheadLog
+
+
+async def run(label: str, max_batch: int, writes: int,
+              concurrency: int) -> None:
+    with tempfile.TemporaryDirectory() as directory:
+        main.items = ItemStore()
+        log = WriteAheadLog(directory, Durability.FSYNC, max_batch=max_batch)
+        main.app.state.item_log = log.start()
+        # Measure the log, not the overload protection in front of it.
+        main.limiter.client_limit = main.limiter.max_concurrency = None
+        transport = httpx.ASGITransport(app=main.app)
+        queue = iter(range(writes))
+
+        async def writer(client):
+            for i in queue:
+                r = await client.post("/items", json={"text": f"item {i}"})
+                r.raise_for_status()
+
+        async with httpx.AsyncClient(transport=transport,
+                                     base_url="http://bench") as client:
+            start = time.perf_counter()
+            await asyncio.gather(*(writer(client) for _ in range(concurrency)))
+            elapsed = time.perf_counter() - start
+        log.close()
+        main.app.state.item_log = None
+    print(f"{label:<18} {writes / elapsed:8.0f} writes/s  "
+          f"fsyncs={log.flushes:5d}  "
+          f"records/fsync={writes / max(log.flushes, 1):6.1f}")
+
+
+async def amain(args) -> None:
+    await run("fsync per write", 1, args.writes, args.concurrency)
+    await run("group commit", 4096, args.writes, args.concurrency)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--writes", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=64)
+    asyncio.run(amain(parser.parse_args()))
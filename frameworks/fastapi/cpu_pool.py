@@ -0,0 +1,154 @@
+"""
+Process pool for CPU-bound work
+===============================
+`async def` only helps while a handler is *waiting*.  A handler that
+computes for 200 ms holds the event loop for 200 ms, and every other
+request - health checks included - waits behind it.  Threads do not fix
+that either: the GIL lets one thread run Python bytecode at a time.
+
+`CPUPool` is an app-scoped `ProcessPoolExecutor` with the pieces a
+server needs around it:
+
+* **warm-up** - `start()` spawns every worker and has it import the job
+  module up front, so the first request does not pay process start-up;
+* **bounded queue** - at most `max_pending` chunks may be queued or
+  running; beyond that `submit` raises `PoolBusyError` at once (answer
+  503) instead of letting a backlog build up in the executor;
+* **async API** - `run(fn, *args)` and `map(fn, chunks)` are awaitables,
+  the event loop stays free while workers compute;
+* **cancellation** - cancelling the awaiting coroutine cancels every chunk
+  that has not started yet.  A chunk already running in a worker cannot
+  be interrupted, which is why `map` takes work in chunks: a disconnect
+  wastes at most one chunk per worker.  `cancel_on_disconnect` turns a
+  client disconnect into exactly that cancellation.
+
+Workers use the "spawn" start method: forking a process that already runs
+threads (the WAL flusher, the threadpool) can copy locks in a held state.
+"""
+
+import asyncio
+import multiprocessing
+import os
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Any, Awaitable, Callable, Iterable, List, Optional, TypeVar
+
+from fastapi import Request
+
+R = TypeVar("R")
+
+
+class PoolBusyError(Exception):
+    """The pool already has `max_pending` chunks queued or running."""
+
+
+class ClientDisconnected(Exception):
+    """The client went away before the job finished; the job was cancelled."""
+
+
+def _warm_up(module: Optional[str]) -> int:
+    if module:
+        __import__(module)
+    return os.getpid()
+
+
+class CPUPool:
+    """App-scoped process pool with a bounded queue and async submission."""
+
+    def __init__(self, *, max_workers: Optional[int] = None,
+                 max_pending: Optional[int] = None,
+                 warm_up_module: Optional[str] = None) -> None:
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.max_pending = max_pending or self.max_workers * 4
+        self.warm_up_module = warm_up_module
+        self.pending = 0
+        self.rejected = 0
+        self._executor: Optional[ProcessPoolExecutor] = None
+
+    async def start(self) -> "CPUPool":
+        self._executor = ProcessPoolExecutor(
+            max_workers=self.max_workers,
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+        # One task per worker, all in flight together, so every worker has
+        # to be spawned (the executor only spawns on demand).
+        futures = [self._executor.submit(_warm_up, self.warm_up_module)
+                   for _ in range(self.max_workers)]
+        await asyncio.gather(*(asyncio.wrap_future(f) for f in futures))
+        return self
+
+    def submit(self, fn: Callable[..., R], *args: Any) -> "Future[R]":
+        """Queue one chunk; raises PoolBusyError when the queue is full."""
+        if self._executor is None:
+            raise RuntimeError("CPUPool.start() has not been awaited")
+        if self.pending >= self.max_pending:
+            self.rejected += 1
+            raise PoolBusyError(f"{self.pending} jobs already queued")
+        self.pending += 1
+        future = self._executor.submit(fn, *args)
+        # Runs in the executor's thread; a bare `-= 1` on an int is not
+        # atomic, so hop back onto the loop to do it.
+        loop = asyncio.get_running_loop()
+        future.add_done_callback(
+            lambda _: loop.call_soon_threadsafe(self._done))
+        return future
+
+    async def run(self, fn: Callable[..., R], *args: Any) -> R:
+        return (await self.map(fn, [args]))[0]
+
+    async def map(self, fn: Callable[..., R],
+                  arg_tuples: Iterable[tuple]) -> List[R]:
+        """Run `fn(*args)` for every tuple in parallel, results in order.
+
+        All chunks are admitted or none is: a request is never left
+        half-queued when the pool is busy.
+        """
+        arg_tuples = list(arg_tuples)
+        if self.pending + len(arg_tuples) > self.max_pending:
+            self.rejected += 1
+            raise PoolBusyError(f"{self.pending} jobs already queued")
+        futures = [self.submit(fn, *args) for args in arg_tuples]
+        try:
+            return await asyncio.gather(
+                *(asyncio.wrap_future(f) for f in futures))
+        except BaseException:
+            for f in futures:
+                f.cancel()  # no-op for chunks already running or done
+            raise
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+
+    def _done(self) -> None:
+        self.pending -= 1
+
+
+async def cancel_on_disconnect(request: Request, job: Awaitable[R]) -> R:
+    """
+    Await `job`, cancelling it if the client disconnects first.
+
+    Starlette does not cancel a handler when its client goes away, so we
+    listen for `http.disconnect` ourselves.  Only for requests whose body
+    has already been read: we consume the remaining receive messages.
+    """
+    job_task = asyncio.ensure_future(job)
+    watcher = asyncio.ensure_future(_wait_for_disconnect(request))
+    try:
+        await asyncio.wait({job_task, watcher},
+                           return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        watcher.cancel()
+        if not job_task.done():
+            job_task.cancel()  # disconnected, or we were cancelled
+            await asyncio.gather(job_task, return_exceptions=True)
+            if not watcher.cancelled() and watcher.done():
+                raise ClientDisconnected()
+    return job_task.result()
+
+
+async def _wait_for_disconnect(request: Request) -> None:
+    while True:
+        message = await request.receive()
+        if message["type"] == "http.disconnect":
+            return
@@ -0,0 +1,79 @@
+"""
+Fast response serialization
+===========================
+When a handler returns data for a `response_model` route, FastAPI runs it
+through the full pipeline on every request: validate the return value
+against the response model (re-checking objects that are *already* model
+instances), convert it to plain Python with `jsonable_encoder`, and only
+then `json.dumps` it.
+
+For data we built ourselves - items that came out of our own store - all
+of that is redundant.  `json_response` is the opt-in fast path:
+
+* one pydantic-core serializer is compiled per response type and cached
+  (`serializer_for`),
+* trusted instances are serialized as-is, no validation pass,
+* the serializer writes JSON bytes, which go straight into the response.
+
+Keep `response_model=` on the route: it still drives the OpenAPI schema,
+it just no longer runs at request time once the handler returns a
+`Response`.
+
+`validator_for` is the inbound twin: one compiled `JSON bytes -> objects`
+validator per type, used to check bulk-ingested items line by line.
+"""
+
+import functools
+import json
+from typing import Any, Callable, Mapping, Optional
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import Response
+
+try:
+    from pydantic import TypeAdapter
+except ImportError:  # pydantic v1: no compiled serializers
+    from pydantic import parse_obj_as
+    TypeAdapter = None
+
+
+@functools.lru_cache(maxsize=None)
+def serializer_for(tp: Any) -> Callable[[Any], bytes]:
+    """Return a cached `obj -> JSON bytes` function for type `tp`."""
+    if TypeAdapter is not None:
+        return TypeAdapter(tp).dump_json
+
+    def dump(obj: Any) -> bytes:
+        return json.dumps(jsonable_encoder(obj),
+                          separators=(",", ":")).encode()
+    return dump
+
+
+@functools.lru_cache(maxsize=None)
+def validator_for(tp: Any) -> Callable[[bytes], Any]:
+    """Return a cached `JSON bytes -> validated tp` function.
+
+    Bad input raises `ValueError` (pydantic's `ValidationError` is one).
+    """
+    if TypeAdapter is not None:
+        return TypeAdapter(tp).validate_json
+
+    def load(data: bytes) -> Any:
+        return parse_obj_as(tp, json.loads(data))
+    return load
+
+
+class TrustedJSONResponse(Response):
+    """A JSON response whose body was serialized ahead of time."""
+
+    media_type = "application/json"
+
+    def render(self, content: bytes) -> bytes:
+        return content
+
+
+def json_response(obj: Any, tp: Any, *, status_code: int = 200,
+                  headers: Optional[Mapping[str, str]] = None) -> Response:
+    """Serialize `obj` (already an instance of `tp`) without re-validation."""
+    return TrustedJSONResponse(serializer_for(tp)(obj),
+                               status_code=status_code, headers=headers)
@@ -0,0 +1,88 @@
+"""
+Conditional GETs and a serialized-page cache
+============================================
+Polling clients ask for the same list over and over, and each time we
+would page the store and serialize every item again just to send bytes
+the client already has.
+
+ETags from versions, not hashes
+-------------------------------
+The item stores count their writes (`version`) and remember which write
+last touched each item (`get_versioned`).  Identical version, identical
+data - so the ETag can be built from the version *before* any data is
+read, instead of hashing a freshly serialized body:
+
+    list   "<generation>-<store version>"   changes on any write
+    item   "<generation>-<item version>"    changes when that item does
+
+`generation` is random per store, so a restarted in-memory store (whose
+counter starts at zero again) never reissues an old tag.  A matching
+`If-None-Match` gets `304 Not Modified` with no paging and no
+serialization at all.
+
+Serialized pages
+----------------
+`PageCache` keeps the finished JSON bytes of recent list pages keyed by
+their query.  Every entry is tagged with the store version it was built
+at; a lookup under any other version is a miss, so a write invalidates
+the whole cache without any explicit hook in the write paths.
+"""
+
+from collections import OrderedDict
+from typing import Hashable, NamedTuple, Optional
+
+from fastapi import Request
+
+
+def make_etag(generation: str, version: int) -> str:
+    return f'"{generation}-{version}"'
+
+
+def not_modified(request: Request, etag: str) -> bool:
+    """True if the request's `If-None-Match` already names `etag`.
+
+    If-None-Match uses the *weak* comparison (RFC 9110 13.1.2), so a
+    `W/` prefix added by a proxy still matches.
+    """
+    header = request.headers.get("if-none-match")
+    if header is None:
+        return False
+    if header.strip() == "*":
+        return True
+    return any(tag.strip().removeprefix("W/") == etag
+               for tag in header.split(","))
+
+
+class CachedPage(NamedTuple):
+    body: bytes
+    next_cursor: Optional[str]
+
+
+class PageCache:
+    """Small LRU of serialized pages, valid for one store version."""
+
+    def __init__(self, max_entries: int = 256) -> None:
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._version: Optional[int] = None
+        self._pages: "OrderedDict[Hashable, CachedPage]" = OrderedDict()
+
+    def get(self, key: Hashable, version: int) -> Optional[CachedPage]:
+        if version != self._version:
+            self._pages.clear()  # something was written since: start over
+            self._version = version
+        page = self._pages.get(key)
+        if page is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._pages.move_to_end(key)
+        return page
+
+    def put(self, key: Hashable, version: int, page: CachedPage) -> None:
+        if version != self._version:
+            return  # built from an older version than the cache holds
+        self._pages[key] = page
+        if len(self._pages) > self.max_entries:
+            self._pages.popitem(last=False)
@@ -0,0 +1,281 @@
+"""
+Indexed, concurrency-safe item store
+=====================================
+`main.py` started life with a module-level `items: List[Item]`.  That is
+fine for a tutorial but falls over quickly:
+
+* positional indexes are not stable IDs - delete one item and every
+  later "ID" silently points at a different item,
+* `items[:limit]` copies a slice of an ever-growing list on every read,
+* nothing stops two handlers (async ones on the loop, sync ones in the
+  threadpool) from interleaving writes.
+
+`ItemStore` fixes that with a handful of plain data structures:
+
+    _items      dict  id -> Item            O(1) lookup by stable ID
+    _ids        list  sorted live IDs       cursor pagination via bisect
+    _by_done    dict  bool -> sorted IDs    secondary index on is_done
+    _by_text    list  sorted (text, id)     secondary index for prefixes
+
+IDs are handed out monotonically, so new IDs always land at the *end* of
+every ID list and `append` keeps them sorted for free.  A page read is a
+`bisect` (O(log n)) plus `limit` steps - it does not depend on how many
+items sit in front of the cursor.
+
+Cursors are opaque strings.  Treat them as tokens; never build them by
+hand.
+
+`version` counts writes.  It only ever goes up, so "same version" means
+"same contents" - cheaper to compare than the data itself.  Each item also
+remembers the version that last wrote it (`get_versioned`), and
+`generation` tells this store apart from the one before a restart, whose
+version counter started from zero too.  Together they make HTTP ETags.
+"""
+
+import base64
+import json
+import os
+import threading
+from bisect import bisect_left, bisect_right, insort
+from typing import (Dict, Generic, Iterable, List, NamedTuple, Optional,
+                    Tuple, TypeVar)
+
+T = TypeVar("T")
+
+
+class Page(NamedTuple):
+    """One page of results plus the cursor for the next one (if any)."""
+
+    items: list
+    next_cursor: Optional[str]
+
+
+def _encode_cursor(*parts) -> str:
+    raw = json.dumps(parts, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def _decode_cursor(cursor: str) -> list:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        parts = json.loads(base64.urlsafe_b64decode(padded))
+    except (ValueError, TypeError) as exc:
+        raise ValueError("Invalid cursor") from exc
+    if not isinstance(parts, list) or not parts:
+        raise ValueError("Invalid cursor")
+    return parts
+
+
+def _remove_sorted(seq: list, value) -> None:
+    """Delete `value` from a sorted list in O(log n) search + memmove."""
+    i = bisect_left(seq, value)
+    if i < len(seq) and seq[i] == value:
+        del seq[i]
+
+
+class ItemStore(Generic[T]):
+    """
+    Thread-safe store keyed by stable integer IDs.
+
+    The stored objects only need `text` and `is_done` attributes, which
+    is all the secondary indexes look at.  Objects are treated as
+    immutable once stored - use `update` to change one so the indexes
+    stay in sync.
+    """
+
+    def __init__(self) -> None:
+        # A plain threading lock is enough: every critical section is
+        # short and never awaits, so async handlers never block the loop
+        # for long, and sync handlers in the threadpool are covered too.
+        self._lock = threading.Lock()
+        self._items: Dict[int, T] = {}
+        self._ids: List[int] = []
+        self._by_done: Dict[bool, List[int]] = {False: [], True: []}
+        self._by_text: List[Tuple[str, int]] = []
+        self._next_id = 0
+        self.version = 0  # bumped by every write
+        self.generation = os.urandom(6).hex()
+        self._versions: Dict[int, int] = {}  # id -> version that wrote it
+
+    # -- writes -------------------------------------------------------------
+
+    def add(self, item: T) -> int:
+        """Store `item` and return its new, never-reused ID."""
+        with self._lock:
+            self.version += 1
+            item_id = self._next_id
+            self._next_id += 1
+            self._items[item_id] = item
+            self._versions[item_id] = self.version
+            self._ids.append(item_id)
+            self._by_done[bool(item.is_done)].append(item_id)
+            insort(self._by_text, (self._text_key(item.text), item_id))
+            return item_id
+
+    def add_many(self, items: Iterable[T]) -> range:
+        """
+        Store a batch under one lock acquisition; return the new IDs.
+
+        The text index is extended and re-sorted once instead of doing one
+        `insort` per item: Timsort sees "long sorted run + short run" and
+        merges them in close to linear time.
+        """
+        # Drain the iterable first: if it fails partway, nothing is stored.
+        items = list(items)
+        with self._lock:
+            self.version += 1
+            first = self._next_id
+            texts = []
+            for item in items:
+                item_id = self._next_id
+                self._next_id += 1
+                self._items[item_id] = item
+                self._versions[item_id] = self.version
+                self._ids.append(item_id)
+                self._by_done[bool(item.is_done)].append(item_id)
+                texts.append((self._text_key(item.text), item_id))
+            texts.sort()
+            self._by_text.extend(texts)
+            self._by_text.sort()
+            return range(first, self._next_id)
+
+    def put(self, item_id: int, item: T) -> None:
+        """Insert or replace under a given ID - used when replaying a log."""
+        with self._lock:
+            if item_id in self._items:
+                self._replace(item_id, item)
+                return
+            self.version += 1
+            self._items[item_id] = item
+            self._versions[item_id] = self.version
+            insort(self._ids, item_id)
+            insort(self._by_done[bool(item.is_done)], item_id)
+            insort(self._by_text, (self._text_key(item.text), item_id))
+            self._next_id = max(self._next_id, item_id + 1)
+
+    def items(self) -> List[Tuple[int, T]]:
+        """Snapshot of every (id, item) pair in ID order."""
+        with self._lock:
+            return [(i, self._items[i]) for i in self._ids]
+
+    def update(self, item_id: int, item: T) -> T:
+        """Replace the item stored under `item_id`; KeyError if missing."""
+        with self._lock:
+            return self._replace(item_id, item)
+
+    def _replace(self, item_id: int, item: T) -> T:
+        """`update` without taking the lock; the caller holds it."""
+        old = self._items[item_id]
+        self.version += 1
+        self._items[item_id] = item
+        self._versions[item_id] = self.version
+        if bool(old.is_done) != bool(item.is_done):
+            _remove_sorted(self._by_done[bool(old.is_done)], item_id)
+            insort(self._by_done[bool(item.is_done)], item_id)
+        if old.text != item.text:
+            _remove_sorted(self._by_text, (self._text_key(old.text), item_id))
+            insort(self._by_text, (self._text_key(item.text), item_id))
+        return item
+
+    def delete(self, item_id: int) -> T:
+        """Remove and return the item under `item_id`; KeyError if missing."""
+        with self._lock:
+            item = self._items.pop(item_id)
+            del self._versions[item_id]
+            self.version += 1
+            _remove_sorted(self._ids, item_id)
+            _remove_sorted(self._by_done[bool(item.is_done)], item_id)
+            _remove_sorted(self._by_text, (self._text_key(item.text), item_id))
+            return item
+
+    # -- reads --------------------------------------------------------------
+
+    def get(self, item_id: int) -> Optional[T]:
+        return self._items.get(item_id)
+
+    def get_versioned(self, item_id: int) -> Optional[Tuple[T, int]]:
+        """`(item, version that last wrote it)`, or None if missing."""
+        with self._lock:
+            item = self._items.get(item_id)
+            return None if item is None else (item, self._versions[item_id])
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def __contains__(self, item_id: object) -> bool:
+        return item_id in self._items
+
+    def page(
+        self,
+        limit: int = 10,
+        cursor: Optional[str] = None,
+        *,
+        is_done: Optional[bool] = None,
+        prefix: Optional[str] = None,
+    ) -> Page:
+        """
+        Return up to `limit` items after `cursor`.
+
+        * no filter       -> ID order, walks `_ids`
+        * `is_done`       -> ID order, walks the matching `_by_done` list
+        * `prefix`        -> (text, ID) order, walks `_by_text`; combined
+                             with `is_done` the extra filter is applied
+                             while walking the prefix range
+
+        Raises ValueError for a malformed cursor.
+        """
+        if limit <= 0:
+            return Page([], None)
+        with self._lock:
+            if prefix is not None:
+                return self._page_by_prefix(limit, cursor, prefix, is_done)
+            ids = self._ids if is_done is None else self._by_done[is_done]
+            return self._page_by_id(ids, limit, cursor)
+
+    def _page_by_id(self, ids: List[int], limit: int,
+                    cursor: Optional[str]) -> Page:
+        start = 0
+        if cursor is not None:
+            (after,) = self._cursor_parts(cursor, int)
+            start = bisect_right(ids, after)
+        chosen = ids[start:start + limit]
+        more = start + limit < len(ids)
+        next_cursor = _encode_cursor(chosen[-1]) if chosen and more else None
+        return Page([self._items[i] for i in chosen], next_cursor)
+
+    def _page_by_prefix(self, limit: int, cursor: Optional[str], prefix: str,
+                        is_done: Optional[bool]) -> Page:
+        key = self._text_key(prefix)
+        pos = bisect_left(self._by_text, (key, -1))
+        if cursor is not None:
+            last_text, last_id = self._cursor_parts(cursor, str, int)
+            pos = max(pos, bisect_right(self._by_text, (last_text, last_id)))
+        found: List[T] = []
+        last: Optional[Tuple[str, int]] = None
+        entries = self._by_text
+        while pos < len(entries) and entries[pos][0].startswith(key):
+            entry = entries[pos]
+            pos += 1
+            item = self._items[entry[1]]
+            if is_done is not None and bool(item.is_done) != is_done:
+                continue
+            if len(found) == limit:
+                # There is at least one more match: hand out a cursor.
+                return Page(found, _encode_cursor(*last))
+            found.append(item)
+            last = entry
+        return Page(found, None)
+
+    # -- helpers ------------------------------------------------------------
+
+    @staticmethod
+    def _text_key(text: str) -> str:
+        return text.casefold()
+
+    @staticmethod
+    def _cursor_parts(cursor: str, *types: type) -> list:
+        parts = _decode_cursor(cursor)
+        if len(parts) != len(types) or not all(
+                type(p) is t for p, t in zip(parts, types)):
+            raise ValueError("Invalid cursor")
+        return parts
@@ -35,27 +35,82 @@ you only need the code.
 # ---------------------------------------------------------------------------
 # Imports – stdlib, external libs, local
 # ---------------------------------------------------------------------------
-import asyncio
-from typing import List, Generic, Optional, TypeVar, Annotated
+import json
+import os
+from contextlib import asynccontextmanager
+from typing import List, Generic, Literal, Optional, TypeVar, Annotated, Union
 
-import httpx  # third‑party async HTTP client
 from fastapi import (
     Depends,
     FastAPI,
     HTTPException,
     Path,
+    Query,
     Request,
+    Response,
     status,
 )
+from fastapi.concurrency import run_in_threadpool
+from fastapi.encoders import jsonable_encoder
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from pydantic import BaseModel, Field
 from pydantic.generics import GenericModel  # for v1/v2 compatibility
 
+from cpu_pool import ClientDisconnected, CPUPool, PoolBusyError, cancel_on_disconnect
+from fast_json import TrustedJSONResponse, json_response, serializer_for
+from http_cache import CachedPage, PageCache, make_etag, not_modified
+from item_store import ItemStore
+from metrics import MetricsMiddleware, MetricsRegistry, timed_dependency
+from ndjson import NDJSONError, iter_line_batches, iter_ndjson, parse_batch
+from primes import check_primes
+from provider_cache import cached_provider
+from ratelimit import Limit, Limiter, RateLimitMiddleware
+from scrape_pool import Scraper
+from sqlite_store import SQLiteItemStore
+from wal import Durability, WriteAheadLog
+
 # ---------------------------------------------------------------------------
 # App setup
 # ---------------------------------------------------------------------------
-app = FastAPI(title="FastAPI Demo")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Build long-lived resources once per process, close them on shutdown."""
+    app.state.scraper = Scraper(max_connections=100, max_per_host=10,
+                                timeout=10.0)
+    app.state.item_log = open_item_log()
+    app.state.cpu_pool = await CPUPool(
+        max_workers=int(os.environ.get("CPU_POOL_WORKERS", 0)) or None,
+        warm_up_module="primes",
+    ).start()
+    try:
+        yield
+    finally:
+        await app.state.scraper.aclose()
+        app.state.cpu_pool.shutdown()
+        if app.state.item_log is not None:
+            app.state.item_log.checkpoint(_item_rows())
+            app.state.item_log.close()
+
+
+app = FastAPI(title="FastAPI Demo", lifespan=lifespan)
+
+# Overload protection (see ratelimit.py): token buckets per client and per
+# expensive route answer 429, and once 64 requests are running the rest
+# queue for at most 0.5s before being shed with 503. Added first, so it
+# sits *inside* CORS - rejections still carry CORS headers and preflights
+# never spend tokens - and inside metrics, which counts the rejections.
+limiter = Limiter(
+    client_limit=Limit(rate=100, burst=200),
+    route_limits={"/scrape": Limit(rate=2, burst=5)},
+    max_concurrency=64,
+    max_queue=256,
+    max_queue_delay=0.5,
+    exempt=("/metrics",),  # stay observable while overloaded
+)
+app.add_middleware(RateLimitMiddleware, limiter=limiter)
 
 # Middleware is *application‑wide* glue for cross‑cutting concerns like
 # CORS, auth, or request timing.
@@ -65,6 +120,10 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+# Added last, so it is the outermost of our middleware and its timings
+# include everything below it (CORS, routing, handlers, streaming bodies).
+metrics = MetricsRegistry()
+app.add_middleware(MetricsMiddleware, registry=metrics)
 
 # ---------------------------------------------------------------------------
 # Existing beginner CRUD sample (lightly cleaned up)
@@ -78,7 +137,78 @@ class Item(BaseModel):
     is_done: bool = False
 
 
-items: List[Item] = []
+# A bare list gave us positional "IDs" and O(n) slices. ItemStore hands out
+# stable IDs, indexes `is_done` and text prefixes, and pages with cursors.
+# See item_store.py for the data structures.
+#
+# A module global is per *process*, though: with `--workers N` every worker
+# would hold its own diverging copy. Set ITEMS_DB to a SQLite file and all
+# workers share one store instead - same interface, plus a per-process read
+# cache invalidated by a shared write counter. See sqlite_store.py.
+
+
+def open_item_store():
+    path = os.environ.get("ITEMS_DB")
+    if path:
+        return SQLiteItemStore(path, Item)
+    return ItemStore()
+
+
+items: Union[ItemStore[Item], SQLiteItemStore[Item]] = open_item_store()
+
+
+async def in_store(call, *args, **kwargs):
+    """
+    `call(*args, **kwargs)` on the item store, off the event loop if need be.
+
+    ItemStore calls are short and in memory, so they run inline. A
+    SQLiteItemStore call does file I/O, and a write may wait up to its
+    busy_timeout (5 s) for another worker's lock: it runs in the threadpool
+    so the rest of this worker's requests keep going meanwhile.
+    """
+    if isinstance(items, SQLiteItemStore):
+        return await run_in_threadpool(call, *args, **kwargs)
+    return call(*args, **kwargs)
+
+
+# IDs only go up and are never reused, so there is no "last" item to bound
+# them by; the cap is the widest ID either store can hold, a SQLite INTEGER.
+MAX_ITEM_ID = 2**63 - 1
+
+# Durability: set ITEMS_WAL_DIR and every write is appended to a write-ahead
+# log (group-committed, see wal.py) before we answer; on startup the last
+# snapshot plus the log tail are replayed. Unset, items live in memory only.
+# ITEMS_WAL_DURABILITY picks none / write / fsync (default). A SQLite store
+# is durable by itself, so the log is skipped when ITEMS_DB is set.
+
+
+def open_item_log() -> Optional[WriteAheadLog]:
+    directory = os.environ.get("ITEMS_WAL_DIR")
+    if not directory or isinstance(items, SQLiteItemStore):
+        return None
+    log = WriteAheadLog(
+        directory, Durability(os.environ.get("ITEMS_WAL_DURABILITY", "fsync")),
+        snapshot_rows=_item_rows)  # checkpoint once the log passes 64 MiB
+    for op, item_id, data in log.replay():
+        if op == "put":
+            items.put(item_id, Item(**data))
+        elif op == "delete" and item_id in items:
+            items.delete(item_id)
+    log.checkpoint(_item_rows())  # fold the replayed tail into the snapshot
+    return log.start()
+
+
+def _item_rows():
+    return ((item_id, jsonable_encoder(item)) for item_id, item in items.items())
+
+
+async def log_item_writes(records) -> None:
+    """Wait until `(op, id, item)` records are durable (no-op without a WAL)."""
+    item_log = getattr(app.state, "item_log", None)
+    if item_log is not None:
+        await item_log.append_many_async(
+            (op, item_id, None if item is None else jsonable_encoder(item))
+            for op, item_id, item in records)
 
 
 @app.get("/")
@@ -87,22 +217,101 @@ async def root():
 
 
 @app.post("/items", response_model=Item, status_code=status.HTTP_201_CREATED)
-async def create_item(item: Item):
-    items.append(item)
+async def create_item(item: Item, response: Response):
+    item_id = await in_store(items.add, item)
+    await log_item_writes([("put", item_id, item)])
+    response.headers["Location"] = f"/items/{item_id}"
     return item
 
 
+# Clients poll these reads. Both answer with an ETag derived from the store's
+# write counter and `Cache-Control: no-cache` (reuse, but revalidate), and a
+# matching If-None-Match gets a bare 304 before anything is read or
+# serialized. Serialized list pages are cached until the next write.
+# See http_cache.py.
+page_cache = PageCache()
+
+
 @app.get("/items", response_model=List[Item])
-async def list_items(limit: int = 10):
-    return items[:limit]
+async def list_items(
+    request: Request,
+    limit: Annotated[int, Query(ge=0, le=1000)] = 10,
+    cursor: Optional[str] = None,
+    is_done: Optional[bool] = None,
+    prefix: Optional[str] = None,
+):
+    """The body stays a plain list; the next page is in `X-Next-Cursor`."""
+    version = await in_store(lambda: items.version)
+    etag = make_etag(items.generation, version)
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if not_modified(request, etag):
+        return Response(status_code=304, headers=headers)
+    key = (limit, cursor, is_done, prefix)
+    stamp = (items.generation, version)  # main.items may be swapped out
+    cached = page_cache.get(key, stamp)
+    if cached is None:
+        try:
+            page = await in_store(items.page, limit, cursor,
+                                  is_done=is_done, prefix=prefix)
+        except ValueError as exc:
+            raise HTTPException(status_code=400, detail=str(exc)) from exc
+        # Stored items were validated on the way in; skip re-validating them
+        # on the way out (see fast_json.py). response_model still documents it.
+        cached = CachedPage(serializer_for(List[Item])(page.items),
+                            page.next_cursor)
+        page_cache.put(key, stamp, cached)
+    if cached.next_cursor is not None:
+        headers["X-Next-Cursor"] = cached.next_cursor
+    return TrustedJSONResponse(cached.body, headers=headers)
+
+
+# Bulk paths. Declared before `/items/{item_id}` so "bulk"/"export" are not
+# swallowed by the path parameter. See ndjson.py.
+BULK_BATCH_SIZE = 1000
+
+
+@app.post("/items/bulk", status_code=status.HTTP_201_CREATED)
+async def bulk_create_items(request: Request):
+    """Ingest an NDJSON body (one Item per line) in validated batches.
+
+    Batches are committed as they arrive; on a bad line the response says
+    which line failed and how many items were stored before it.
+    """
+    created = 0
+    try:
+        async for batch in iter_line_batches(request.stream(),
+                                             BULK_BATCH_SIZE):
+            parsed = parse_batch(batch, Item)
+            ids = await in_store(items.add_many, parsed)
+            await log_item_writes(("put", i, item) for i, item in zip(ids, parsed))
+            created += len(ids)
+    except NDJSONError as exc:
+        return JSONResponse(
+            status_code=422,
+            content={"detail": str(exc), "line": exc.line, "created": created},
+        )
+    return {"created": created}
+
+
+@app.get("/items/export")
+async def export_items():
+    """Stream every item as NDJSON in constant memory."""
+    return StreamingResponse(iter_ndjson(items, Item),
+                             media_type="application/x-ndjson")
 
 
 @app.get("/items/{item_id}", response_model=Item)
-async def get_item(item_id: Annotated[int, Path(ge=0, lt=1_000_000)]):
-    try:
-        return items[item_id]
-    except IndexError as exc:
-        raise HTTPException(status_code=404, detail="Item not found") from exc
+async def get_item(item_id: Annotated[int, Path(ge=0, le=MAX_ITEM_ID)],
+                   request: Request):
+    found = await in_store(items.get_versioned, item_id)
+    if found is None:
+        raise HTTPException(status_code=404, detail="Item not found")
+    item, version = found
+    etag = make_etag(items.generation, version)  # per item, not per store
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if not_modified(request, etag):
+        return Response(status_code=304, headers=headers)
+    return json_response(item, Item, headers=headers)
 
 
 # ---------------------------------------------------------------------------
@@ -116,23 +325,48 @@ async def get_item(item_id: Annotated[int, Path(ge=0, lt=1_000_000)]):
 T = TypeVar("T")
 
 
-async def fetch_url(session: httpx.AsyncClient, url: str) -> str:
-    """Pretend we scrape a page - realistically you'll return JSON, etc."""
-    resp = await session.get(url, timeout=10)
-    resp.raise_for_status()
-    return resp.text[:80]  # first 80 chars for brevity
+# Creating an `httpx.AsyncClient` per request throws away keep-alive
+# connections, and an unbounded `gather` lets one request open thousands of
+# sockets. The app-wide `Scraper` (built in `lifespan`, see scrape_pool.py)
+# reuses pooled connections, caps fan-out globally and per host, and
+# coalesces concurrent fetches of the same URL.
 
 
-async def fetch_many(urls: List[str]) -> List[str]:
-    async with httpx.AsyncClient() as session:
-        return await asyncio.gather(*(fetch_url(session, u) for u in urls))
+def get_scraper(request: Request) -> Scraper:
+    return request.app.state.scraper
 
 
 @app.get("/scrape")
-async def scrape(urls: str):
-    """Comma-separated list of URLs -> concurrent scrape."""
-    results = await fetch_many(urls.split(","))
-    return {"results": results}
+async def scrape(
+    urls: str,
+    stream: Optional[Literal["ndjson", "sse"]] = None,
+    scraper: Scraper = Depends(get_scraper),
+):
+    """
+    Comma-separated list of URLs -> concurrent scrape.
+
+    By default the whole batch is gathered and returned at once.  With
+    `?stream=ndjson` (or `sse`) each result is sent as soon as its fetch
+    finishes, so the slowest upstream no longer decides time-to-first-byte
+    and failures are reported per URL.
+    """
+    if stream is None:
+        results = await scraper.fetch_many(urls.split(","))
+        return {"results": results}
+    return StreamingResponse(
+        _stream_results(scraper, urls.split(","), stream),
+        media_type=_STREAM_MEDIA_TYPES[stream],
+    )
+
+
+_STREAM_MEDIA_TYPES = {"ndjson": "application/x-ndjson",
+                       "sse": "text/event-stream"}
+
+
+async def _stream_results(scraper: Scraper, urls: List[str], fmt: str):
+    async for result in scraper.iter_completed(urls):
+        line = json.dumps(result)
+        yield f"data: {line}\n\n" if fmt == "sse" else f"{line}\n"
 
 # ---------------------------------------------------------------------------
 # 2️⃣  Dependency Injection (DI) with Depends
@@ -147,6 +381,12 @@ class Settings(BaseModel):
     debug: bool = True
 
 
+# Providers run on *every* request. Once they touch env files, a secrets
+# manager or a DB, cache them: `cached_provider` keeps one value per app,
+# refreshes it in the background before the TTL runs out and lets only one
+# refresh run at a time. See provider_cache.py.
+@timed_dependency(metrics)  # shows up as dependency_duration_seconds
+@cached_provider(ttl=60.0)
 def get_settings() -> Settings:  # could pull from env or secrets manager
     return Settings()
 
@@ -177,6 +417,14 @@ async def ext_service_exception_handler(_: Request, exc: ExternalServiceError):
         content={"error": "external_service_unavailable", "detail": str(exc)},
     )
 
+
+# Observability: MetricsMiddleware (registered in "App setup") records a
+# latency histogram per route template plus an in-flight gauge. Scrape it
+# with Prometheus, or just curl it. See metrics.py.
+@app.get("/metrics", response_class=PlainTextResponse)
+async def read_metrics():
+    return metrics.render() + limiter.render()
+
 # ---------------------------------------------------------------------------
 # 4️⃣  Testing with PyTest
 # ---------------------------------------------------------------------------
@@ -203,19 +451,56 @@ class APIResponse(GenericModel, Generic[T]):  # Note GenericModel first
 
 @app.get("/items/{item_id}/wrap", response_model=APIResponse[Item])
 async def get_wrapped_item(item_id: int):
-    try:
-        return APIResponse(data=items[item_id])
-    except IndexError as exc:
-        raise HTTPException(status_code=404, detail="Item not found") from exc
+    item = await in_store(items.get, item_id)
+    if item is None:
+        raise HTTPException(status_code=404, detail="Item not found")
+    return json_response(APIResponse[Item](data=item), APIResponse[Item])
 
 # ---------------------------------------------------------------------------
 #  ⚡  Quick performance tip
 # ---------------------------------------------------------------------------
 # Want 2–10× more throughput?
 # * Run with Uvicorn's `--workers` flag (processes) or behind Gunicorn using
-#   `uvicorn.workers.UvicornWorker`.
+#   `uvicorn.workers.UvicornWorker`. Point ITEMS_DB at a SQLite file first,
+#   or every worker serves its own private set of items.
 # * Profile first – `asyncio` fixes I/O wait, not CPU‑bound work.  Heavy number
-#   crunching belongs in Celery/RQ workers or `asyncio.to_thread`.
+#   crunching belongs in Celery/RQ workers or a process pool - *not*
+#   `asyncio.to_thread`, whose threads still share one GIL.
+#
+# `/primes` shows the in-process option: the app-wide CPUPool (built in
+# `lifespan`, see cpu_pool.py) runs the work in warm worker processes, the
+# handler just awaits it, and a client that hangs up cancels what has not
+# started yet. CPU_POOL_WORKERS sets the pool size (default: one per core).
+
+PRIMES_CHUNK = 2_000  # numbers per pool task; also the cancellation grain
+
+
+class PrimesRequest(BaseModel):
+    numbers: List[Annotated[int, Field(ge=0, lt=2**64)]] = Field(
+        ..., max_length=100_000)
+
+
+def get_cpu_pool(request: Request) -> CPUPool:
+    return request.app.state.cpu_pool
+
+
+@app.post("/primes")
+async def find_primes(body: PrimesRequest, request: Request,
+                      pool: CPUPool = Depends(get_cpu_pool)):
+    """Return which of `numbers` are prime, computed off the event loop."""
+    numbers = body.numbers
+    chunks = [(numbers[i:i + PRIMES_CHUNK],)
+              for i in range(0, len(numbers), PRIMES_CHUNK)]
+    try:
+        results = await cancel_on_disconnect(
+            request, pool.map(check_primes, chunks))
+    except PoolBusyError:
+        return JSONResponse(status_code=503, headers={"Retry-After": "1"},
+                            content={"detail": "CPU pool is busy"})
+    except ClientDisconnected:
+        return Response(status_code=499)  # nobody is listening any more
+    flags = [flag for chunk in results for flag in chunk]
+    return {"primes": [n for n, prime in zip(numbers, flags) if prime]}
 
 if __name__ == "__main__":
     import uvicorn
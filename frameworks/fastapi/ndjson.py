@@ -0,0 +1,102 @@
+"""
+NDJSON bulk ingest and export
+=============================
+One `POST /items` per item means one HTTP round trip, one validation and
+one store write per item - hopeless for millions of rows.  A JSON array
+body is no better: the whole array has to be buffered before parsing.
+
+NDJSON (one JSON document per line) streams naturally:
+
+* `iter_line_batches` reads the request body chunk by chunk and hands out
+  batches of complete lines; only one batch plus one partial line is ever
+  held in memory,
+* `parse_batch` runs the compiled validator on each line of a batch on
+  its own, so a line must hold exactly one JSON document - gluing the
+  lines into one array would let a document straddle two lines,
+* `iter_ndjson` is the export side: it walks the store page by page and
+  yields each page as a chunk of NDJSON, so memory is one page no matter
+  how big the store is.
+"""
+
+from typing import AsyncIterable, AsyncIterator, List, Tuple
+
+from fastapi.concurrency import run_in_threadpool
+
+from fast_json import serializer_for, validator_for
+
+MAX_LINE_BYTES = 64 * 1024
+
+Line = Tuple[int, bytes]  # (1-based line number, raw JSON)
+
+
+class NDJSONError(ValueError):
+    """A line of the request body could not be parsed or validated."""
+
+    def __init__(self, line: int, message: str) -> None:
+        super().__init__(f"line {line}: {message}")
+        self.line = line
+
+
+async def iter_line_batches(chunks: AsyncIterable[bytes],
+                            batch_size: int) -> AsyncIterator[List[Line]]:
+    """Split a byte stream into batches of non-blank lines."""
+    batch: List[Line] = []
+    partial = b""
+    line_no = 0
+    async for chunk in chunks:
+        lines = (partial + chunk).split(b"\n")
+        partial = lines.pop()
+        if len(partial) > MAX_LINE_BYTES:
+            raise NDJSONError(line_no + len(lines) + 1, "line too long")
+        for raw in lines:
+            line_no += 1
+            if len(raw) > MAX_LINE_BYTES:
+                raise NDJSONError(line_no, "line too long")
+            if raw.strip():
+                batch.append((line_no, raw))
+                if len(batch) == batch_size:
+                    yield batch
+                    batch = []
+    if partial.strip():
+        batch.append((line_no + 1, partial))
+    if batch:
+        yield batch
+
+
+def parse_batch(batch: List[Line], tp) -> list:
+    """Validate every line of `batch` as one `tp`; NDJSONError on the first
+    bad line."""
+    validate = validator_for(tp)
+    parsed = []
+    for line_no, raw in batch:
+        try:
+            parsed.append(validate(raw))
+        except ValueError as exc:
+            raise NDJSONError(line_no, _first_error(exc)) from exc
+    return parsed
+
+
+def _first_error(exc: ValueError) -> str:
+    errors = getattr(exc, "errors", None)
+    if callable(errors):
+        first = errors()[0]
+        loc = ".".join(str(part) for part in first.get("loc", ()))
+        return f"{loc}: {first['msg']}" if loc else first["msg"]
+    return str(exc)
+
+
+async def iter_ndjson(store, tp, page_size: int = 1000) -> AsyncIterator[bytes]:
+    """Yield the whole store as NDJSON, one page per chunk.
+
+    Pages are read in the threadpool: a SQLite-backed store reads them from
+    disk, and may wait on another worker's lock.
+    """
+    dump = serializer_for(tp)
+    cursor = None
+    while True:
+        page = await run_in_threadpool(store.page, page_size, cursor)
+        if page.items:
+            yield b"\n".join(dump(item) for item in page.items) + b"\n"
+        if page.next_cursor is None:
+            return
+        cursor = page.next_cursor
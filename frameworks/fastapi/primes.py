@@ -0,0 +1,41 @@
+"""
+CPU-bound example jobs
+======================
+Deliberately plain Python number crunching for `POST /primes`.  It lives
+in its own module (not main.py) because process-pool workers import the
+function by name: a worker that had to import main.py would build a
+whole second app just to test a few numbers.
+"""
+
+from typing import List, Sequence
+
+# Deterministic Miller-Rabin witnesses: correct for every n < 3.3 * 10**24.
+_WITNESSES = (2, 3, 5, 7, 11, 13, 17, 19, 23, 29, 31, 37, 41)
+
+
+def is_prime(n: int) -> bool:
+    if n < 2:
+        return False
+    for p in _WITNESSES:
+        if n % p == 0:
+            return n == p
+    d, s = n - 1, 0
+    while d % 2 == 0:
+        d //= 2
+        s += 1
+    for a in _WITNESSES:
+        x = pow(a, d, n)
+        if x == 1 or x == n - 1:
+            continue
+        for _ in range(s - 1):
+            x = x * x % n
+            if x == n - 1:
+                break
+        else:
+            return False
+    return True
+
+
+def check_primes(numbers: Sequence[int]) -> List[bool]:
+    """`is_prime` over a chunk; the unit of work sent to a pool worker."""
+    return [is_prime(n) for n in numbers]
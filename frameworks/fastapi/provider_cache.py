@@ -0,0 +1,229 @@
+"""
+Cached `Depends` providers
+==========================
+FastAPI calls a provider once per request (it already de-duplicates the
+same provider *within* one request).  That is fine for `get_settings()`
+building a tiny pydantic model, and ruinous once a provider reads env
+files, a secrets manager or a database.
+
+`cached_provider` wraps a provider (sync or async) and caches its result:
+
+    scope="app"      one value per FastAPI app; with `ttl` it expires
+    scope="request"  one value per request, even across `use_cache=False`
+
+With a `ttl`, a hit that is older than `refresh_ahead * ttl` schedules a
+background refresh and still returns the cached value straight away, so
+callers only ever wait on a genuinely cold or expired entry.  At most one
+load per key runs at a time; concurrent requests that miss share it
+("single flight").  Hit/miss numbers live on `provider.stats`.
+
+The wrapper asks FastAPI for the `Request` through an extra keyword-only
+parameter; the provider's own parameters are injected as before and form
+part of the cache key.  A sub-dependency that is a new object on every
+request (a `Request`, a DB session) makes a new key every time, so an
+app-scoped cache keeps at most `max_entries` values and drops the least
+recently used one beyond that.
+"""
+
+import asyncio
+import functools
+import inspect
+import math
+import time
+import weakref
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Hashable, Optional
+
+from fastapi import Request
+from starlette.concurrency import run_in_threadpool
+
+_REQUEST_PARAM = "_cached_provider_request"
+
+
+@dataclass
+class CacheStats:
+    hits: int = 0
+    misses: int = 0
+    coalesced: int = 0  # misses that joined an in-flight load
+    refreshes: int = 0  # background refreshes started
+    errors: int = 0
+
+
+@dataclass
+class _Entry:
+    value: Any
+    expires_at: float
+    refresh_at: float
+
+
+@dataclass
+class _AppCache:
+    # least recently used first
+    entries: "OrderedDict[Hashable, _Entry]" = field(
+        default_factory=OrderedDict)
+    inflight: Dict[Hashable, "asyncio.Task"] = field(default_factory=dict)
+
+
+class _CachedProvider:
+    def __init__(self, func: Callable, ttl: Optional[float], scope: str,
+                 refresh_ahead: float, max_entries: int,
+                 clock: Callable[[], float]) -> None:
+        self.func = func
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.scope = scope
+        self.refresh_ahead = refresh_ahead
+        self.clock = clock
+        self.stats = CacheStats()
+        self._is_async = inspect.iscoroutinefunction(func)
+        self._apps: "weakref.WeakKeyDictionary[Any, _AppCache]" = (
+            weakref.WeakKeyDictionary())
+        self._state_attr = f"_cached_provider_{id(self)}"
+
+    async def get(self, request: Request, kwargs: Dict[str, Any]) -> Any:
+        key = _make_key(kwargs)
+        if key is None:  # unhashable arguments: cannot cache safely
+            self.stats.misses += 1
+            return await self._call(kwargs)
+        if self.scope == "request":
+            return await self._get_per_request(request, key, kwargs)
+
+        cache = self._apps.get(request.app)
+        if cache is None:
+            cache = self._apps[request.app] = _AppCache()
+        entry = cache.entries.get(key)
+        now = self.clock()
+        if entry is not None and now < entry.expires_at:
+            self.stats.hits += 1
+            cache.entries.move_to_end(key)
+            if now >= entry.refresh_at and key not in cache.inflight:
+                self.stats.refreshes += 1
+                self._start_load(cache, key, kwargs)
+            return entry.value
+
+        task = cache.inflight.get(key)
+        if task is None:
+            self.stats.misses += 1
+            task = self._start_load(cache, key, kwargs)
+        else:
+            self.stats.coalesced += 1
+        # shield: a cancelled request must not cancel the shared load.
+        return await asyncio.shield(task)
+
+    def clear(self) -> None:
+        self._apps.clear()
+
+    def size(self, app: Any) -> int:
+        """Values cached for `app` (app scope)."""
+        cache = self._apps.get(app)
+        return 0 if cache is None else len(cache.entries)
+
+    async def _get_per_request(self, request: Request, key: Hashable,
+                               kwargs: Dict[str, Any]) -> Any:
+        values = getattr(request.state, self._state_attr, None)
+        if values is None:
+            values = {}
+            setattr(request.state, self._state_attr, values)
+        if key in values:
+            self.stats.hits += 1
+            return values[key]
+        self.stats.misses += 1
+        values[key] = await self._call(kwargs)
+        return values[key]
+
+    def _start_load(self, cache: _AppCache, key: Hashable,
+                    kwargs: Dict[str, Any]) -> "asyncio.Task":
+        task = asyncio.ensure_future(self._load(cache, key, kwargs))
+        cache.inflight[key] = task
+
+        def done(t: "asyncio.Task") -> None:
+            if not t.cancelled() and t.exception() is not None:
+                # A failed background refresh keeps serving the old value
+                # until it expires; the next hit will try again.
+                self.stats.errors += 1
+
+        task.add_done_callback(done)
+        return task
+
+    async def _load(self, cache: _AppCache, key: Hashable,
+                    kwargs: Dict[str, Any]) -> Any:
+        try:
+            value = await self._call(kwargs)
+        finally:
+            # Unregister here rather than in a done-callback: callbacks run
+            # one loop iteration later, and a request arriving in between
+            # would join a load that has already finished.
+            cache.inflight.pop(key, None)
+        now = self.clock()
+        if self.ttl is None:
+            cache.entries[key] = _Entry(value, math.inf, math.inf)
+        else:
+            cache.entries[key] = _Entry(value, now + self.ttl,
+                                        now + self.ttl * self.refresh_ahead)
+        cache.entries.move_to_end(key)
+        while len(cache.entries) > self.max_entries:
+            cache.entries.popitem(last=False)
+        return value
+
+    async def _call(self, kwargs: Dict[str, Any]) -> Any:
+        if self._is_async:
+            return await self.func(**kwargs)
+        # Sync providers may do blocking IO; keep them off the event loop.
+        return await run_in_threadpool(self.func, **kwargs)
+
+
+def _make_key(kwargs: Dict[str, Any]) -> Optional[Hashable]:
+    key = tuple(sorted(kwargs.items()))
+    try:
+        hash(key)
+    except TypeError:
+        return None
+    return key
+
+
+def cached_provider(
+    *,
+    ttl: Optional[float] = None,
+    scope: str = "app",
+    refresh_ahead: float = 0.8,
+    max_entries: int = 1024,
+    clock: Callable[[], float] = time.monotonic,
+) -> Callable:
+    """
+    Decorator for `Depends` targets.
+
+    `ttl=None` with `scope="app"` caches for the lifetime of the app.
+    `refresh_ahead` is the fraction of `ttl` after which a hit triggers a
+    background refresh.  `max_entries` bounds the distinct argument
+    combinations an app-scoped cache keeps.
+    """
+    if scope not in ("app", "request"):
+        raise ValueError(f"Unknown cache scope: {scope!r}")
+    if ttl is not None and ttl <= 0:
+        raise ValueError("ttl must be positive")
+    if not 0 < refresh_ahead <= 1:
+        raise ValueError("refresh_ahead must be in (0, 1]")
+    if max_entries < 1:
+        raise ValueError("max_entries must be at least 1")
+
+    def decorator(func: Callable) -> Callable:
+        provider = _CachedProvider(func, ttl, scope, refresh_ahead,
+                                   max_entries, clock)
+
+        @functools.wraps(func)
+        async def wrapper(**kwargs):
+            request = kwargs.pop(_REQUEST_PARAM)
+            return await provider.get(request, kwargs)
+
+        signature = inspect.signature(func)
+        request_param = inspect.Parameter(
+            _REQUEST_PARAM, inspect.Parameter.KEYWORD_ONLY, annotation=Request)
+        wrapper.__signature__ = signature.replace(
+            parameters=[*signature.parameters.values(), request_param])
+        wrapper.stats = provider.stats
+        wrapper.cache_clear = provider.clear
+        wrapper.cache_size = provider.size
+        return wrapper
+
+    return decorator
@@ -0,0 +1,248 @@
+"""
+Rate limiting and load shedding
+===============================
+An event loop has no natural back-pressure: every accepted request gets a
+task, and once requests arrive faster than they finish, the backlog - and
+everybody's latency - grows without bound.  Two complementary defences:
+
+* **Token buckets** (`Limit`) cap how fast one client may call the app,
+  and how fast it may call a given route (`/scrape` is far more expensive
+  than `/items`).  A bucket holds up to `burst` tokens and refills at
+  `rate` tokens per second; a request spends one.  An empty bucket means
+  429 with `Retry-After` set to when the next token arrives.
+* **Load shedding** caps the work in progress.  At most `max_concurrency`
+  requests run at once; the rest wait in a FIFO queue.  A request is
+  turned away with 503 + `Retry-After` when the queue is full, when the
+  last request admitted from the queue waited longer than
+  `max_queue_delay` (the queue is already too slow, so don't even join
+  it), or when its own wait hits `max_queue_delay`.
+
+Rejecting early is cheap - no routing, no body parsing, no handler - and
+it is what keeps the latency of the *admitted* requests flat: they never
+wait more than `max_queue_delay` for a slot, however hard the app is hit.
+
+`Limiter` holds configuration, state and counters; `RateLimitMiddleware`
+is the pure ASGI wrapper (see metrics.py for why not `BaseHTTPMiddleware`).
+Route limits are keyed by path template and matched with Starlette's own
+path compiler, because routing has not run yet when the middleware does.
+"""
+
+import asyncio
+import math
+import re
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Callable, Deque, Dict, Iterable, List, Optional, Tuple
+
+from starlette.routing import compile_path
+
+
+@dataclass(frozen=True)
+class Limit:
+    rate: float  # tokens added per second
+    burst: int  # bucket size: requests allowed back to back
+
+    def __post_init__(self) -> None:
+        if self.rate <= 0 or self.burst < 1:
+            raise ValueError("rate must be positive and burst at least 1")
+
+
+class TokenBucket:
+    __slots__ = ("rate", "burst", "tokens", "updated")
+
+    def __init__(self, limit: Limit, now: float) -> None:
+        self.rate = limit.rate
+        self.burst = limit.burst
+        self.tokens = float(limit.burst)
+        self.updated = now
+
+    def refill(self, now: float) -> float:
+        """Add the tokens earned since the last call, spend none; 0 if one
+        is available, else seconds until it is."""
+        self.tokens = min(self.burst,
+                          self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+
+def client_host(scope) -> str:
+    """Default client key: the peer address.  Behind a proxy, pass a
+    `client_key` that reads the header your proxy sets instead."""
+    client = scope.get("client")
+    return client[0] if client else "unknown"
+
+
+class Limiter:
+    """Token buckets per client and per (client, route) plus admission control."""
+
+    def __init__(
+        self,
+        *,
+        client_limit: Optional[Limit] = None,
+        route_limits: Optional[Dict[str, Limit]] = None,
+        max_concurrency: Optional[int] = None,
+        max_queue: int = 128,
+        max_queue_delay: float = 0.5,
+        exempt: Iterable[str] = (),
+        client_key: Callable[[dict], str] = client_host,
+        max_clients: int = 10_000,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.client_limit = client_limit
+        self.routes: List[Tuple[re.Pattern, str, Limit]] = [
+            (compile_path(template)[0], template, limit)
+            for template, limit in (route_limits or {}).items()]
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.max_queue_delay = max_queue_delay
+        self.exempt = frozenset(exempt)
+        self.client_key = client_key
+        self.max_clients = max_clients
+        self.clock = clock
+        self.buckets: Dict[Tuple[str, str], TokenBucket] = {}
+        self.in_flight = 0
+        self.waiting = 0
+        self.last_queue_delay = 0.0
+        self.rejected: Dict[str, int] = {"rate_limited": 0, "overloaded": 0}
+        self._queue: Deque[asyncio.Future] = deque()
+
+    # -- token buckets ------------------------------------------------------
+
+    def check_rate(self, scope) -> float:
+        """0 if the request may proceed, else the `Retry-After` in seconds."""
+        if self.client_limit is None and not self.routes:
+            return 0.0
+        client = self.client_key(scope)
+        now = self.clock()
+        buckets = []
+        if self.client_limit is not None:
+            buckets.append(self._bucket(client, "", self.client_limit, now))
+        path = scope["path"]
+        for pattern, template, limit in self.routes:
+            if pattern.match(path):
+                buckets.append(self._bucket(client, template, limit, now))
+                break
+        # Check every bucket before spending from any: a request one of
+        # them turns away must not cost tokens in the others.
+        wait = max((bucket.refill(now) for bucket in buckets), default=0.0)
+        if not wait:
+            for bucket in buckets:
+                bucket.tokens -= 1
+        return wait
+
+    def _bucket(self, client: str, route: str, limit: Limit,
+                now: float) -> TokenBucket:
+        key = (client, route)
+        bucket = self.buckets.pop(key, None)  # re-insert: dict order is LRU
+        if bucket is None:
+            bucket = TokenBucket(limit, now)
+            if len(self.buckets) >= self.max_clients:
+                # A full bucket carries no state; evicting the least
+                # recently seen client only forgets what it had spent.
+                del self.buckets[next(iter(self.buckets))]
+        self.buckets[key] = bucket
+        return bucket
+
+    # -- admission control --------------------------------------------------
+
+    async def admit(self) -> bool:
+        """Wait for a concurrency slot; False means shed this request."""
+        if self.max_concurrency is None or (
+                self.in_flight < self.max_concurrency and not self.waiting):
+            self.in_flight += 1
+            return True
+        if (self.waiting >= self.max_queue
+                or self.last_queue_delay >= self.max_queue_delay):
+            return False
+        slot = asyncio.get_running_loop().create_future()
+        self._queue.append(slot)
+        self.waiting += 1
+        start = self.clock()
+        try:
+            # release() hands its slot straight to us by resolving `slot`;
+            # a timed-out (cancelled) future is skipped over instead.
+            await asyncio.wait_for(slot, self.max_queue_delay)
+            return True
+        except asyncio.TimeoutError:
+            return False
+        except asyncio.CancelledError:
+            # Client went away; if a slot was handed over meanwhile, pass
+            # it on rather than leak it.
+            if slot.done() and not slot.cancelled():
+                self.release()
+            raise
+        finally:
+            self.waiting -= 1
+            self.last_queue_delay = self.clock() - start
+
+    def release(self) -> None:
+        while self._queue:
+            slot = self._queue.popleft()
+            if not slot.done():
+                slot.set_result(None)  # in_flight is unchanged: slot moves on
+                return
+        self.in_flight -= 1
+        # Nothing is queued, so the next arrival will not wait either.
+        self.last_queue_delay = 0.0
+
+    def render(self) -> str:
+        """Prometheus lines for `GET /metrics`, next to MetricsRegistry's."""
+        lines = [
+            "# HELP http_requests_rejected_total Requests turned away early.",
+            "# TYPE http_requests_rejected_total counter",
+        ]
+        lines += [f'http_requests_rejected_total{{reason="{reason}"}} {n}'
+                  for reason, n in sorted(self.rejected.items())]
+        lines += [
+            "# HELP http_requests_queued Requests waiting for a slot.",
+            "# TYPE http_requests_queued gauge",
+            f"http_requests_queued {self.waiting}",
+        ]
+        return "\n".join(lines) + "\n"
+
+
+class RateLimitMiddleware:
+    """Pure ASGI middleware: 429 for clients over their limit, 503 when
+    the app is overloaded, both with `Retry-After`."""
+
+    def __init__(self, app, limiter: Limiter) -> None:
+        self.app = app
+        self.limiter = limiter
+
+    async def __call__(self, scope, receive, send) -> None:
+        limiter = self.limiter
+        if scope["type"] != "http" or scope["path"] in limiter.exempt:
+            await self.app(scope, receive, send)
+            return
+
+        retry_after = limiter.check_rate(scope)
+        if retry_after:
+            limiter.rejected["rate_limited"] += 1
+            await _reject(send, 429, "Too Many Requests", retry_after)
+            return
+        if not await limiter.admit():
+            limiter.rejected["overloaded"] += 1
+            await _reject(send, 503, "Server overloaded",
+                          limiter.max_queue_delay)
+            return
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            limiter.release()
+
+
+async def _reject(send, status: int, detail: str, retry_after: float) -> None:
+    body = b'{"detail":"%s"}' % detail.encode()
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode()),
+            (b"retry-after", str(max(1, math.ceil(retry_after))).encode()),
+        ],
+    })
+    await send({"type": "http.response.body", "body": body})
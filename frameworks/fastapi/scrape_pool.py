@@ -0,0 +1,190 @@
+"""
+Shared HTTP client pool for `/scrape`
+=====================================
+The first version of `/scrape` built a new `httpx.AsyncClient` per
+request and fired one unbounded `asyncio.gather` over every URL:
+
+* every request paid fresh TCP (and TLS) handshakes - no keep-alive,
+* one request with 5 000 URLs opened 5 000 sockets at once,
+* ten clients asking for the same page fetched it ten times.
+
+`Scraper` lives for the whole app lifespan (see `lifespan` in `main.py`)
+and fixes all three:
+
+* one `httpx.AsyncClient` whose connection pool keeps sockets alive,
+* a global semaphore plus one semaphore per host caps fan-out,
+* concurrent requests for the *same* URL share one in-flight fetch
+  ("single flight" / request coalescing).
+
+`iter_completed` is the streaming flavour: it yields one result per URL
+in *completion* order and never keeps more than `window` fetches (and
+their bodies) alive at once, so memory does not grow with the number of
+URLs requested.
+"""
+
+import asyncio
+from typing import AsyncIterator, Dict, Iterable, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+import httpx
+
+
+class Scraper:
+    """Lifespan-scoped, pooled, concurrency-capped page fetcher."""
+
+    def __init__(
+        self,
+        *,
+        max_connections: int = 100,
+        max_per_host: int = 10,
+        timeout: float = 10.0,
+        preview_chars: int = 80,
+        transport: Optional[httpx.AsyncBaseTransport] = None,
+    ) -> None:
+        self.preview_chars = preview_chars
+        self.max_connections = max_connections
+        self.max_per_host = max_per_host
+        self._client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_connections,
+                keepalive_expiry=30.0,
+            ),
+            timeout=httpx.Timeout(timeout, connect=min(timeout, 5.0)),
+            transport=transport,
+        )
+        self._global = asyncio.Semaphore(max_connections)
+        # host -> (semaphore, number of tasks currently using it).  Entries
+        # are dropped when unused so scraping many hosts does not leak.
+        self._hosts: Dict[str, Tuple[asyncio.Semaphore, int]] = {}
+        self._inflight: Dict[str, "asyncio.Future[str]"] = {}
+        # in-flight fetch -> number of callers awaiting it
+        self._waiters: Dict["asyncio.Future[str]", int] = {}
+        self.fetches = 0
+        self.coalesced = 0
+
+    async def fetch(self, url: str) -> str:
+        """Fetch `url`, joining an identical in-flight fetch if one exists."""
+        future = self._inflight.get(url)
+        if future is None:
+            future = asyncio.ensure_future(self._fetch(url))
+            self._inflight[url] = future
+            future.add_done_callback(lambda f: self._forget(url, f))
+        else:
+            self.coalesced += 1
+        self._waiters[future] = self._waiters.get(future, 0) + 1
+        try:
+            # shield: one impatient caller cancelling must not cancel the
+            # fetch for everybody else waiting on the same URL ...
+            return await asyncio.shield(future)
+        except asyncio.CancelledError:
+            # ... but once the last one gives up, nobody wants the page.
+            # Unlist it now, not when its done callback runs: a caller
+            # arriving meanwhile must start afresh, not join a cancelled
+            # fetch.
+            if self._waiters[future] == 1:
+                self._unlist(url, future)
+                future.cancel()
+            raise
+        finally:
+            if self._waiters[future] == 1:
+                del self._waiters[future]
+            else:
+                self._waiters[future] -= 1
+
+    async def fetch_many(self, urls: Iterable[str]) -> List[str]:
+        return await asyncio.gather(*(self.fetch(u) for u in urls))
+
+    async def iter_completed(
+        self, urls: Iterable[str], window: Optional[int] = None
+    ) -> AsyncIterator[dict]:
+        """
+        Yield `{"url", "result"}` or `{"url", "error"}` as each fetch ends.
+
+        At most `window` fetches are in flight; the next URL is only pulled
+        from `urls` once a slot frees up.  Failures are reported per URL
+        instead of aborting the whole batch.
+        """
+        window = window or self.max_connections
+        remaining = iter(urls)
+        pending: Dict["asyncio.Future[str]", str] = {}
+
+        def refill() -> None:
+            while len(pending) < window:
+                url = next(remaining, None)
+                if url is None:
+                    return
+                pending[asyncio.ensure_future(self.fetch(url))] = url
+
+        try:
+            refill()
+            while pending:
+                done, _ = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    url = pending.pop(task)
+                    exc = task.exception()
+                    if exc is None:
+                        yield {"url": url, "result": task.result()}
+                    else:
+                        yield {"url": url, "error": describe_error(exc)}
+                refill()
+        finally:
+            # Client went away (or the consumer stopped early): drop the
+            # rest.  A fetch is only cancelled upstream when this stream was
+            # its last waiter; other callers coalesced on the same URL still
+            # get their result.
+            for task in pending:
+                task.cancel()
+
+    async def aclose(self) -> None:
+        await self._client.aclose()
+
+    async def _fetch(self, url: str) -> str:
+        host = urlsplit(url).netloc
+        semaphore = self._acquire_host(host)
+        try:
+            # Host first: a fetch queued behind a busy host must not sit on
+            # a global slot that another host's fetch could use.
+            async with semaphore, self._global:
+                self.fetches += 1
+                resp = await self._client.get(url)
+                resp.raise_for_status()
+                return resp.text[:self.preview_chars]
+        finally:
+            self._release_host(host)
+
+    def _unlist(self, url: str, future: "asyncio.Future[str]") -> None:
+        # Only if it is still this fetch: a newer one may have replaced it.
+        if self._inflight.get(url) is future:
+            del self._inflight[url]
+
+    def _forget(self, url: str, future: "asyncio.Future[str]") -> None:
+        self._unlist(url, future)
+        if not future.cancelled():
+            # Mark the exception as retrieved: if every waiter gave up, it
+            # would otherwise be logged as "never retrieved" at GC time.
+            future.exception()
+
+    def _acquire_host(self, host: str) -> asyncio.Semaphore:
+        semaphore, users = self._hosts.get(host, (None, 0))
+        if semaphore is None:
+            semaphore = asyncio.Semaphore(self.max_per_host)
+        self._hosts[host] = (semaphore, users + 1)
+        return semaphore
+
+    def _release_host(self, host: str) -> None:
+        semaphore, users = self._hosts[host]
+        if users == 1:
+            del self._hosts[host]
+        else:
+            self._hosts[host] = (semaphore, users - 1)
+
+
+def describe_error(exc: BaseException) -> str:
+    """Short, client-safe description of a failed fetch."""
+    if isinstance(exc, httpx.HTTPStatusError):
+        return f"HTTP {exc.response.status_code}"
+    if isinstance(exc, httpx.TimeoutException):
+        return "timeout"
+    return type(exc).__name__
@@ -0,0 +1,303 @@
+"""
+SQLite-backed item store shared by worker processes
+===================================================
+`uvicorn main:app --workers 4` starts four processes, and each one gets
+its own copy of every module global.  With the in-memory `ItemStore` a
+POST handled by worker 1 is invisible to a GET that lands on worker 3.
+
+`SQLiteItemStore` has the same interface as `ItemStore` but keeps the
+items in one SQLite database that every worker on the host opens:
+
+* **WAL journal mode** - readers never block the writer and vice versa;
+  each write is one short `BEGIN IMMEDIATE` transaction, so writers from
+  different processes simply queue on SQLite's file lock.
+* **Same query shapes** - the secondary indexes of `ItemStore` become
+  SQL indexes on `(is_done, id)` and `(text_key, id)`; pages are keyset
+  queries (`WHERE id > ?`), never `OFFSET`.
+* **Read cache with version invalidation** - every write bumps a
+  `version` counter in the same transaction.  Each process caches the
+  results of `get` and `page` in a small LRU, tagged with the version it
+  saw; a read first checks the version (one primary-key lookup) and drops
+  the cache if anyone, in any process, has written since.  Hot reads skip
+  the item query and JSON decoding entirely, and a worker never serves
+  data older than the last committed write.
+
+Like `ItemStore`, rows remember the version that wrote them and the
+database has a `generation`, so every worker hands out the same ETags.
+
+Stored objects must be pydantic models with `text` and `is_done`, like
+`ItemStore`, and are treated as immutable once stored.
+"""
+
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import (Any, Generic, Hashable, Iterable, List, Optional, Tuple,
+                    Type, TypeVar)
+
+from fast_json import serializer_for, validator_for
+from item_store import ItemStore, Page, _decode_cursor, _encode_cursor
+
+T = TypeVar("T")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS items (
+    id       INTEGER PRIMARY KEY,
+    is_done  INTEGER NOT NULL,
+    text_key TEXT NOT NULL,
+    data     TEXT NOT NULL,
+    version  INTEGER NOT NULL  -- meta.version of the write that stored it
+);
+CREATE INDEX IF NOT EXISTS items_by_done ON items (is_done, id);
+CREATE INDEX IF NOT EXISTS items_by_text ON items (text_key, id);
+CREATE TABLE IF NOT EXISTS meta (
+    one        INTEGER PRIMARY KEY CHECK (one = 1),
+    version    INTEGER NOT NULL,
+    next_id    INTEGER NOT NULL,
+    generation TEXT NOT NULL  -- tells this database from a recreated one
+);
+INSERT OR IGNORE INTO meta VALUES (1, 0, 0, lower(hex(randomblob(6))));
+"""
+
+# Rows written in a transaction carry the version it is about to commit
+# (_Transaction bumps meta.version by one on the way out).
+_INSERT = ("INSERT {} INTO items VALUES "
+           "(?, ?, ?, ?, (SELECT version + 1 FROM meta))")
+
+_text_key = ItemStore._text_key
+_cursor_parts = ItemStore._cursor_parts
+
+
+class SQLiteItemStore(Generic[T]):
+    """`ItemStore` interface over a SQLite file shared between processes."""
+
+    def __init__(self, path: str, model: Type[T], *,
+                 cache_size: int = 1024) -> None:
+        self.path = path
+        self.model = model
+        self.cache_size = cache_size
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self._dump = serializer_for(model)
+        self._load = validator_for(model)
+        # One connection per process, shared by the loop thread and the
+        # threadpool under a lock; autocommit mode so that we decide where
+        # transactions begin.
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False,
+                                   isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")  # fsync at checkpoints
+        self._db.execute("PRAGMA busy_timeout=5000")  # wait for other workers
+        with self._lock:
+            self._db.executescript(_SCHEMA)
+            (self.generation,) = self._db.execute(
+                "SELECT generation FROM meta").fetchone()
+        self._cache: "OrderedDict[Hashable, Any]" = OrderedDict()
+        self._cache_version = -1
+
+    @property
+    def version(self) -> int:
+        """Monotonic write counter, shared by every process."""
+        with self._lock:
+            return self._read_version()
+
+    # -- writes -------------------------------------------------------------
+
+    def add(self, item: T) -> int:
+        """Store `item` and return its new, never-reused ID."""
+        return self.add_many([item])[0]
+
+    def add_many(self, items: Iterable[T]) -> range:
+        """Store a batch in one transaction; return the new IDs."""
+        items = list(items)
+        with self._lock, self._write() as db:
+            (first,) = db.execute("SELECT next_id FROM meta").fetchone()
+            db.executemany(
+                _INSERT.format(""),
+                (self._row(first + n, item) for n, item in enumerate(items)))
+            db.execute("UPDATE meta SET next_id = ?", (first + len(items),))
+            return range(first, first + len(items))
+
+    def put(self, item_id: int, item: T) -> None:
+        """Insert or replace under a given ID."""
+        with self._lock, self._write() as db:
+            db.execute(_INSERT.format("OR REPLACE"), self._row(item_id, item))
+            db.execute("UPDATE meta SET next_id = max(next_id, ?)",
+                       (item_id + 1,))
+
+    def update(self, item_id: int, item: T) -> T:
+        """Replace the item stored under `item_id`; KeyError if missing."""
+        with self._lock, self._write() as db:
+            _, is_done, text_key, data = self._row(item_id, item)
+            changed = db.execute(
+                "UPDATE items SET is_done = ?, text_key = ?, data = ?, "
+                "version = (SELECT version + 1 FROM meta) WHERE id = ?",
+                (is_done, text_key, data, item_id)).rowcount
+            if not changed:
+                raise KeyError(item_id)
+            return item
+
+    def delete(self, item_id: int) -> T:
+        """Remove and return the item under `item_id`; KeyError if missing."""
+        with self._lock, self._write() as db:
+            row = db.execute("DELETE FROM items WHERE id = ? RETURNING data",
+                             (item_id,)).fetchone()
+            if row is None:
+                raise KeyError(item_id)
+            return self._load(row[0])
+
+    # -- reads --------------------------------------------------------------
+
+    def get(self, item_id: int) -> Optional[T]:
+        found = self.get_versioned(item_id)
+        return None if found is None else found[0]
+
+    def get_versioned(self, item_id: int) -> Optional[Tuple[T, int]]:
+        """`(item, version that last wrote it)`, or None if missing."""
+        return self._cached(("get", item_id), self._get, item_id)
+
+    def __len__(self) -> int:
+        return self._cached(("len",), self._count)
+
+    def __contains__(self, item_id: object) -> bool:
+        return isinstance(item_id, int) and self.get(item_id) is not None
+
+    def items(self) -> List[Tuple[int, T]]:
+        """Snapshot of every (id, item) pair in ID order."""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT id, data FROM items ORDER BY id").fetchall()
+        return [(item_id, self._load(data)) for item_id, data in rows]
+
+    def page(
+        self,
+        limit: int = 10,
+        cursor: Optional[str] = None,
+        *,
+        is_done: Optional[bool] = None,
+        prefix: Optional[str] = None,
+    ) -> Page:
+        """Same contract as `ItemStore.page`; cursors are not interchangeable."""
+        if limit <= 0:
+            return Page([], None)
+        if cursor is not None:
+            _decode_cursor(cursor)  # reject garbage before caching anything
+        key = ("page", limit, cursor, is_done, prefix)
+        return self._cached(key, self._page, limit, cursor, is_done, prefix)
+
+    # -- helpers ------------------------------------------------------------
+
+    def _row(self, item_id: int, item: T) -> tuple:
+        return (item_id, int(bool(item.is_done)), _text_key(item.text),
+                self._dump(item).decode())
+
+    def _write(self):
+        return _Transaction(self._db)
+
+    def _read_version(self) -> int:
+        return self._db.execute("SELECT version FROM meta").fetchone()[0]
+
+    def _cached(self, key: Hashable, load, *args) -> Any:
+        with self._lock:
+            version = self._read_version()
+            if version != self._cache_version:
+                self._cache.clear()
+                self._cache_version = version
+            elif key in self._cache:
+                self.cache_hits += 1
+                self._cache.move_to_end(key)
+                return self._cache[key]
+            self.cache_misses += 1
+            value = load(*args)
+            self._cache[key] = value
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+            return value
+
+    def _get(self, item_id: int) -> Optional[Tuple[T, int]]:
+        row = self._db.execute("SELECT data, version FROM items WHERE id = ?",
+                               (item_id,)).fetchone()
+        return None if row is None else (self._load(row[0]), row[1])
+
+    def _count(self) -> int:
+        return self._db.execute("SELECT count(*) FROM items").fetchone()[0]
+
+    def _page(self, limit: int, cursor: Optional[str],
+              is_done: Optional[bool], prefix: Optional[str]) -> Page:
+        where, params = [], []
+        if is_done is not None:
+            where.append("is_done = ?")
+            params.append(int(is_done))
+        if prefix is None:
+            order = "id"
+            if cursor is not None:
+                (after,) = _cursor_parts(cursor, int)
+                where.append("id > ?")
+                params.append(after)
+        else:
+            order = "text_key, id"
+            key = _text_key(prefix)
+            if key:
+                where.append("text_key >= ?")
+                params.append(key)
+                upper = _prefix_end(key)
+                if upper is not None:
+                    where.append("text_key < ?")
+                    params.append(upper)
+            if cursor is not None:
+                last_text, last_id = _cursor_parts(cursor, str, int)
+                where.append("(text_key, id) > (?, ?)")
+                params += [last_text, last_id]
+        sql = "SELECT id, text_key, data FROM items"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += f" ORDER BY {order} LIMIT ?"
+        rows = self._db.execute(sql, (*params, limit + 1)).fetchall()
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            last_id, last_text, _ = rows[-1]
+            next_cursor = (_encode_cursor(last_id) if prefix is None
+                           else _encode_cursor(last_text, last_id))
+        return Page([self._load(data) for _, _, data in rows], next_cursor)
+
+
+def _prefix_end(key: str) -> Optional[str]:
+    """
+    Smallest string above every string starting with `key`, or None if
+    there is none (`key` is all U+10FFFF).
+
+    UTF-8 byte order is code point order, so it is `key` with its last
+    character bumped - skipping the surrogates, which SQLite cannot
+    store, and carrying past U+10FFFF, which cannot be bumped.
+    """
+    key = key.rstrip(chr(0x10FFFF))
+    if not key:
+        return None
+    bumped = ord(key[-1]) + 1
+    if 0xD800 <= bumped <= 0xDFFF:
+        bumped = 0xE000
+    return key[:-1] + chr(bumped)
+
+
+class _Transaction:
+    """`BEGIN IMMEDIATE ... COMMIT` that also bumps the shared version.
+
+    IMMEDIATE takes the write lock up front, so a read-then-write (like
+    reading `next_id`) cannot race a writer in another process.
+    """
+
+    def __init__(self, db: sqlite3.Connection) -> None:
+        self.db = db
+
+    def __enter__(self) -> sqlite3.Connection:
+        self.db.execute("BEGIN IMMEDIATE")
+        return self.db
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if exc_type is None:
+            self.db.execute("UPDATE meta SET version = version + 1")
+            self.db.execute("COMMIT")
+        else:
+            self.db.execute("ROLLBACK")
@@ -1,6 +1,8 @@
+import main
 import pytest
 from httpx import AsyncClient
-from main import app
+from item_store import ItemStore
+from main import Item, app
 
 # TODO: Mock this
 
@@ -13,3 +15,28 @@ async def test_create_and_read_item():
         data = r.json()
         r2 = await ac.get(f"/items/{0}")
         assert r2.json() == data
+
+
+@pytest.mark.asyncio
+async def test_list_items_pages_with_cursor_header():
+    async with AsyncClient(app=app, base_url="http://test") as ac:
+        for i in range(3):
+            r = await ac.post("/items", json={"text": f"page {i}"})
+            assert r.headers["location"].startswith("/items/")
+        r = await ac.get("/items", params={"limit": 2, "prefix": "page"})
+        assert [i["text"] for i in r.json()] == ["page 0", "page 1"]
+        cursor = r.headers["x-next-cursor"]
+        r2 = await ac.get("/items", params={"limit": 2, "prefix": "page",
+                                            "cursor": cursor})
+        assert [i["text"] for i in r2.json()] == ["page 2"]
+        assert "x-next-cursor" not in r2.headers
+
+
+@pytest.mark.asyncio
+async def test_ids_past_a_million_are_served(monkeypatch):
+    store = ItemStore()
+    store.put(1_500_000, Item(text="late"))
+    monkeypatch.setattr(main, "items", store)
+    async with AsyncClient(app=app, base_url="http://test") as ac:
+        assert (await ac.get("/items/1500000")).json()["text"] == "late"
+        assert (await ac.get(f"/items/{2**63}")).status_code == 422
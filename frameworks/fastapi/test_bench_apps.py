@@ -0,0 +1,36 @@
+import sys
+from pathlib import Path
+
+import pytest
+from bench_apps import best_of, compare, load_youtube, run, Scenario
+
+BASE = {"rps": 1000.0, "errors": 0, "p50_ms": 1.0, "p95_ms": 2.0,
+        "p99_ms": 4.0}
+
+
+def test_compare_flags_only_changes_beyond_the_threshold():
+    within = dict(BASE, rps=850.0, p99_ms=4.8)
+    assert compare({"s": within}, {"s": BASE}, 0.2) == []
+    worse = dict(BASE, rps=700.0, p95_ms=3.0, errors=2)
+    assert compare({"s": worse}, {"s": BASE}, 0.2) == [
+        "s: rps 1000.0 -> 700.0", "s: p95_ms 2.0 -> 3.0",
+        "s: 2 error responses"]
+    assert compare({"new": worse}, {"s": BASE}, 0.2) == []
+
+
+def test_best_of_takes_each_metrics_best_round():
+    slow = dict(BASE, rps=500.0, p50_ms=0.5)
+    assert best_of([BASE, slow]) == dict(BASE, p50_ms=0.5)
+
+
+@pytest.mark.asyncio
+async def test_youtube_app_loads_beside_main_and_runs():
+    path = list(sys.path)
+    app, reset, reads, writes = load_youtube()
+    import main
+    assert app is not main.app
+    assert Path(main.__file__).parent == Path(__file__).parent
+    assert sys.path == path  # nothing left behind to shadow `main`
+    result = await run(Scenario("youtube-mixed", app, reset, reads, writes),
+                       0.5, requests=40, concurrency=4, seed=0)
+    assert result["errors"] == 0 and result["rps"] > 0
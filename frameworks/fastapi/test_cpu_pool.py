@@ -0,0 +1,113 @@
+import asyncio
+import time
+
+import main
+import pytest
+import pytest_asyncio
+from cpu_pool import (ClientDisconnected, CPUPool, PoolBusyError,
+                      cancel_on_disconnect)
+from fastapi import FastAPI, Request, Response
+from httpx import AsyncClient
+from primes import check_primes, is_prime
+
+
+def naive_is_prime(n):
+    return n >= 2 and all(n % d for d in range(2, int(n ** 0.5) + 1))
+
+
+def test_is_prime_matches_trial_division():
+    assert [n for n in range(2000) if is_prime(n)] == \
+        [n for n in range(2000) if naive_is_prime(n)]
+    assert is_prime(2**61 - 1) and not is_prime(2**61 + 1)
+
+
+@pytest_asyncio.fixture
+async def pool():
+    pool = await CPUPool(max_workers=2, max_pending=4,
+                         warm_up_module="primes").start()
+    yield pool
+    pool.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_map_runs_chunks_in_workers_in_order(pool):
+    results = await pool.map(check_primes, [([2, 4],), ([5, 9, 11],)])
+    assert results == [[True, False], [True, False, True]]
+    assert await pool.run(is_prime, 97) is True
+    await asyncio.sleep(0.05)  # done-callbacks hop back onto the loop
+    assert pool.pending == 0
+
+
+@pytest.mark.asyncio
+async def test_full_queue_rejects_the_whole_request(pool):
+    with pytest.raises(PoolBusyError):
+        await pool.map(time.sleep, [(0,)] * 5)
+    assert pool.pending == 0 and pool.rejected == 1
+
+
+@pytest.mark.asyncio
+async def test_cancelling_the_caller_cancels_queued_chunks(pool):
+    pool.max_pending = 8
+    job = asyncio.ensure_future(pool.map(time.sleep, [(0.3,)] * 8))
+    await asyncio.sleep(0.05)
+    job.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await job
+    started = time.perf_counter()
+    while pool.pending and time.perf_counter() - started < 2:
+        await asyncio.sleep(0.01)
+    # Only the chunks already handed to the executor's call queue (two
+    # running, one prefetched) still run; all 8 would take 1.2s.
+    assert pool.pending == 0
+    assert time.perf_counter() - started < 0.9
+
+
+@pytest.mark.asyncio
+async def test_disconnect_cancels_the_job():
+    cancelled = asyncio.Event()
+    test_app = FastAPI()
+
+    async def slow_job():
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.set()
+            raise
+
+    @test_app.get("/")
+    async def handler(request: Request):
+        try:
+            return await cancel_on_disconnect(request, slow_job())
+        except ClientDisconnected:
+            return Response(status_code=499)
+
+    messages = iter([{"type": "http.request", "body": b""},
+                     {"type": "http.disconnect"}])
+    sent = []
+
+    async def receive():
+        await asyncio.sleep(0.01)
+        return next(messages)
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {"type": "http", "method": "GET", "path": "/", "headers": [],
+             "query_string": b"", "http_version": "1.1", "scheme": "http",
+             "server": ("test", 80), "root_path": ""}
+    await asyncio.wait_for(test_app(scope, receive, send), 2)
+    assert cancelled.is_set()
+    assert sent[0]["status"] == 499
+
+
+@pytest.mark.asyncio
+async def test_demo_primes_endpoint(monkeypatch):
+    monkeypatch.setenv("CPU_POOL_WORKERS", "2")
+    async with main.app.router.lifespan_context(main.app):
+        async with AsyncClient(app=main.app, base_url="http://test") as ac:
+            r = await ac.post("/primes", json={"numbers": list(range(5000))})
+            assert r.status_code == 200
+            assert r.json()["primes"] == \
+                [n for n in range(5000) if naive_is_prime(n)]
+            bad = await ac.post("/primes", json={"numbers": [-1]})
+            assert bad.status_code == 422
@@ -0,0 +1,30 @@
+from typing import List
+
+import pytest
+from fast_json import json_response, serializer_for
+from httpx import AsyncClient
+from main import APIResponse, Item, app
+
+
+def test_serializer_is_compiled_once_per_type():
+    assert serializer_for(List[Item]) is serializer_for(List[Item])
+
+
+def test_json_response_matches_fastapi_encoding():
+    items = [Item(text="a"), Item(text="b", is_done=True)]
+    response = json_response(items, List[Item], headers={"X-Test": "1"})
+    assert response.body == (b'[{"text":"a","is_done":false},'
+                             b'{"text":"b","is_done":true}]')
+    assert response.headers["content-type"] == "application/json"
+    assert response.headers["x-test"] == "1"
+
+
+@pytest.mark.asyncio
+async def test_wrapped_item_uses_fast_path():
+    async with AsyncClient(app=app, base_url="http://test") as ac:
+        r = await ac.post("/items", json={"text": "wrap me"})
+        item_id = r.headers["location"].rsplit("/", 1)[1]
+        r2 = await ac.get(f"/items/{item_id}/wrap")
+    assert r2.json() == {"data": {"text": "wrap me", "is_done": False},
+                         "success": True}
+    assert "APIResponse" in str(app.openapi()["components"]["schemas"])
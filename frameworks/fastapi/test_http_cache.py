@@ -0,0 +1,86 @@
+import main
+import pytest
+from fastapi import FastAPI, Request
+from http_cache import CachedPage, PageCache, make_etag, not_modified
+from httpx import AsyncClient
+from item_store import ItemStore
+from main import Item
+from sqlite_store import SQLiteItemStore
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("header,expected", [
+    (None, False), ('"g-1"', True), ('W/"g-1"', True), ('"g-0", "g-1"', True),
+    ("*", True), ('"g-2"', False), ('"h-1"', False)])
+async def test_not_modified_uses_weak_comparison(header, expected):
+    probe = FastAPI()
+
+    @probe.get("/")
+    async def check(request: Request):
+        return not_modified(request, make_etag("g", 1))
+
+    headers = {} if header is None else {"If-None-Match": header}
+    async with AsyncClient(app=probe, base_url="http://t") as ac:
+        assert (await ac.get("/", headers=headers)).json() is expected
+
+
+def test_page_cache_is_invalidated_by_a_new_version():
+    cache = PageCache(max_entries=2)
+    cache.put("k", 1, CachedPage(b"[]", None))  # no version seen yet
+    assert cache.get("k", 1) is None
+    cache.put("k", 1, CachedPage(b"[]", None))
+    assert cache.get("k", 1) == CachedPage(b"[]", None)
+    assert cache.get("k", 2) is None  # a write happened
+    cache.put("k", 1, CachedPage(b"stale", None))  # late, older build
+    assert cache.get("k", 2) is None
+
+
+@pytest.mark.parametrize("make_store", [
+    lambda tmp_path: ItemStore(),
+    lambda tmp_path: SQLiteItemStore(str(tmp_path / "i.db"), Item)])
+def test_item_versions_only_move_when_the_item_is_written(tmp_path,
+                                                          make_store):
+    store = make_store(tmp_path)
+    a = store.add(Item(text="a"))
+    b = store.add(Item(text="b"))
+    _, version_a = store.get_versioned(a)
+    store.update(b, Item(text="b2"))
+    assert store.get_versioned(a)[1] == version_a
+    assert store.get_versioned(b)[1] == store.version
+    store.delete(b)
+    assert store.get_versioned(b) is None
+
+
+def test_sqlite_generation_is_shared_by_every_worker(tmp_path):
+    path = str(tmp_path / "i.db")
+    assert SQLiteItemStore(path, Item).generation == \
+        SQLiteItemStore(path, Item).generation
+    assert ItemStore().generation != ItemStore().generation
+
+
+@pytest.mark.asyncio
+async def test_conditional_gets_on_the_demo_app(monkeypatch):
+    monkeypatch.setattr(main, "items", ItemStore())
+    async with AsyncClient(app=main.app, base_url="http://test") as ac:
+        item_url = (await ac.post("/items", json={"text": "poll me"})
+                    ).headers["location"]
+        first = await ac.get("/items")
+        etag = first.headers["etag"]
+        assert first.headers["cache-control"] == "no-cache"
+        hits = main.page_cache.hits
+        again = await ac.get("/items", headers={"If-None-Match": etag})
+        assert again.status_code == 304 and again.content == b""
+        assert main.page_cache.hits == hits  # 304 never touched the cache
+        assert (await ac.get("/items")).content == first.content
+        assert main.page_cache.hits == hits + 1
+
+        item = await ac.get(item_url)
+        item_etag = item.headers["etag"]
+        await ac.post("/items", json={"text": "another"})
+        # A write changes the list but not the untouched item.
+        changed = await ac.get("/items", headers={"If-None-Match": etag})
+        assert changed.status_code == 200 and len(changed.json()) == 2
+        unchanged = await ac.get(item_url,
+                                 headers={"If-None-Match": item_etag})
+        assert unchanged.status_code == 304
+        assert unchanged.headers["etag"] == item_etag
@@ -0,0 +1,99 @@
+import threading
+
+import pytest
+from item_store import ItemStore
+from main import Item
+
+
+@pytest.fixture
+def store():
+    return ItemStore()
+
+
+def test_ids_are_stable_after_delete(store):
+    first = store.add(Item(text="a"))
+    second = store.add(Item(text="b"))
+    store.delete(first)
+    assert store.get(first) is None
+    assert store.get(second).text == "b"
+    assert store.add(Item(text="c")) == 2  # IDs are never reused
+
+
+def test_cursor_pagination_walks_every_item_once(store):
+    for i in range(25):
+        store.add(Item(text=f"item {i}"))
+    seen, cursor = [], None
+    while True:
+        page = store.page(10, cursor)
+        seen.extend(item.text for item in page.items)
+        cursor = page.next_cursor
+        if cursor is None:
+            break
+    assert seen == [f"item {i}" for i in range(25)]
+
+
+def test_is_done_index_follows_updates(store):
+    item_id = store.add(Item(text="laundry"))
+    store.add(Item(text="dishes", is_done=True))
+    store.update(item_id, Item(text="laundry", is_done=True))
+    done = store.page(10, is_done=True).items
+    assert [i.text for i in done] == ["laundry", "dishes"]
+    assert store.page(10, is_done=False).items == []
+
+
+def test_prefix_index_is_case_insensitive_and_pages(store):
+    for text in ["Buy milk", "buy eggs", "sell car", "buy bread"]:
+        store.add(Item(text=text))
+    page = store.page(2, prefix="BUY")
+    assert [i.text for i in page.items] == ["buy bread", "buy eggs"]
+    rest = store.page(2, page.next_cursor, prefix="buy")
+    assert [i.text for i in rest.items] == ["Buy milk"]
+    assert rest.next_cursor is None
+
+
+def test_invalid_cursor_raises_value_error(store):
+    with pytest.raises(ValueError, match="Invalid cursor"):
+        store.page(10, "not-a-cursor")
+
+
+def test_concurrent_adds_hand_out_unique_ids(store):
+    def worker():
+        for _ in range(1000):
+            store.add(Item(text="x"))
+
+    threads = [threading.Thread(target=worker) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len(store) == 8000
+    assert len(store.page(1000, is_done=False).items) == 1000
+
+
+def test_add_many_keeps_indexes_sorted(store):
+    store.add(Item(text="m"))
+    ids = store.add_many([Item(text="z"), Item(text="a", is_done=True)])
+    assert list(ids) == [1, 2]
+    assert [i.text for i in store.page(10, prefix="").items] == ["a", "m", "z"]
+    assert [i.text for i in store.page(10, is_done=True).items] == ["a"]
+
+
+def test_add_many_stores_nothing_if_the_iterable_fails(store):
+    def items():
+        yield Item(text="a")
+        raise RuntimeError("source broke")
+
+    with pytest.raises(RuntimeError):
+        store.add_many(items())
+    assert len(store) == 0
+    assert store.page(10, prefix="").items == []
+    assert store.add(Item(text="b")) == 0
+
+
+def test_put_inserts_or_replaces_under_a_given_id(store):
+    store.put(5, Item(text="b"))
+    store.put(5, Item(text="a", is_done=True))
+    assert store.get(5).text == "a"
+    assert [i.text for i in store.page(10, prefix="").items] == ["a"]
+    assert [i.text for i in store.page(10, is_done=True).items] == ["a"]
+    assert store.add(Item(text="c")) == 6
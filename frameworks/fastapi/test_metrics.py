@@ -0,0 +1,48 @@
+import pytest
+from httpx import AsyncClient
+from main import app
+from metrics import LatencyHistogram, MetricsRegistry, timed_dependency
+
+
+@pytest.mark.parametrize("value", [0, 1, 31, 32, 33, 1000, 123_456, 10**9])
+def test_bucket_bounds_are_within_precision(value):
+    index = LatencyHistogram.bucket_index(value)
+    upper = LatencyHistogram.bucket_upper_bound(index)
+    assert value <= upper <= value * 1.07 + 1
+
+
+def test_quantiles():
+    histogram = LatencyHistogram()
+    for micros in range(1, 1001):
+        histogram.record(micros)
+    q = histogram.quantiles((0.5, 0.99))
+    assert 500 <= q[0.5] <= 530
+    assert 990 <= q[0.99] <= 1055
+    assert histogram.count == 1000
+
+
+def test_timed_dependency_keeps_signature_and_records():
+    registry = MetricsRegistry()
+
+    @timed_dependency(registry)
+    def provider(x: int) -> int:
+        return x * 2
+
+    assert provider(21) == 42
+    assert provider.__wrapped__.__name__ == "provider"
+    assert registry.dependencies["provider"].count == 1
+
+
+@pytest.mark.asyncio
+async def test_metrics_endpoint_reports_routes_and_dependencies():
+    async with AsyncClient(app=app, base_url="http://test") as ac:
+        await ac.get("/settings")
+        await ac.get("/items/999999")
+        await ac.get("/no-such-route")
+        body = (await ac.get("/metrics")).text
+    assert 'http_request_duration_seconds_count{method="GET",route="/settings"}' in body
+    assert ('http_responses_total{method="GET",route="/items/{item_id}",'
+            'status="404"}') in body
+    assert 'route="<unmatched>"' in body
+    assert 'dependency_duration_seconds_count{dependency="get_settings"}' in body
+    assert "http_requests_in_flight 1" in body  # the /metrics call itself
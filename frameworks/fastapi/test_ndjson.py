@@ -0,0 +1,79 @@
+import json
+
+import pytest
+from httpx import AsyncClient
+from item_store import ItemStore
+from main import Item, app
+from ndjson import (MAX_LINE_BYTES, NDJSONError, iter_line_batches,
+                    iter_ndjson, parse_batch)
+
+
+async def chunked(data, size):
+    for i in range(0, len(data), size):
+        yield data[i:i + size]
+
+
+async def collect(chunks, batch_size):
+    return [b async for b in iter_line_batches(chunks, batch_size)]
+
+
+@pytest.mark.asyncio
+async def test_lines_are_reassembled_across_chunk_boundaries():
+    body = b'{"text": "a"}\n\n{"text": "b"}\n{"text": "c"}'
+    batches = await collect(chunked(body, 3), batch_size=2)
+    assert batches == [[(1, b'{"text": "a"}'), (3, b'{"text": "b"}')],
+                       [(4, b'{"text": "c"}')]]
+
+
+def test_parse_batch_reports_the_bad_line():
+    batch = [(1, b'{"text": "ok"}'), (2, b'{"is_done": true}')]
+    with pytest.raises(NDJSONError) as info:
+        parse_batch(batch, Item)
+    assert info.value.line == 2
+    assert "text" in str(info.value)
+
+
+def test_parse_batch_rejects_two_documents_on_one_line():
+    with pytest.raises(NDJSONError, match="line 1"):
+        parse_batch([(1, b'{"text": "a"},{"text": "b"}')], Item)
+
+
+def test_parse_batch_rejects_a_document_split_across_lines():
+    batch = [(1, b'{"text": "a"},{"text": "b"'), (2, b'"is_done": true}')]
+    with pytest.raises(NDJSONError, match="line 1"):
+        parse_batch(batch, Item)
+
+
+@pytest.mark.asyncio
+async def test_long_complete_lines_are_rejected_too():
+    long_line = b'{"text": "' + b"x" * MAX_LINE_BYTES + b'"}'
+    body = b'{"text": "a"}\n' + long_line + b'\n{"text": "b"}\n'
+    with pytest.raises(NDJSONError, match="line 2: line too long"):
+        await collect(chunked(body, len(body)), batch_size=10)
+
+
+@pytest.mark.asyncio
+async def test_export_pages_through_the_store():
+    store = ItemStore()
+    store.add_many(Item(text=f"n{i}") for i in range(5))
+    chunks = [c async for c in iter_ndjson(store, Item, page_size=2)]
+    assert len(chunks) == 3
+    lines = b"".join(chunks).splitlines()
+    assert [json.loads(line)["text"] for line in lines] == [
+        "n0", "n1", "n2", "n3", "n4"]
+
+
+@pytest.mark.asyncio
+async def test_bulk_endpoint_ingests_and_reports_errors():
+    body = "\n".join(json.dumps({"text": f"bulk {i}"}) for i in range(2500))
+    async with AsyncClient(app=app, base_url="http://test") as ac:
+        r = await ac.post("/items/bulk", content=body)
+        assert r.status_code == 201
+        assert r.json() == {"created": 2500}
+        bad = await ac.post("/items/bulk",
+                            content='{"text": "fine"}\n{"text": 5}\n')
+        assert bad.status_code == 422
+        assert bad.json()["line"] == 2
+        exported = await ac.get("/items/export")
+    texts = [json.loads(line)["text"] for line in exported.text.splitlines()]
+    assert texts.count("bulk 2499") == 1
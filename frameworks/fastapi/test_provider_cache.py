@@ -0,0 +1,119 @@
+import asyncio
+
+import pytest
+from fastapi import Depends, FastAPI
+from httpx import AsyncClient
+from main import app, get_settings
+from provider_cache import cached_provider
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def make_app(provider):
+    test_app = FastAPI()
+
+    @test_app.get("/")
+    async def read(value=Depends(provider)):
+        return value
+
+    return test_app
+
+
+@pytest.mark.asyncio
+async def test_app_scope_calls_provider_once():
+    calls = []
+
+    @cached_provider()
+    def provider():
+        calls.append(1)
+        return {"n": len(calls)}
+
+    async with AsyncClient(app=make_app(provider), base_url="http://t") as ac:
+        bodies = [(await ac.get("/")).json() for _ in range(3)]
+    assert bodies == [{"n": 1}] * 3
+    assert (provider.stats.hits, provider.stats.misses) == (2, 1)
+
+
+@pytest.mark.asyncio
+async def test_ttl_refreshes_in_background_then_expires():
+    clock, calls = FakeClock(), []
+
+    @cached_provider(ttl=10, refresh_ahead=0.5, clock=clock)
+    async def provider():
+        calls.append(clock.now)
+        return len(calls)
+
+    async with AsyncClient(app=make_app(provider), base_url="http://t") as ac:
+        assert (await ac.get("/")).json() == 1
+        clock.now = 6  # past refresh_at: stale-ish value, refresh kicked off
+        assert (await ac.get("/")).json() == 1
+        await asyncio.sleep(0)
+        assert (await ac.get("/")).json() == 2
+        clock.now = 100  # fully expired: caller waits for a fresh load
+        assert (await ac.get("/")).json() == 3
+    assert provider.stats.refreshes == 1
+
+
+@pytest.mark.asyncio
+async def test_concurrent_misses_share_one_load():
+    calls = []
+
+    @cached_provider(ttl=60)
+    async def provider():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return "value"
+
+    async with AsyncClient(app=make_app(provider), base_url="http://t") as ac:
+        results = await asyncio.gather(*(ac.get("/") for _ in range(20)))
+    assert {r.json() for r in results} == {"value"}
+    assert len(calls) == 1
+    assert provider.stats.coalesced == 19
+
+
+@pytest.mark.asyncio
+async def test_request_scope_is_fresh_per_request():
+    calls = []
+
+    @cached_provider(scope="request")
+    def provider():
+        calls.append(1)
+        return len(calls)
+
+    async with AsyncClient(app=make_app(provider), base_url="http://t") as ac:
+        assert [(await ac.get("/")).json() for _ in range(2)] == [1, 2]
+
+
+@pytest.mark.asyncio
+async def test_per_request_arguments_do_not_grow_the_cache():
+    @cached_provider(max_entries=2)
+    def provider(marker=Depends(object)):  # a new key on every request
+        return "value"
+
+    test_app = make_app(provider)
+    async with AsyncClient(app=test_app, base_url="http://t") as ac:
+        for _ in range(5):
+            assert (await ac.get("/")).json() == "value"
+    assert provider.cache_size(test_app) == 2
+    assert provider.stats.misses == 5
+
+
+def test_rejects_unknown_scope():
+    with pytest.raises(ValueError, match="Unknown cache scope"):
+        cached_provider(scope="session")
+
+
+@pytest.mark.asyncio
+async def test_settings_provider_is_cached_in_demo_app():
+    get_settings.cache_clear()
+    async with AsyncClient(app=app, base_url="http://test") as ac:
+        for _ in range(3):
+            r = await ac.get("/settings")
+            assert r.json() == {"app_name": "DemoApp", "debug": True}
+    assert get_settings.stats.hits >= 2
@@ -0,0 +1,130 @@
+import asyncio
+
+import pytest
+from fastapi import FastAPI
+from httpx import AsyncClient
+from main import app
+from ratelimit import Limit, Limiter, RateLimitMiddleware, TokenBucket
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def make_app(limiter):
+    test_app = FastAPI()
+    gate = asyncio.Event()
+
+    @test_app.get("/fast")
+    async def fast():
+        return {"ok": True}
+
+    @test_app.get("/slow/{n}")
+    async def slow(n: int):
+        await gate.wait()
+        return {"n": n}
+
+    test_app.add_middleware(RateLimitMiddleware, limiter=limiter)
+    return test_app, gate
+
+
+def test_token_bucket_refills_at_rate():
+    bucket = TokenBucket(Limit(rate=2, burst=2), now=0.0)
+    assert bucket.refill(0.0) == 0 and bucket.tokens == 2  # spends nothing
+    bucket.tokens = 0
+    assert bucket.refill(0.0) == pytest.approx(0.5)
+    assert bucket.refill(0.5) == 0 and bucket.tokens == 1
+    assert bucket.refill(100.0) == 0 and bucket.tokens == 2  # capped at burst
+
+
+def test_check_rate_spends_one_token_per_admitted_request():
+    clock = FakeClock()
+    limiter = Limiter(client_limit=Limit(rate=2, burst=2), clock=clock)
+    scope = {"path": "/fast", "client": ("1.2.3.4", 1)}
+    assert limiter.check_rate(scope) == limiter.check_rate(scope) == 0
+    assert limiter.check_rate(scope) == pytest.approx(0.5)
+    clock.now = 0.5  # one token refilled
+    assert limiter.check_rate(scope) == 0
+    assert limiter.buckets[("1.2.3.4", "")].tokens == 0
+
+
+@pytest.mark.asyncio
+async def test_client_and_route_limits_answer_429_with_retry_after():
+    clock = FakeClock()
+    limiter = Limiter(client_limit=Limit(rate=1, burst=3),
+                      route_limits={"/slow/{n}": Limit(rate=0.1, burst=1)},
+                      clock=clock)
+    test_app, gate = make_app(limiter)
+    gate.set()
+    async with AsyncClient(app=test_app, base_url="http://t") as ac:
+        assert (await ac.get("/slow/1")).status_code == 200
+        r = await ac.get("/slow/2")  # route bucket is empty for 10s
+        assert r.status_code == 429 and r.headers["retry-after"] == "10"
+        # The rejected /slow/2 cost no client token: two more /fast fit.
+        assert (await ac.get("/fast")).status_code == 200
+        assert (await ac.get("/fast")).status_code == 200
+        r = await ac.get("/fast")  # client bucket: 3 spent
+        assert r.status_code == 429 and r.headers["retry-after"] == "1"
+        clock.now += 1
+        assert (await ac.get("/fast")).status_code == 200
+    assert limiter.rejected["rate_limited"] == 2
+
+
+def test_a_rejected_request_spends_no_tokens():
+    clock = FakeClock()
+    limiter = Limiter(client_limit=Limit(rate=1, burst=2),
+                      route_limits={"/slow/{n}": Limit(rate=1, burst=1)},
+                      clock=clock)
+    slow = {"path": "/slow/1", "client": ("1.2.3.4", 1)}
+    assert limiter.check_rate(slow) == 0
+    for _ in range(5):  # route bucket empty: the client bucket is untouched
+        assert limiter.check_rate(slow) == pytest.approx(1)
+    assert limiter.buckets[("1.2.3.4", "")].tokens == 1
+    assert limiter.check_rate({**slow, "path": "/fast"}) == 0
+
+
+@pytest.mark.asyncio
+async def test_overload_queues_then_sheds_with_503():
+    limiter = Limiter(max_concurrency=2, max_queue=1, max_queue_delay=0.2)
+    test_app, gate = make_app(limiter)
+    async with AsyncClient(app=test_app, base_url="http://t") as ac:
+        running = [asyncio.ensure_future(ac.get(f"/slow/{i}"))
+                   for i in range(3)]  # two run, one queues
+        await asyncio.sleep(0.05)
+        assert (limiter.in_flight, limiter.waiting) == (2, 1)
+        r = await ac.get("/fast")  # queue full: shed at once
+        assert r.status_code == 503 and r.headers["retry-after"] == "1"
+        gate.set()
+        assert [r.status_code for r in await asyncio.gather(*running)] == \
+            [200] * 3
+    assert limiter.in_flight == 0
+    assert limiter.rejected["overloaded"] == 1
+
+
+@pytest.mark.asyncio
+async def test_queued_request_is_shed_after_max_queue_delay():
+    limiter = Limiter(max_concurrency=1, max_queue=10, max_queue_delay=0.05)
+    test_app, gate = make_app(limiter)
+    async with AsyncClient(app=test_app, base_url="http://t") as ac:
+        first = asyncio.ensure_future(ac.get("/slow/1"))
+        await asyncio.sleep(0.01)
+        assert (await ac.get("/fast")).status_code == 503  # waited too long
+        # The queue is known to be slow now: the next arrival is not queued.
+        assert (await ac.get("/fast")).status_code == 503
+        assert limiter.waiting == 0
+        gate.set()
+        assert (await first).status_code == 200
+        assert (await ac.get("/fast")).status_code == 200
+    assert limiter.in_flight == 0
+
+
+@pytest.mark.asyncio
+async def test_demo_app_exposes_rejections_on_metrics():
+    async with AsyncClient(app=app, base_url="http://test") as ac:
+        body = (await ac.get("/metrics")).text
+    assert 'http_requests_rejected_total{reason="overloaded"}' in body
+    assert "http_requests_queued 0" in body
@@ -0,0 +1,202 @@
+import asyncio
+import json
+
+import httpx
+import pytest
+from httpx import AsyncClient
+from main import app, get_scraper
+from scrape_pool import Scraper
+
+
+def make_transport(calls, delay=0.01, active=None):
+    async def handler(request):
+        calls.append(str(request.url))
+        if active is not None:
+            active["now"] += 1
+            active["peak"] = max(active["peak"], active["now"])
+        await asyncio.sleep(delay)
+        if active is not None:
+            active["now"] -= 1
+        if request.url.path == "/missing":
+            return httpx.Response(404)
+        return httpx.Response(200, text=f"page {request.url.path}")
+
+    return httpx.MockTransport(handler)
+
+
+@pytest.mark.asyncio
+async def test_concurrent_requests_for_one_url_are_coalesced():
+    calls = []
+    scraper = Scraper(transport=make_transport(calls))
+    results = await asyncio.gather(
+        *(scraper.fetch("http://a.test/x") for _ in range(50)))
+    await scraper.aclose()
+    assert results == ["page /x"] * 50
+    assert len(calls) == 1
+    assert scraper.coalesced == 49
+
+
+@pytest.mark.asyncio
+async def test_per_host_concurrency_is_capped():
+    calls, active = [], {"now": 0, "peak": 0}
+    scraper = Scraper(max_per_host=3,
+                      transport=make_transport(calls, active=active))
+    urls = [f"http://a.test/{i}" for i in range(20)]
+    await scraper.fetch_many(urls)
+    await scraper.aclose()
+    assert len(calls) == 20
+    assert active["peak"] == 3
+    assert scraper._hosts == {}  # per-host semaphores are released
+
+
+@pytest.mark.asyncio
+async def test_a_busy_host_does_not_hold_up_other_hosts():
+    release = asyncio.Event()
+
+    async def handler(request):
+        if request.url.host == "a.test":
+            await release.wait()
+        return httpx.Response(200, text=request.url.host)
+
+    scraper = Scraper(max_connections=4, max_per_host=2,
+                      transport=httpx.MockTransport(handler))
+    busy = asyncio.ensure_future(scraper.fetch_many(
+        [f"http://a.test/{i}" for i in range(10)]))
+    await asyncio.sleep(0.01)
+    assert await asyncio.wait_for(scraper.fetch("http://b.test/"), 1) == \
+        "b.test"
+    release.set()
+    assert await busy == ["a.test"] * 10
+    await scraper.aclose()
+
+
+@pytest.mark.asyncio
+async def test_http_errors_propagate():
+    scraper = Scraper(transport=make_transport([]))
+    with pytest.raises(httpx.HTTPStatusError):
+        await scraper.fetch("http://a.test/missing")
+    await scraper.aclose()
+
+
+@pytest.mark.asyncio
+async def test_scrape_endpoint_uses_injected_scraper():
+    scraper = Scraper(transport=make_transport([]))
+    app.dependency_overrides[get_scraper] = lambda: scraper
+    try:
+        async with AsyncClient(app=app, base_url="http://test") as ac:
+            r = await ac.get("/scrape",
+                             params={"urls": "http://a.test/1,http://b.test/2"})
+    finally:
+        app.dependency_overrides.clear()
+        await scraper.aclose()
+    assert r.json() == {"results": ["page /1", "page /2"]}
+
+
+@pytest.mark.asyncio
+async def test_iter_completed_yields_in_completion_order_with_errors():
+    async def handler(request):
+        await asyncio.sleep(0.05 if request.url.path == "/slow" else 0)
+        if request.url.path == "/missing":
+            return httpx.Response(404)
+        return httpx.Response(200, text=request.url.path)
+
+    scraper = Scraper(transport=httpx.MockTransport(handler))
+    urls = ["http://a.test/slow", "http://a.test/missing", "http://a.test/fast"]
+    results = [r async for r in scraper.iter_completed(urls)]
+    await scraper.aclose()
+    assert results[-1] == {"url": "http://a.test/slow", "result": "/slow"}
+    assert {"url": "http://a.test/missing", "error": "HTTP 404"} in results
+
+
+@pytest.mark.asyncio
+async def test_iter_completed_bounds_in_flight_fetches():
+    calls, active = [], {"now": 0, "peak": 0}
+    scraper = Scraper(transport=make_transport(calls, active=active))
+    urls = (f"http://host{i}.test/" for i in range(30))  # distinct hosts
+    results = [r async for r in scraper.iter_completed(urls, window=4)]
+    await scraper.aclose()
+    assert len(results) == 30
+    assert active["peak"] == 4
+
+
+@pytest.mark.asyncio
+async def test_scrape_endpoint_streams_ndjson():
+    scraper = Scraper(transport=make_transport([]))
+    app.dependency_overrides[get_scraper] = lambda: scraper
+    try:
+        async with AsyncClient(app=app, base_url="http://test") as ac:
+            r = await ac.get("/scrape", params={
+                "urls": "http://a.test/1,http://a.test/missing",
+                "stream": "ndjson"})
+    finally:
+        app.dependency_overrides.clear()
+        await scraper.aclose()
+    assert r.headers["content-type"].startswith("application/x-ndjson")
+    lines = [json.loads(line) for line in r.text.splitlines()]
+    assert sorted(lines, key=lambda d: d["url"]) == [
+        {"url": "http://a.test/1", "result": "page /1"},
+        {"url": "http://a.test/missing", "error": "HTTP 404"},
+    ]
+
+
+def make_slow_transport(started, cancelled):
+    async def handler(request):
+        if request.url.path != "/slow":
+            return httpx.Response(200, text=request.url.path)
+        started.append(str(request.url))
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.append(str(request.url))
+            raise
+        return httpx.Response(200, text="late")
+
+    return httpx.MockTransport(handler)
+
+
+@pytest.mark.asyncio
+async def test_stopping_a_stream_cancels_its_upstream_fetches():
+    started, cancelled = [], []
+    scraper = Scraper(transport=make_slow_transport(started, cancelled))
+    stream = scraper.iter_completed(["http://a.test/slow", "http://a.test/fast"])
+    assert await stream.__anext__() == {"url": "http://a.test/fast",
+                                        "result": "/fast"}
+    await stream.aclose()  # the client disconnected
+    await asyncio.sleep(0.05)  # let the cancellation reach the handler
+    await scraper.aclose()
+    assert started == cancelled == ["http://a.test/slow"]
+    assert scraper._inflight == {} and scraper._waiters == {}
+    assert scraper._hosts == {}
+
+
+@pytest.mark.asyncio
+async def test_stopping_a_stream_keeps_fetches_other_callers_wait_on():
+    started, cancelled = [], []
+    scraper = Scraper(transport=make_slow_transport(started, cancelled))
+    other = asyncio.ensure_future(scraper.fetch("http://a.test/slow"))
+    stream = scraper.iter_completed(["http://a.test/slow", "http://a.test/fast"])
+    await stream.__anext__()
+    await stream.aclose()
+    await asyncio.sleep(0.05)  # let the cancellation reach the handler
+    assert cancelled == [] and not other.done()
+    other.cancel()  # now the last waiter leaves
+    with pytest.raises(asyncio.CancelledError):
+        await other
+    await asyncio.sleep(0.05)  # let the cancellation reach the handler
+    await scraper.aclose()
+    assert cancelled == ["http://a.test/slow"]
+
+
+@pytest.mark.asyncio
+async def test_a_caller_after_the_last_waiter_left_starts_a_new_fetch():
+    calls = []
+    scraper = Scraper(transport=make_transport(calls, delay=0.05))
+    first = asyncio.ensure_future(scraper.fetch("http://a.test/x"))
+    await asyncio.sleep(0.01)
+    first.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await first
+    # Straight away, before the cancelled fetch has finished unwinding
+    assert await scraper.fetch("http://a.test/x") == "page /x"
+    await scraper.aclose()
+    assert len(calls) == 2
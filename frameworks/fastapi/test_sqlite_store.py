@@ -0,0 +1,109 @@
+import asyncio
+import multiprocessing
+import sqlite3
+
+import main
+import pytest
+from httpx import AsyncClient
+from item_store import ItemStore
+from main import Item
+from sqlite_store import SQLiteItemStore
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    return str(tmp_path / "items.db")
+
+
+def _all_pages(store, **filters):
+    seen, cursor = [], None
+    while True:
+        page = store.page(3, cursor, **filters)
+        seen.extend(item.text for item in page.items)
+        cursor = page.next_cursor
+        if cursor is None:
+            return seen
+
+
+@pytest.mark.parametrize("filters", [{}, {"is_done": True},
+                                     {"prefix": "b"}, {"prefix": ""},
+                                     {"prefix": "b", "is_done": False}])
+def test_pages_match_the_in_memory_store(db_path, filters):
+    memory, shared = ItemStore(), SQLiteItemStore(db_path, Item)
+    texts = ["banana", "Apple", "blueberry", "cherry", "Bean", "bagel", "b"]
+    for i, text in enumerate(texts):
+        for store in (memory, shared):
+            store.add(Item(text=text, is_done=i % 2 == 0))
+    for store in (memory, shared):
+        store.delete(2)
+        store.update(3, Item(text="beet", is_done=True))
+    assert _all_pages(shared, **filters) == _all_pages(memory, **filters)
+    assert len(shared) == len(memory) == 6
+    assert shared.items() == memory.items()
+
+
+def test_missing_ids_raise_like_item_store(db_path):
+    store = SQLiteItemStore(db_path, Item)
+    assert store.get(0) is None and 0 not in store
+    with pytest.raises(KeyError):
+        store.update(0, Item(text="x"))
+    with pytest.raises(KeyError):
+        store.delete(0)
+    with pytest.raises(ValueError):
+        store.page(cursor="not-a-cursor")
+
+
+def test_second_worker_sees_writes_and_drops_its_cache(db_path):
+    worker_a = SQLiteItemStore(db_path, Item)
+    worker_b = SQLiteItemStore(db_path, Item)
+    item_id = worker_a.add(Item(text="first"))
+    assert worker_b.get(item_id).text == "first"
+    assert worker_b.get(item_id).text == "first"
+    assert worker_b.cache_hits == 1
+    worker_a.update(item_id, Item(text="second"))
+    assert worker_b.get(item_id).text == "second"  # version moved: re-read
+    assert worker_b.page(10).items == [Item(text="second")]
+    assert worker_a.version == worker_b.version == 2
+
+
+def _add_items(path, n):
+    store = SQLiteItemStore(path, Item)
+    return [store.add(Item(text=f"item {i}")) for i in range(n)]
+
+
+def test_worker_processes_never_hand_out_the_same_id(db_path):
+    SQLiteItemStore(db_path, Item)  # create the schema once
+    with multiprocessing.get_context("spawn").Pool(3) as pool:
+        ids = pool.starmap(_add_items, [(db_path, 50)] * 3)
+    flat = [i for chunk in ids for i in chunk]
+    assert sorted(flat) == list(range(150))
+    assert len(SQLiteItemStore(db_path, Item)) == 150
+
+
+@pytest.mark.parametrize("prefix", ["a\U0010FFFF", "\U0010FFFF", "\ud7ff"])
+def test_prefixes_ending_in_unbumpable_characters(db_path, prefix):
+    memory, shared = ItemStore(), SQLiteItemStore(db_path, Item)
+    texts = [prefix, prefix + "x", "a", "b", "\ue000", "\U0010FFFF" * 2]
+    for text in texts:
+        for store in (memory, shared):
+            store.add(Item(text=text))
+    assert _all_pages(shared, prefix=prefix) == \
+        _all_pages(memory, prefix=prefix)
+
+
+@pytest.mark.asyncio
+async def test_a_write_waiting_for_a_lock_does_not_block_the_loop(
+        db_path, monkeypatch):
+    monkeypatch.setattr(main, "items", SQLiteItemStore(db_path, Item))
+    other_worker = sqlite3.connect(db_path, isolation_level=None)
+    other_worker.execute("BEGIN IMMEDIATE")  # holds the write lock
+    async with AsyncClient(app=main.app, base_url="http://test") as ac:
+        create = asyncio.ensure_future(
+            ac.post("/items", json={"text": "waits its turn"}))
+        await asyncio.sleep(0.05)
+        assert not create.done()  # busy_timeout: waiting for the lock
+        # ... while the event loop keeps serving other requests
+        assert (await asyncio.wait_for(ac.get("/"), 1)).status_code == 200
+        other_worker.execute("COMMIT")
+        assert (await create).status_code == 201
+    other_worker.close()
@@ -0,0 +1,140 @@
+import asyncio
+
+import main
+import pytest
+from httpx import AsyncClient
+from item_store import ItemStore
+from wal import Durability, WALCorruptError, WriteAheadLog
+
+
+def reopen(path, durability=Durability.FSYNC):
+    log = WriteAheadLog(path, durability)
+    return log, list(log.replay())
+
+
+def test_records_survive_reopen(tmp_path):
+    log = WriteAheadLog(tmp_path).start()
+    log.append("put", 0, {"text": "a"}).result()
+    log.append("put", 1, {"text": "b"}).result()
+    log.append("delete", 0).result()
+    log.close()
+    _, records = reopen(tmp_path)
+    assert records == [("put", 0, {"text": "a"}), ("put", 1, {"text": "b"}),
+                       ("delete", 0, None)]
+
+
+def test_checkpoint_folds_log_into_snapshot(tmp_path):
+    log = WriteAheadLog(tmp_path).start()
+    log.append("put", 0, {"text": "old"}).result()
+    log.checkpoint([(0, {"text": "new"})])
+    log.append("put", 1, {"text": "tail"}).result()
+    log.close()
+    log, records = reopen(tmp_path)
+    assert records == [("put", 0, {"text": "new"}), ("put", 1, {"text": "tail"})]
+    assert log.lsn == 2
+
+
+def test_torn_tail_is_ignored_but_corruption_is_not(tmp_path):
+    log = WriteAheadLog(tmp_path).start()
+    log.append("put", 0, {"text": "a"}).result()
+    log.close()
+    with open(tmp_path / "log", "ab") as f:
+        f.write(b'deadbeef {"lsn": 2, "op"')  # crash mid-append
+    assert len(reopen(tmp_path)[1]) == 1
+    with open(tmp_path / "log", "ab") as f:
+        f.write(b"\n" + b"0" * 20 + b"\n")
+    with pytest.raises(WALCorruptError):
+        reopen(tmp_path)
+
+
+def test_appends_after_a_torn_tail_survive_the_next_restart(tmp_path):
+    log = WriteAheadLog(tmp_path).start()
+    log.append("put", 0, {"text": "a"}).result()
+    log.close()
+    with open(tmp_path / "log", "ab") as f:
+        f.write(b'deadbeef {"lsn": 2, "op"')  # crash mid-append
+    log, records = reopen(tmp_path)  # restart, no checkpoint
+    log.start()
+    log.append("put", 1, {"text": "b"}).result()
+    log.close()
+    log, records = reopen(tmp_path)  # and again
+    assert records == [("put", 0, {"text": "a"}), ("put", 1, {"text": "b"})]
+    assert log.lsn == 2
+
+
+def test_start_without_replay_also_cuts_a_torn_tail(tmp_path):
+    log = WriteAheadLog(tmp_path).start()
+    log.append("put", 0, {"text": "a"}).result()
+    log.close()
+    with open(tmp_path / "log", "ab") as f:
+        f.write(b"torn")
+    log = WriteAheadLog(tmp_path).start()
+    log.close()
+    assert len(reopen(tmp_path)[1]) == 1
+
+
+def test_log_is_checkpointed_once_it_grows_too_big(tmp_path):
+    state = {}
+    log = WriteAheadLog(tmp_path, snapshot_rows=lambda: list(state.items()),
+                        checkpoint_bytes=2000).start()
+    for i in range(100):
+        state[i % 10] = {"text": str(i)}
+        log.append("put", i % 10, state[i % 10]).result()
+    log.close()
+    assert log.checkpoints > 0
+    assert (tmp_path / "log").stat().st_size < 2000 + 100
+    log, records = reopen(tmp_path)
+    replayed = {}
+    for op, key, data in records:
+        replayed[key] = data
+    assert replayed == state
+    assert log.lsn == 100
+
+
+@pytest.mark.asyncio
+async def test_concurrent_appends_are_group_committed(tmp_path):
+    log = WriteAheadLog(tmp_path).start()
+    lsns = await asyncio.gather(
+        *(log.append_async("put", i, {"text": str(i)}) for i in range(500)))
+    log.close()
+    assert sorted(lsns) == list(range(1, 501))
+    assert log.flushes < 500
+    assert len(reopen(tmp_path)[1]) == 500
+
+
+@pytest.mark.asyncio
+async def test_a_cancelled_append_does_not_stop_the_flusher(tmp_path):
+    log = WriteAheadLog(tmp_path).start()
+    with log._io_lock:  # hold the flusher until the waiter gave up
+        waiter = asyncio.ensure_future(
+            log.append_many_async([("put", 0, {"text": "a"})]))
+        await asyncio.sleep(0.01)
+        waiter.cancel()
+        await asyncio.sleep(0.01)
+    assert await asyncio.wait_for(log.append_async("put", 1, None), 5) == 2
+    assert log._thread.is_alive()
+    log.close()
+    assert len(reopen(tmp_path)[1]) == 2
+
+
+def test_durability_none_acknowledges_immediately(tmp_path):
+    log = WriteAheadLog(tmp_path, Durability.NONE).start()
+    assert log.append("put", 0, {"text": "a"}).done()
+    log.close()  # close drains the queue
+    assert len(reopen(tmp_path)[1]) == 1
+
+
+@pytest.mark.asyncio
+async def test_demo_app_replays_items_after_restart(tmp_path, monkeypatch):
+    monkeypatch.setenv("ITEMS_WAL_DIR", str(tmp_path))
+    monkeypatch.setattr(main, "items", ItemStore())
+    async with main.app.router.lifespan_context(main.app):
+        async with AsyncClient(app=main.app, base_url="http://test") as ac:
+            await ac.post("/items", json={"text": "persist me"})
+            await ac.post("/items/bulk", content='{"text": "me too"}\n')
+
+    monkeypatch.setattr(main, "items", ItemStore())
+    async with main.app.router.lifespan_context(main.app):
+        async with AsyncClient(app=main.app, base_url="http://test") as ac:
+            r = await ac.get("/items")
+    assert [i["text"] for i in r.json()] == ["persist me", "me too"]
@@ -0,0 +1,327 @@
+"""
+Write-ahead log with group commit
+=================================
+The item stores are in-memory, so a restart loses everything.  The
+classic fix is a write-ahead log (WAL): before acknowledging a write,
+append a record describing it to a file; on startup, load the last
+snapshot and replay the records written after it.
+
+The expensive part is `fsync` (milliseconds on real disks).  Paying it
+once per request caps throughput at ~1/fsync-latency requests per second.
+*Group commit* pays it once per *batch*: writers enqueue records and wait,
+a single flusher thread writes everything queued so far, fsyncs once and
+wakes all of them.  The busier the app, the bigger the batches.
+
+Durability levels (`Durability`):
+
+    NONE   acknowledge immediately; the flusher writes in the background
+    WRITE  acknowledge once the record reached the OS (survives a crash
+           of this process, not of the machine)
+    FSYNC  acknowledge once the record is fsync'ed (survives power loss)
+
+Files in the WAL directory:
+
+    snapshot   full state as of some LSN (log sequence number)
+    log        records after that LSN, one per line
+
+Each line is `<crc32 hex> <json>`.  A torn or corrupt *last* line (crash
+mid-write) is dropped on replay and cut off by `start()`, so new records
+do not land behind it; corruption anywhere else raises.
+
+Pass `snapshot_rows` (a callable returning the full current state) and
+the flusher checkpoints by itself whenever the log grows past
+`checkpoint_bytes`, so it cannot grow without bound between restarts.
+
+Ordering: callers must append records in the same order they apply the
+writes.  Async handlers get that for free (no `await` between the two);
+threaded callers should append while holding their store lock and wait
+for durability *after* releasing it, so writers still batch together.
+"""
+
+import asyncio
+import json
+import os
+import threading
+import zlib
+from concurrent.futures import Future, InvalidStateError
+from enum import Enum
+from pathlib import Path
+from typing import (Any, Callable, Dict, Iterable, Iterator, List, Optional,
+                    Tuple)
+
+SNAPSHOT_FILE = "snapshot"
+LOG_FILE = "log"
+
+
+class Durability(str, Enum):
+    NONE = "none"
+    WRITE = "write"
+    FSYNC = "fsync"
+
+
+class WALCorruptError(Exception):
+    """A record in the middle of the log failed its checksum."""
+
+
+def _encode(record: Dict[str, Any]) -> bytes:
+    payload = json.dumps(record, separators=(",", ":")).encode()
+    return b"%08x %s\n" % (zlib.crc32(payload), payload)
+
+
+def _decode(line: bytes) -> Optional[Dict[str, Any]]:
+    """Parse one line; None if it is torn or fails its checksum."""
+    if not line.endswith(b"\n") or len(line) < 10:
+        return None
+    crc, payload = line[:8], line[9:-1]
+    try:
+        if int(crc, 16) != zlib.crc32(payload):
+            return None
+        return json.loads(payload)
+    except ValueError:
+        return None
+
+
+def _read_records(path: Path) -> Iterator[Tuple[Dict[str, Any], int]]:
+    """Yield `(record, byte offset just past it)` for each good line."""
+    if not path.exists():
+        return
+    with open(path, "rb") as f:
+        lines = f.readlines()
+    end = 0
+    for i, line in enumerate(lines):
+        record = _decode(line)
+        if record is None:
+            if i == len(lines) - 1:
+                return  # torn tail from a crash mid-append: ignore it
+            raise WALCorruptError(f"{path}: bad record on line {i + 1}")
+        end += len(line)
+        yield record, end
+
+
+class WriteAheadLog:
+    """Append-only log with a single group-committing flusher thread."""
+
+    def __init__(self, directory, durability: Durability = Durability.FSYNC,
+                 max_batch: int = 4096,
+                 snapshot_rows: Optional[Callable[[], Iterable[
+                     Tuple[int, Dict[str, Any]]]]] = None,
+                 checkpoint_bytes: int = 64 * 1024 * 1024) -> None:
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.durability = Durability(durability)
+        self.max_batch = max_batch
+        self.snapshot_rows = snapshot_rows
+        self.checkpoint_bytes = checkpoint_bytes
+        self.lsn = 0  # last LSN handed out
+        self.flushes = 0  # number of write(+fsync) rounds, for benchmarks
+        self.checkpoints = 0  # automatic ones, taken by the flusher
+        self._log_end: Optional[int] = None  # end of the last good record
+        self._cond = threading.Condition()  # guards _pending and lsn
+        self._io_lock = threading.Lock()  # guards the log file itself
+        self._pending: List[Tuple[bytes, Optional[Future], int]] = []
+        self._closed = False
+        self._file = None
+        self._thread: Optional[threading.Thread] = None
+
+    # -- startup ------------------------------------------------------------
+
+    def replay(self) -> Iterator[Tuple[str, int, Optional[Dict[str, Any]]]]:
+        """
+        Yield `(op, key, data)` for the snapshot, then for the log tail.
+
+        Snapshot rows come out as `("put", key, data)`.  Must be consumed
+        before `start()`; afterwards new appends continue from the highest
+        LSN seen.
+        """
+        snapshot_lsn = 0
+        for record, _ in _read_records(self.directory / SNAPSHOT_FILE):
+            if "snapshot_lsn" in record:
+                snapshot_lsn = record["snapshot_lsn"]
+            else:
+                yield "put", record["key"], record["data"]
+        self.lsn = snapshot_lsn
+        self._log_end = 0
+        for record, end in _read_records(self.directory / LOG_FILE):
+            self._log_end = end
+            if record["lsn"] <= snapshot_lsn:
+                continue  # already folded into the snapshot
+            self.lsn = record["lsn"]
+            yield record["op"], record["key"], record.get("data")
+
+    def checkpoint(self, rows: Iterable[Tuple[int, Dict[str, Any]]]) -> None:
+        """
+        Write `rows` (the full current state) as the new snapshot and empty
+        the log.  Call it at quiet points - startup and shutdown - since
+        `rows` must reflect every record appended so far.
+        """
+        self.sync()
+        with self._cond, self._io_lock:
+            self._write_snapshot(self.lsn, rows)
+
+    def _write_snapshot(self, lsn: int,
+                        rows: Iterable[Tuple[int, Dict[str, Any]]]) -> None:
+        """Replace the snapshot and empty the log; hold `_io_lock`."""
+        tmp = self.directory / (SNAPSHOT_FILE + ".tmp")
+        with open(tmp, "wb") as f:
+            f.write(_encode({"snapshot_lsn": lsn}))
+            for key, data in rows:
+                f.write(_encode({"key": key, "data": data}))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.directory / SNAPSHOT_FILE)
+        self._fsync_directory()
+        # The snapshot now covers every logged record; start afresh.
+        if self._file is not None:
+            self._file.truncate(0)
+            self._file.seek(0)
+        else:
+            (self.directory / LOG_FILE).write_bytes(b"")
+        self._log_end = 0
+
+    def start(self) -> "WriteAheadLog":
+        path = self.directory / LOG_FILE
+        if self._log_end is None:  # not replayed: find the good part now
+            self._log_end = 0
+            for _, end in _read_records(path):
+                self._log_end = end
+        self._file = open(path, "ab")
+        if self._file.tell() > self._log_end:
+            # Cut off a torn tail, or the next record would follow it and
+            # the torn line would sit mid-log, failing the next replay.
+            self._file.truncate(self._log_end)
+            self._file.flush()
+            os.fsync(self._file.fileno())
+        self._thread = threading.Thread(target=self._flusher, daemon=True,
+                                        name="wal-flusher")
+        self._thread.start()
+        return self
+
+    # -- writes -------------------------------------------------------------
+
+    def append(self, op: str, key: int,
+               data: Optional[Dict[str, Any]] = None) -> Future:
+        """Queue a record; the future resolves to its LSN once durable."""
+        return self.append_many([(op, key, data)])
+
+    def append_many(self, records: Iterable[Tuple[str, int, Any]]) -> Future:
+        """Queue several records; one future for the whole group."""
+        future: Future = Future()
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("write-ahead log is closed")
+            lines = []
+            for op, key, data in records:
+                self.lsn += 1
+                lines.append(_encode({"lsn": self.lsn, "op": op, "key": key,
+                                      "data": data}))
+            lsn = self.lsn
+            waiter = None if self.durability is Durability.NONE else future
+            self._pending.append((b"".join(lines), waiter, lsn))
+            self._cond.notify()
+        if waiter is None:
+            future.set_result(lsn)
+        return future
+
+    async def append_async(self, op: str, key: int,
+                           data: Optional[Dict[str, Any]] = None) -> int:
+        return await asyncio.wrap_future(self.append(op, key, data))
+
+    async def append_many_async(self,
+                                records: Iterable[Tuple[str, int, Any]]) -> int:
+        return await asyncio.wrap_future(self.append_many(records))
+
+    def sync(self) -> None:
+        """Block until everything queued so far is written (and fsync'ed)."""
+        if self._thread is None:
+            return
+        future: Future = Future()
+        with self._cond:
+            self._pending.append((b"", future, self.lsn))
+            self._cond.notify()
+        future.result()
+
+    def close(self) -> None:
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    # -- flusher thread -----------------------------------------------------
+
+    def _flusher(self) -> None:
+        while True:
+            with self._cond:
+                while not self._pending and not self._closed:
+                    self._cond.wait()
+                if not self._pending:
+                    return  # closed and drained
+                batch = self._pending[:self.max_batch]
+                del self._pending[:self.max_batch]
+            try:
+                with self._io_lock:
+                    self._file.write(b"".join(data for data, _, _ in batch))
+                    self._file.flush()
+                    if self.durability is Durability.FSYNC:
+                        os.fsync(self._file.fileno())
+                self.flushes += 1
+            except OSError as exc:
+                for _, future, _ in batch:
+                    _resolve(future, error=exc)
+                continue
+            for _, future, lsn in batch:
+                _resolve(future, lsn)
+            if (self.snapshot_rows is not None
+                    and self._file.tell() >= self.checkpoint_bytes):
+                self._auto_checkpoint(batch[-1][2])
+
+    def _auto_checkpoint(self, lsn: int) -> None:
+        """
+        Fold the log into a new snapshot at `lsn`, the last record written.
+
+        Writers keep appending meanwhile.  Every record up to `lsn` was
+        applied before it was appended, so the rows include it; they may
+        also include later writes, whose records land in the emptied log
+        and are simply applied again on replay.
+        """
+        with self._io_lock:
+            try:
+                self._write_snapshot(lsn, self.snapshot_rows())
+            except Exception:
+                # Keep the log as it is and try again after a later batch;
+                # the flusher must not die over a failed snapshot.
+                return
+        self.checkpoints += 1
+
+    def _fsync_directory(self) -> None:
+        # Make the rename itself durable (POSIX; a no-op elsewhere).
+        if hasattr(os, "O_DIRECTORY"):
+            fd = os.open(self.directory, os.O_RDONLY | os.O_DIRECTORY)
+            try:
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+
+
+def _resolve(future: Optional[Future], lsn: Optional[int] = None,
+             error: Optional[BaseException] = None) -> None:
+    """
+    Hand a waiter its result, unless it stopped waiting.
+
+    `append_async` wraps the future with `asyncio.wrap_future`, so a
+    cancelled request cancels it too; setting a result on it then raises,
+    and the flusher must not die over one impatient waiter.
+    """
+    if future is None or future.done():
+        return
+    try:
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(lsn)
+    except InvalidStateError:  # cancelled since we looked
+        pass
@@ -34,11 +34,36 @@ lighter, then FastAPI is the way to go.
 """
 
 
-from fastapi import FastAPI, HTTPException, Path, status
+import os
+import threading
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI, HTTPException, Path, Query, status
+from fastapi.encoders import jsonable_encoder
 from pydantic import BaseModel
 from typing import Optional  # Recommended, not enforced, by FastAPI docs
 
-app = FastAPI()
+# This folder is a package beside the bigger demo app, whose write-ahead
+# log it shares. Run it from the folder above:
+#     uvicorn youtube.main:app --reload
+from wal import Durability, WriteAheadLog
+
+from .tombstone_store import TombstoneStore
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Replay the write-ahead log on startup, checkpoint it on shutdown."""
+    app.state.item_log = open_item_log()
+    try:
+        yield
+    finally:
+        if app.state.item_log is not None:
+            app.state.item_log.checkpoint(_item_rows())
+            app.state.item_log.close()
+
+
+app = FastAPI(lifespan=lifespan)
 
 
 class Item(BaseModel):
@@ -49,7 +74,50 @@ class Item(BaseModel):
 # different URLs of your app.
 
 
-items = []
+# A plain list made the position the ID: deleting one item renumbered all
+# later ones and cost O(n). TombstoneStore keeps stable IDs with O(1)
+# get/update/delete and compacts dead slots in the background.
+items: TombstoneStore[Item] = TombstoneStore()
+
+# Persistence: with ITEMS_WAL_DIR set, every write is logged before we
+# answer and replayed on startup (see ../wal.py). Handlers here are plain
+# `def`s, so FastAPI runs them in a threadpool: change the store and append
+# the log record under one lock so the log order matches the store order,
+# then wait for the (group-committed) flush outside the lock.
+items_lock = threading.Lock()
+
+
+def open_item_log() -> Optional[WriteAheadLog]:
+    directory = os.environ.get("ITEMS_WAL_DIR")
+    if not directory:
+        return None
+    log = WriteAheadLog(
+        directory, Durability(os.environ.get("ITEMS_WAL_DURABILITY", "fsync")))
+    for op, item_id, data in log.replay():
+        if op == "put":
+            items.put(item_id, Item(**data))
+        elif item_id in items:
+            del items[item_id]
+    log.checkpoint(_item_rows())
+    return log.start()
+
+
+def _item_rows():
+    return ((item_id, jsonable_encoder(item)) for item_id, item in items.items())
+
+
+def log_item_write(op: str, item_id: int, item: Optional[Item] = None):
+    """Queue a log record; call with `items_lock` held. None without a WAL."""
+    item_log = getattr(app.state, "item_log", None)
+    if item_log is None:
+        return None
+    data = None if item is None else jsonable_encoder(item)
+    return item_log.append(op, item_id, data)
+
+
+def wait_durable(pending) -> None:
+    if pending is not None:
+        pending.result()
 
 
 @app.get("/")
@@ -70,8 +138,7 @@ def create_item(*,  # default args follow nondefault always. To avoid use
                     # allow unlimited positional arguments and the rest,
                     # as well as their matches, should be treated as key
                     # word arguments.
-                item: Item = Path(None,
-                                  description="The item you're adding to the backend", max_length=10, min_length=1),
+                item: Item,
                 is_done: Optional[bool],):
     # Path
     # Path allows you to add more detail to what you expect for the
@@ -87,7 +154,13 @@ def create_item(*,  # default args follow nondefault always. To avoid use
     # API_BASE_URL/items with a body of Item:
     # {"text": "apple", "is_done": "True"}
     # {"text": "orange"}
-    items.append(item)
+    #
+    # (Newer FastAPI versions refuse a Path() default on a request body at
+    # import time, so `item` is declared as a plain body parameter above.)
+    with items_lock:
+        item_id = items.append(item)
+        pending = log_item_write("put", item_id, item)
+    wait_durable(pending)
     # Common to return the same item back with the 200
     return item
 
@@ -101,7 +174,7 @@ def create_item(*,  # default args follow nondefault always. To avoid use
 # endpoint would be conforming to the pydantic model. Allows for defined
 # response structures.
 def list_items(limit: int = 10):
-    return items[0:limit]
+    return items.head(limit)
 
 
 @app.get("/items/{item_id}", response_model=Item)
@@ -109,11 +182,12 @@ def get_item(item_id: int):
     """Path arguments, everything in the path is assumed to be a path
        parameter."""
     # API_BASE_URL/items/3
-    if item_id > 0 and item_id < len(items):
+    try:
         return items[item_id]
-    else:
-        return HTTPException(status_code=404,
-                             detail=f"Item {item_id} for found")
+    except KeyError:
+        # raise, not return: a returned exception is just a response body
+        raise HTTPException(status_code=404,
+                            detail=f"Item {item_id} not found")
 
 # PUT is for full updates, PATCH has a lot of optionals with the
 # pydantic model.
@@ -122,24 +196,33 @@ def get_item(item_id: int):
 @app.put("/update-item/{item_id}")
 # lt=len(items) is not okay to do. Bounds are evaluated at import time!!
 # items could grow or shrink as the application runs (it does)
-def update_item(is_done: bool, item_id: int = Path(None, ge=0)):
+def update_item(is_done: bool, item_id: int = Path(ge=0)):
     """
-    Update the item, ensure that the id passed in is within our array
-    size / index.
+    Update the item, ensure that the id passed in refers to a stored
+    (and not deleted) item.
     """
     try:
-        items[item_id].is_done = is_done
-    except IndexError:
+        with items_lock:
+            item = items[item_id]
+            item.is_done = is_done
+            pending = log_item_write("put", item_id, item)
+    except KeyError:
         raise HTTPException(status_code=404, detail="Item not found")
+    wait_durable(pending)
 
 
 @app.delete("/delete")
 # lt=len(items) is not okay to do. Bounds are evaluated at import time!!
 # items could grow or shrink as the application runs (it does)
-def delete_item(item_id: int = Path(...,
-                                    description="The ID of the item to delete", ge=0)):
+# There is no {item_id} in this path, so it has to be a query parameter:
+# DELETE API_BASE_URL/delete?item_id=3
+def delete_item(item_id: int = Query(...,
+                                     description="The ID of the item to delete", ge=0)):
     try:
-        items = items[:item_id-1]+items[item_id:]
-        return status.HTTP_204_NO_CONTENT
-    except IndexError:
+        with items_lock:
+            del items[item_id]
+            pending = log_item_write("delete", item_id)
+    except KeyError:
         raise HTTPException(status_code=404, detail="Item not found")
+    wait_durable(pending)
+    return status.HTTP_204_NO_CONTENT
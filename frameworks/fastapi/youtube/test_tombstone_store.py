@@ -0,0 +1,93 @@
+import threading
+import time
+
+import pytest
+from youtube.tombstone_store import TombstoneStore
+
+
+@pytest.fixture
+def store():
+    return TombstoneStore(compact_ratio=0.5, min_tombstones=2)
+
+
+def test_delete_keeps_other_ids_stable(store):
+    ids = [store.append(name) for name in "abcd"]
+    del store[ids[1]]
+    assert store[ids[2]] == "c"
+    assert ids[1] not in store
+    with pytest.raises(KeyError):
+        store[ids[1]]
+    assert store.head(10) == ["a", "c", "d"]
+
+
+def test_deleted_ids_are_never_reused(store):
+    first = store.append("a")
+    del store[first]
+    assert store.append("b") == first + 1
+
+
+def test_head_skips_leading_tombstones(store):
+    ids = [store.append(i) for i in range(10)]
+    for item_id in ids[:3]:
+        del store[item_id]
+    assert store.head(2) == [3, 4]
+
+
+def test_background_compaction_preserves_ids(store):
+    ids = [store.append(i) for i in range(6)]
+    for item_id in ids[:4]:
+        del store[item_id]  # 4/6 dead > 0.5 -> compaction thread starts
+    deadline = time.monotonic() + 2
+    while store.compactions == 0 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert store.compactions == 1
+    assert len(store._slots) == 2
+    assert store[ids[4]] == 4 and store[ids[5]] == 5
+    store[ids[5]] = "five"
+    assert store.items() == [(ids[4], 4), (ids[5], "five")]
+
+
+def test_put_replays_out_of_band_ids(store):
+    store.put(7, "x")
+    store.put(7, "y")
+    assert store[7] == "y"
+    assert store.append("z") == 8
+
+
+def test_compaction_lets_reads_and_writes_through(store):
+    store.min_tombstones = 10**9  # compact by hand below
+    ids = [store.append(i) for i in range(10)]
+    del store[ids[0]], store[ids[1]]
+    reached, go = threading.Event(), threading.Event()
+
+    class Gate(list):
+        """Parks the compactor when it reaches slot 5."""
+
+        def __getitem__(self, slot):
+            if slot == 5 and threading.current_thread() is compactor:
+                reached.set()
+                go.wait(2)
+            return super().__getitem__(slot)
+
+    store._slots = Gate(store._slots)
+    compactor = threading.Thread(target=store.compact)
+    compactor.start()
+    assert reached.wait(2)
+    # The compactor is mid-rebuild; none of this may block on it.
+    assert store[ids[8]] == 8
+    del store[ids[2]]  # a slot it has already read
+    store[ids[3]] = "three"
+    del store[ids[8]]  # a slot it has yet to read
+    new = [store.append(x) for x in ("new", "gone")]
+    del store[new[1]]
+    go.set()
+    compactor.join()
+    assert store.compactions == 1
+    expected = [(ids[3], "three")] + [(ids[i], i) for i in (4, 5, 6, 7, 9)] \
+        + [(new[0], "new")]
+    assert store.items() == expected
+    assert [store[i] for i, _ in expected] == [x for _, x in expected]
+    assert store.head(2) == ["three", 4]
+    assert len(store) == 7 and store._tombstones == 2
+    store.compact()
+    assert store.items() == expected and len(store._slots) == 7
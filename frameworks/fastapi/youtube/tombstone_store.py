@@ -0,0 +1,207 @@
+"""
+Tombstone store
+===============
+The tutorial kept items in a list and used the list position as the ID.
+Deleting with `items[:i] + items[i+1:]` copies the whole list (O(n)) and
+quietly renumbers every later item - a client holding ID 7 now points at
+what used to be item 8.
+
+Here deleting just writes a *tombstone* (None) into the item's slot:
+
+    _slots   list   slot -> item, or None once deleted
+    _ids     list   slot -> stable ID
+    _index   dict   stable ID -> slot           O(1) get / update / delete
+
+IDs are handed out from a counter and never reused.  Tombstones cost
+memory and make scans skip dead slots, so once they exceed
+`compact_ratio` of all slots a background thread compacts: it squeezes the
+dead slots out and rebuilds `_index`.  Slots move, IDs do not.
+
+The O(n) rebuild runs without the lock, so reads and writes carry on
+meanwhile.  Writes to slots the compactor has already taken in are
+remembered in `_touched` and replayed onto the new lists when they are
+swapped in under the lock, together with anything appended since.
+"""
+
+import threading
+from typing import Dict, Generic, Iterator, List, Optional, Set, TypeVar
+
+T = TypeVar("T")
+
+
+class TombstoneStore(Generic[T]):
+    """List-like store with stable IDs and O(1) delete."""
+
+    def __init__(self, compact_ratio: float = 0.25,
+                 min_tombstones: int = 1024) -> None:
+        self.compact_ratio = compact_ratio
+        self.min_tombstones = min_tombstones
+        self.compactions = 0
+        self._lock = threading.Lock()
+        self._slots: List[Optional[T]] = []
+        self._ids: List[int] = []
+        self._index: Dict[int, int] = {}
+        self._next_id = 0
+        self._tombstones = 0
+        self._start = 0  # no live slot before this one
+        self._compacting = False
+        # While compacting: IDs written in slots below _compact_end
+        self._touched: Optional[Set[int]] = None
+        self._compact_end = 0
+        self._epoch = 0  # bumped by clear(), which voids a running compaction
+        self._compact_lock = threading.Lock()  # one compaction at a time
+
+    def append(self, item: T) -> int:
+        """Store `item` and return its new ID."""
+        with self._lock:
+            item_id = self._next_id
+            self._next_id += 1
+            self._put_new(item_id, item)
+            return item_id
+
+    def put(self, item_id: int, item: T) -> None:
+        """Insert or replace under a given ID - used when replaying a log."""
+        with self._lock:
+            slot = self._index.get(item_id)
+            if slot is not None:
+                self._slots[slot] = item
+                self._touch(item_id, slot)
+                return
+            self._put_new(item_id, item)
+            self._next_id = max(self._next_id, item_id + 1)
+
+    def __getitem__(self, item_id: int) -> T:
+        """KeyError if the ID never existed or was deleted."""
+        with self._lock:  # compaction swaps _slots and _index together
+            return self._slots[self._index[item_id]]
+
+    def __setitem__(self, item_id: int, item: T) -> None:
+        with self._lock:
+            slot = self._index[item_id]
+            self._slots[slot] = item
+            self._touch(item_id, slot)
+
+    def __delitem__(self, item_id: int) -> None:
+        with self._lock:
+            slot = self._index.pop(item_id)
+            self._slots[slot] = None
+            self._touch(item_id, slot)
+            self._tombstones += 1
+            while (self._start < len(self._slots)
+                   and self._slots[self._start] is None):
+                self._start += 1
+            if self._needs_compaction():
+                self._compacting = True
+                threading.Thread(target=self.compact, daemon=True,
+                                 name="tombstone-compactor").start()
+
+    def __contains__(self, item_id: object) -> bool:
+        return item_id in self._index
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def __iter__(self) -> Iterator[T]:
+        return iter(self.head(len(self._slots)))
+
+    def head(self, limit: int) -> List[T]:
+        """The first `limit` live items in insertion order."""
+        found: List[T] = []
+        if limit <= 0:
+            return found
+        with self._lock:
+            slots = self._slots
+            for slot in range(self._start, len(slots)):  # no slice copy
+                item = slots[slot]
+                if item is not None:
+                    found.append(item)
+                    if len(found) == limit:
+                        break
+        return found
+
+    def items(self) -> List[tuple]:
+        """Every live (id, item) pair in insertion order."""
+        with self._lock:
+            return [(i, item) for i, item in zip(self._ids, self._slots)
+                    if item is not None]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._slots, self._ids, self._index = [], [], {}
+            self._tombstones = self._start = 0
+            self._epoch += 1
+
+    def compact(self) -> None:
+        """Drop tombstones and re-point the index at the moved slots."""
+        with self._compact_lock:
+            self._compact()
+
+    def _compact(self) -> None:
+        with self._lock:
+            self._compacting = True
+            slots, ids, end = self._slots, self._ids, len(self._slots)
+            self._touched, self._compact_end = set(), end
+            epoch = self._epoch
+        try:
+            # The slow part, unlocked: writers only change slots in place or
+            # append past `end`, and every in-place write lands in _touched.
+            new_ids: List[int] = []
+            new_slots: List[Optional[T]] = []
+            for slot in range(end):
+                item = slots[slot]
+                if item is not None:
+                    new_ids.append(ids[slot])
+                    new_slots.append(item)
+            index = {item_id: slot for slot, item_id in enumerate(new_ids)}
+            with self._lock:
+                if self._epoch != epoch:
+                    return  # cleared meanwhile; nothing left to compact
+                self._swap_in(new_ids, new_slots, index, end)
+                self.compactions += 1
+        finally:
+            with self._lock:
+                self._touched = None
+                self._compacting = False
+
+    def _swap_in(self, ids: List[int], slots: List[Optional[T]],
+                 index: Dict[int, int], end: int) -> None:
+        """Finish a compaction; hold the lock."""
+        tombstones = 0
+        for item_id in self._touched:
+            slot = index.get(item_id)
+            if slot is None:
+                continue  # already dead when the compactor read it
+            old = self._index.get(item_id)
+            if old is None:  # deleted meanwhile: keep it as a tombstone
+                slots[slot] = None
+                del index[item_id]
+                tombstones += 1
+            else:
+                slots[slot] = self._slots[old]
+        for old in range(end, len(self._slots)):  # appended meanwhile
+            item = self._slots[old]
+            if item is None:
+                tombstones += 1
+            else:
+                index[self._ids[old]] = len(slots)
+            ids.append(self._ids[old])
+            slots.append(item)
+        start = 0
+        while start < len(slots) and slots[start] is None:
+            start += 1
+        self._ids, self._slots, self._index = ids, slots, index
+        self._tombstones, self._start = tombstones, start
+
+    def _touch(self, item_id: int, slot: int) -> None:
+        if self._touched is not None and slot < self._compact_end:
+            self._touched.add(item_id)
+
+    def _put_new(self, item_id: int, item: T) -> None:
+        self._index[item_id] = len(self._slots)
+        self._slots.append(item)
+        self._ids.append(item_id)
+
+    def _needs_compaction(self) -> bool:
+        return (not self._compacting
+                and self._tombstones >= self.min_tombstones
+                and self._tombstones > self.compact_ratio * len(self._slots))
@@ -0,0 +1,68 @@
+"""
+Benchmark: GET /user latency as the session payload grows.
+
+Logs in, stuffs the session with N bytes of extra data, then times GET
+/user (which reads the session but does not change it) through the test
+client, with Flask's signed-cookie sessions and with the server-side
+sessions from server_session.py.
+
+Run with:
+    python bench_sessions.py --sizes 100 1000 3000 --requests 2000
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+DB_DIR = tempfile.mkdtemp()
+os.environ["SESSIONS_DATABASE"] = os.path.join(DB_DIR, "app.sqlite3")
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from flask.sessions import SecureCookieSessionInterface  # noqa: E402
+
+import main  # noqa: E402
+from server_session import ServerSessionInterface  # noqa: E402
+
+INTERFACES = {
+    "cookie": SecureCookieSessionInterface,
+    "server": lambda: ServerSessionInterface(
+        os.path.join(DB_DIR, "bench_sessions.sqlite3")),
+}
+
+
+def time_user(payload: int, requests: int) -> list:
+    client = main.app.test_client()
+    client.post("/login", data={"nm": "bench"})
+    with client.session_transaction() as session:
+        # Browsers cap cookies at about 4 KB, which is as far as the cookie
+        # interface can go.
+        session["extra"] = "x" * payload
+    client.get("/user")  # consume the login flash
+    samples = []
+    for _ in range(requests):
+        start = time.perf_counter()
+        response = client.get("/user")
+        samples.append((time.perf_counter() - start) * 1e6)
+        assert response.status_code == 200
+    return samples
+
+
+def run(sizes, requests: int) -> None:
+    for label, make in INTERFACES.items():
+        main.app.session_interface = make()
+        for payload in sizes:
+            q = statistics.quantiles(time_user(payload, requests), n=100)
+            print(f"{label:<7} {payload:>6} bytes  p50={q[49]:7.1f} us  "
+                  f"p99={q[98]:7.1f} us")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sizes", type=int, nargs="+",
+                        default=[100, 1000, 3000])
+    parser.add_argument("--requests", type=int, default=2000)
+    args = parser.parse_args()
+    run(args.sizes, args.requests)
@@ -24,14 +24,25 @@ you flash "logged in successful". Or if you logout "logout successful".
 """
 
 
+import os
+
 from flask import Flask, redirect, url_for, render_template, request, session, flash
 from datetime import timedelta
 
+from server_session import ServerSessionInterface, regenerate
+
 app = Flask(__name__)
 # NEED to define a secret key in order to use sessions
 # it should be a very secure hash
 app.secret_key = "Helloworld"
 app.permanent_session_lifetime = timedelta(days=5)
+# By default the whole session is the (signed) cookie. Here the cookie is
+# just an ID, and the data lives in memory and in the app's instance
+# folder (instance/sessions.sqlite3), so it survives a restart. See
+# server_session.py.
+os.makedirs(app.instance_path, exist_ok=True)
+app.session_interface = ServerSessionInterface(os.environ.get(
+    "SESSIONS_DATABASE", os.path.join(app.instance_path, "sessions.sqlite3")))
 
 
 @app.route("/")
@@ -49,6 +60,8 @@ def login():
         # By default your session lasts as long as you're in your
         # browser.
         session.permanent = True
+        # New login, new session ID: one planted beforehand stops working.
+        regenerate(session)
         user = request.form["nm"]
         # When you close the browser the session does not persist
         session["user"] = user
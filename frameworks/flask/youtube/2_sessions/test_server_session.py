@@ -0,0 +1,144 @@
+import importlib.util
+import os
+import sys
+
+import pytest
+from flask import Flask, request, session
+from server_session import ServerSessionInterface, SessionStore
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+@pytest.fixture
+def store(tmp_path):
+    return SessionStore(str(tmp_path / "sessions.sqlite3"), front_size=2)
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    monkeypatch.setenv("SESSIONS_DATABASE", str(tmp_path / "app.sqlite3"))
+    spec = importlib.util.spec_from_file_location(
+        "sessions_main", os.path.join(HERE, "main.py"))
+    module = importlib.util.module_from_spec(spec)
+    monkeypatch.setitem(sys.modules, "sessions_main", module)
+    spec.loader.exec_module(module)
+    return module.app
+
+
+def test_sessions_expire(store):
+    store.save("a", {"user": "tim"}, expires=100.0)
+    assert store.get("a", now=99.0) == (100.0, {"user": "tim"})
+    assert store.get("a", now=100.0) is None
+    assert "a" not in store._front
+    assert store.get("a", now=100.0) is None  # nor read back from SQLite
+
+
+def test_evicted_sessions_are_read_back_from_sqlite(store):
+    for sid in "abc":
+        store.save(sid, {"sid": sid}, expires=100.0)
+    assert list(store._front) == ["b", "c"]  # a was least recently used
+    assert store.get("a", now=0.0) == (100.0, {"sid": "a"})
+    assert list(store._front) == ["c", "a"]
+
+
+def test_cached_sessions_are_copies_all_the_way_down(store):
+    data = {"cart": ["apple"]}
+    store.save("a", data, expires=100.0)
+    data["cart"].append("saved? no")
+    store.get("a", now=0.0)[1]["cart"].append("read? no")
+    assert store.get("a", now=0.0) == (100.0, {"cart": ["apple"]})
+
+
+def test_nested_changes_need_modified_like_flask_sessions(tmp_path):
+    shop = Flask(__name__)
+    shop.secret_key = "test"
+    shop.session_interface = ServerSessionInterface(
+        str(tmp_path / "s.sqlite3"))
+
+    @shop.route("/start")
+    def start():
+        session["cart"] = []
+        return ""
+
+    @shop.route("/add/<item>")
+    def add(item):
+        session["cart"].append(item)
+        if request.args.get("save"):
+            session.modified = True
+        return ""
+
+    @shop.route("/cart")
+    def cart():
+        return {"cart": session["cart"]}
+
+    client = shop.test_client()
+    client.get("/start")
+    client.get("/add/pear")  # not marked modified: dropped, not leaked
+    assert client.get("/cart").json == {"cart": []}
+    client.get("/add/plum?save=1")
+    assert client.get("/cart").json == {"cart": ["plum"]}
+
+
+def test_sessions_survive_a_restart(store, tmp_path):
+    store.save("a", {"user": "tim"}, expires=100.0)
+    restarted = SessionStore(str(tmp_path / "sessions.sqlite3"))
+    assert restarted.get("a", now=0.0) == (100.0, {"user": "tim"})
+
+
+def test_without_a_front_every_read_goes_to_sqlite(tmp_path):
+    store = SessionStore(str(tmp_path / "s.sqlite3"), front_size=0)
+    store.save("a", {"n": 1}, expires=100.0)
+    assert not store._front
+    assert store.get("a", now=0.0) == (100.0, {"n": 1})
+    store.touch("a", expires=200.0)
+    assert store.get("a", now=150.0) == (200.0, {"n": 1})
+
+
+def test_sweep_deletes_expired_rows_in_batches(store):
+    for i in range(5):
+        store.save(f"old{i}", {}, expires=10.0)
+    store.save("live", {}, expires=100.0)
+    assert store.sweep(now=50.0, batch=3) == 3
+    assert store.sweep(now=50.0, batch=3) == 2
+    assert store.sweep(now=50.0, batch=3) == 0
+    assert store._db.execute("SELECT sid FROM sessions").fetchall() == [
+        ("live",)]
+
+
+def test_requests_sweep_at_most_every_sweep_every(tmp_path, monkeypatch):
+    interface = ServerSessionInterface(str(tmp_path / "s.sqlite3"),
+                                       sweep_every=60.0)
+    sweeps = []
+    monkeypatch.setattr(interface.store, "sweep",
+                        lambda now, batch: sweeps.append(now))
+    for now in (1000.0, 1030.0, 1061.0):
+        interface._maybe_sweep(now)
+    assert sweeps == [1000.0, 1061.0]
+
+
+def session_id(client):
+    return client.get_cookie("session").value
+
+
+def test_login_moves_the_session_to_a_new_id(app):
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session["planted"] = True  # e.g. an ID fixed by an attacker
+    planted = session_id(client)
+    client.post("/login", data={"nm": "tim"})
+    assert session_id(client) != planted
+    assert client.get("/user").status_code == 200
+    with client.session_transaction() as session:
+        assert session["planted"] and session["user"] == "tim"
+
+    attacker = app.test_client()
+    attacker.set_cookie("session", planted)
+    assert attacker.get("/user").status_code == 302  # not logged in
+    assert app.session_interface.store.get(planted, now=0.0) is None
+
+
+def test_a_session_id_is_only_ever_issued_by_the_server(app):
+    client = app.test_client()
+    client.set_cookie("session", "chosen-by-the-client")
+    client.post("/login", data={"nm": "tim"})
+    assert session_id(client) != "chosen-by-the-client"
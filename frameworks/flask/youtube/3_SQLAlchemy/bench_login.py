@@ -0,0 +1,85 @@
+"""
+Benchmark: login latency as the users table grows.
+
+Fills a throwaway SQLite database with N users and times POST /login for
+random existing names through Flask's test client, three ways:
+
+    no index   the original schema: every login scans the whole table
+    index      B-tree lookup on users.name, cache disabled
+    cached     index + the per-process read-through cache
+
+Run with:
+    python bench_login.py --sizes 1000 10000 100000 1000000 --logins 200
+"""
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+DB_FILE = os.path.join(tempfile.mkdtemp(), "bench_users.sqlite3")
+os.environ["USERS_DATABASE_URI"] = f"sqlite:///{DB_FILE}"
+os.environ["SESSIONS_DATABASE"] = DB_FILE + ".sessions"
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from sqlalchemy import text  # noqa: E402
+
+import main  # noqa: E402
+
+
+def fill(n: int) -> None:
+    main.db.drop_all()
+    main.init_db()
+    main.db.session.execute(
+        main.users.__table__.insert(),
+        [{"name": f"user{i}", "email": f"user{i}@example.com"}
+         for i in range(n)])
+    main.db.session.commit()
+
+
+def time_logins(n: int, logins: int) -> list:
+    rng = random.Random(0)
+    samples = []
+    for _ in range(logins):
+        name = f"user{rng.randrange(n)}"
+        # A fresh client per login: flashed messages pile up in the session
+        # cookie of a reused one and would slow every later request.
+        client = main.app.test_client()
+        start = time.perf_counter()
+        response = client.post("/login", data={"nm": name})
+        samples.append((time.perf_counter() - start) * 1000)
+        assert response.status_code == 302
+    return samples
+
+
+def report(label: str, n: int, samples: list) -> None:
+    q = statistics.quantiles(samples, n=100)
+    print(f"{n:>9} users  {label:<9} p50={q[49]:8.3f} ms  p99={q[98]:8.3f} ms")
+
+
+def main_(sizes, logins: int) -> None:
+    cache = main.user_cache
+    with main.app.app_context():
+        for n in sizes:
+            fill(n)
+            main.db.session.execute(text("DROP INDEX ix_users_name"))
+            cache.maxsize = 0  # every get() misses
+            cache.clear()
+            report("no index", n, time_logins(n, logins))
+            main.init_db()  # puts the index back
+            report("index", n, time_logins(n, logins))
+            cache.maxsize = 10_000
+            time_logins(n, logins)  # warm the cache
+            report("cached", n, time_logins(n, logins))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sizes", type=int, nargs="+",
+                        default=[1000, 10_000, 100_000, 1_000_000])
+    parser.add_argument("--logins", type=int, default=200)
+    args = parser.parse_args()
+    main_(args.sizes, args.logins)
@@ -0,0 +1,82 @@
+"""
+Benchmark: /view memory and time as the users table grows.
+
+For each table size, measures peak Python memory (tracemalloc) and wall
+time of:
+
+    all()     the original view: users.query.all() + one render_template
+    page      GET /view - one keyset page of 100 rows
+    stream    GET /view?stream=1 - every row, streamed, body consumed
+              chunk by chunk and dropped the way a WSGI server would
+
+Run with:
+    python bench_view.py --sizes 10000 100000 300000
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+DB_FILE = os.path.join(tempfile.mkdtemp(), "bench_view.sqlite3")
+os.environ["USERS_DATABASE_URI"] = f"sqlite:///{DB_FILE}"
+os.environ["SESSIONS_DATABASE"] = DB_FILE + ".sessions"
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from flask import render_template  # noqa: E402
+
+import main  # noqa: E402
+
+
+def fill(n: int) -> None:
+    main.db.drop_all()
+    main.init_db()
+    main.db.session.execute(
+        main.users.__table__.insert(),
+        [{"name": f"user{i}", "email": f"user{i}@example.com"}
+         for i in range(n)])
+    main.db.session.commit()
+
+
+def measure(label: str, n: int, fn) -> None:
+    main.db.session.expunge_all()
+    tracemalloc.start()
+    start = time.perf_counter()
+    size = fn()
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{n:>8} users  {label:<7} {elapsed * 1000:9.1f} ms  "
+          f"peak {peak / 2**20:8.1f} MiB  body {size / 2**20:7.1f} MiB")
+
+
+def old_view() -> int:
+    with main.app.test_request_context("/view"):
+        html = render_template("view.html", values=main.users.query.all(),
+                               next_after=None, limit=None)
+    return len(html)
+
+
+def get(path: str) -> int:
+    response = main.app.test_client().get(path, buffered=False)
+    size = sum(len(chunk) for chunk in response.response)
+    response.close()
+    return size
+
+
+def run(sizes) -> None:
+    with main.app.app_context():
+        for n in sizes:
+            fill(n)
+            measure("all()", n, old_view)
+            measure("page", n, lambda: get("/view"))
+            measure("stream", n, lambda: get("/view?stream=1"))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sizes", type=int, nargs="+",
+                        default=[10_000, 100_000, 300_000])
+    run(parser.parse_args().sizes)
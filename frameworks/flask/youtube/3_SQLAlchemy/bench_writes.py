@@ -0,0 +1,88 @@
+"""
+Benchmark: concurrent first-time logins (one INSERT each) per SQLite setup.
+
+Every configuration runs in its own process against a fresh database
+file, since the profile is applied when main.py is imported and WAL mode
+sticks to the file:
+
+    off        SQLite defaults, one commit per request (the original app)
+    durable    WAL, synchronous=FULL
+    fast       WAL, synchronous=NORMAL, mmap, bigger cache
+    fast+batch fast, with login writes going through the WriteCoalescer
+
+Run with:
+    python bench_writes.py --threads 16 --logins 100
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+CONFIGS = [("off", False), ("durable", False), ("fast", False),
+           ("fast", True)]
+
+
+def child(threads: int, logins: int) -> None:
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    import main
+
+    with main.app.app_context():
+        main.init_db()
+    samples = []
+    start_line = threading.Barrier(threads)
+
+    def client(worker: int) -> None:
+        start_line.wait()
+        for i in range(logins):
+            # A fresh client per login, so every request is a first login.
+            test_client = main.app.test_client()
+            start = time.perf_counter()
+            response = test_client.post("/login",
+                                        data={"nm": f"w{worker}-{i}"})
+            samples.append((time.perf_counter() - start) * 1000)
+            assert response.status_code == 302
+
+    workers = [threading.Thread(target=client, args=(w,))
+               for w in range(threads)]
+    start = time.perf_counter()
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+    elapsed = time.perf_counter() - start
+    q = statistics.quantiles(samples, n=100)
+    batches = (f"  {main.coalescer.jobs / main.coalescer.batches:5.1f} "
+               f"writes/commit" if main.coalescer else "")
+    print(f"{len(samples) / elapsed:8.0f} logins/s  p50={q[49]:7.2f} ms  "
+          f"p99={q[98]:7.2f} ms{batches}")
+
+
+def parent(threads: int, logins: int) -> None:
+    for profile, batch in CONFIGS:
+        db_file = os.path.join(tempfile.mkdtemp(), "bench_writes.sqlite3")
+        env = dict(os.environ, USERS_DATABASE_URI=f"sqlite:///{db_file}",
+                   SESSIONS_DATABASE=db_file + ".sessions",
+                   USERS_SQLITE_PROFILE=profile,
+                   USERS_COALESCE_WRITES="1" if batch else "0")
+        label = profile + ("+batch" if batch else "")
+        result = subprocess.run(
+            [sys.executable, __file__, "--child", "--threads", str(threads),
+             "--logins", str(logins)],
+            env=env, capture_output=True, text=True, check=True)
+        print(f"{label:<11}{result.stdout.strip()}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--logins", type=int, default=100,
+                        help="logins per thread")
+    parser.add_argument("--child", action="store_true",
+                        help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    (child if args.child else parent)(args.threads, args.logins)
@@ -0,0 +1,40 @@
+import importlib.util
+import itertools
+import os
+import sys
+
+import pytest
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+_loads = itertools.count()
+
+
+def load_main(tmp_path, monkeypatch, **env):
+    """A fresh copy of main.py on its own throwaway databases."""
+    monkeypatch.setenv("USERS_DATABASE_URI",
+                       f"sqlite:///{tmp_path / 'users.sqlite3'}")
+    monkeypatch.setenv("SESSIONS_DATABASE", str(tmp_path / "sessions.sqlite3"))
+    for key, value in env.items():
+        monkeypatch.setenv(key, value)
+    name = f"sqlalchemy_main_{next(_loads)}"
+    spec = importlib.util.spec_from_file_location(
+        name, os.path.join(HERE, "main.py"))
+    module = importlib.util.module_from_spec(spec)
+    monkeypatch.setitem(sys.modules, name, module)  # Flask finds templates
+    spec.loader.exec_module(module)
+    with module.app.app_context():
+        module.init_db()
+    return module
+
+
+@pytest.fixture
+def main(tmp_path, monkeypatch):
+    module = load_main(tmp_path, monkeypatch)
+    yield module
+    with module.app.app_context():
+        module.db.engine.dispose()
+
+
+@pytest.fixture
+def client(main):
+    return main.app.test_client()
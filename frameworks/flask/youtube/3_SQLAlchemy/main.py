@@ -13,9 +13,19 @@ SQLAlchemy section of this repo for more information.
 """
 
 
-from flask import Flask, redirect, url_for, render_template, request, session, flash
+import os
+
+from flask import (Flask, Response, redirect, url_for, render_template,
+                   request, session, flash, stream_with_context)
 from datetime import timedelta
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import text, update
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.exc import IntegrityError
+
+from server_session import ServerSessionInterface, regenerate
+from sqlite_tuning import PROFILES, WriteCoalescer, apply_profile
+from user_cache import CachedUser, UserCache
 
 
 app = Flask(__name__)
@@ -23,15 +33,43 @@ app = Flask(__name__)
 # it should be a very secure hash
 app.secret_key = "Helloworld"
 app.permanent_session_lifetime = timedelta(days=5)
-# Users is the table here
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///users.sqlite3'
+# The cookie carries only a session ID; the data is kept server-side (see
+# server_session.py, carried over from the sessions chapter), next to the
+# users database unless SESSIONS_DATABASE says otherwise.
+os.makedirs(app.instance_path, exist_ok=True)
+app.session_interface = ServerSessionInterface(os.environ.get(
+    "SESSIONS_DATABASE", os.path.join(app.instance_path, "sessions.sqlite3")))
+# Users is the table here. USERS_DATABASE_URI points the app at another
+# database (benchmarks use a throwaway file).
+app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get(
+    'USERS_DATABASE_URI', 'sqlite:///users.sqlite3')
 # Remove a warning, makes it so we're not tracking all the modifications
 # to the database
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 
+# SQLite settings applied to every connection: "fast" (WAL,
+# synchronous=NORMAL, mmap, a bigger page cache, a busy timeout),
+# "durable" (WAL, fsync every commit) or "off" (SQLite's defaults).
+# See sqlite_tuning.py.
+app.config['SQLITE_PROFILE'] = os.environ.get('USERS_SQLITE_PROFILE', 'fast')
+# Send login/email writes through one writer thread that commits them in
+# batches instead of one transaction per request.
+app.config['COALESCE_WRITES'] = os.environ.get(
+    'USERS_COALESCE_WRITES', '') not in ('', '0')
+
 # Creating a database for our app
 db = SQLAlchemy()
 db.init_app(app)
+profile = PROFILES[app.config['SQLITE_PROFILE']]
+coalescer = None
+with app.app_context():
+    apply_profile(db.engine, profile)
+    if app.config['COALESCE_WRITES']:
+        # Needs WAL: otherwise a request still reading (holding a shared
+        # lock) would stall the very writer it is waiting on.
+        if profile.journal_mode != "WAL":
+            raise ValueError("write coalescing needs a WAL profile")
+        coalescer = WriteCoalescer(db.engine)
 
 # Now we create a model (an object) that we can use to store our data
 # in and then use to store that object into our database using
@@ -44,7 +82,10 @@ class users(db.Model):
     # or with primary_key=True
     _id = db.Column("id", db.Integer, primary_key=True)
     # new column
-    name = db.Column(db.String(100))
+    # Every login looks users up by name. Without an index that is a full
+    # table scan; with one it is a B-tree probe that stays flat as the table
+    # grows. Unique, because login treats the name as the user's identity.
+    name = db.Column(db.String(100), index=True, unique=True)
     # new column
     email = db.Column(db.String(100))
 
@@ -53,6 +94,34 @@ class users(db.Model):
         self.email = email
 
 
+def init_db():
+    """Create the tables, and add the name index to databases that were
+    created before it existed (create_all never alters existing tables)."""
+    db.create_all()
+    try:
+        db.session.execute(text(
+            "CREATE UNIQUE INDEX IF NOT EXISTS ix_users_name ON users (name)"))
+    except IntegrityError:
+        # Duplicate names from before the constraint: index them anyway.
+        db.session.rollback()
+        db.session.execute(text(
+            "CREATE INDEX IF NOT EXISTS ix_users_name ON users (name)"))
+    db.session.commit()
+
+
+def _load_user(name):
+    found = db.session.execute(
+        db.select(users._id, users.name, users.email).filter_by(name=name)
+    ).first()
+    return None if found is None else CachedUser(*found)
+
+
+# Read-through cache in front of the name lookup. Commits that touch a
+# user drop that name from the cache (see user_cache.py).
+user_cache = UserCache(_load_user)
+user_cache.watch(db.session, users)
+
+
 @app.route("/")
 def home():
     # Can add in-line html when returning from a function
@@ -61,9 +130,49 @@ def home():
                            r="2")
 
 
+# `users.query.all()` built an ORM object for every row and held them all
+# while one big string was rendered: memory grew with the table. Now /view
+# pages by key - `WHERE id > :after ORDER BY id LIMIT n` is an index range
+# scan however deep the page, unlike OFFSET - and selects only the two
+# columns the template prints. `/view?stream=1` lists *everyone*: rows are
+# fetched in batches and rendered into chunks as the response goes out.
+VIEW_PAGE_SIZE = 100
+VIEW_MAX_PAGE_SIZE = 1000
+VIEW_STREAM_BATCH = 500  # rows fetched, and rendered, per chunk
+
+
+def _user_rows():
+    return db.select(users._id, users.name, users.email).order_by(users._id)
+
+
 @app.route("/view")
 def view():
-    return render_template("view.html", values=users.query.all())
+    if request.args.get("stream"):
+        return Response(stream_with_context(_stream_users()),
+                        mimetype="text/html")
+    after = request.args.get("after", -1, type=int)
+    # Clamped both ways: SQLite reads a negative LIMIT as "no limit".
+    limit = max(1, min(request.args.get("limit", VIEW_PAGE_SIZE, type=int),
+                       VIEW_MAX_PAGE_SIZE))
+    # One row more than we show tells us whether there is a next page.
+    rows = db.session.execute(
+        _user_rows().where(users._id > after).limit(limit + 1)).all()
+    next_after = rows[limit - 1]._id if len(rows) > limit else None
+    return render_template("view.html", values=rows[:limit],
+                           next_after=next_after, limit=limit)
+
+
+def _stream_users():
+    # yield_per streams rows from the cursor in batches instead of loading
+    # the full result; Jinja's TemplateStream renders the loop lazily and
+    # buffers it into chunks of about one batch.
+    rows = db.session.execute(
+        _user_rows().execution_options(yield_per=VIEW_STREAM_BATCH))
+    context = {"values": rows, "next_after": None, "limit": None}
+    app.update_template_context(context)  # url_for, session, flashes...
+    stream = app.jinja_env.get_template("view.html").stream(context)
+    stream.enable_buffering(VIEW_STREAM_BATCH)
+    yield from stream
 
 
 @app.route("/login", methods=["POST", "GET"])
@@ -73,21 +182,39 @@ def login():
         # By default your session lasts as long as you're in your
         # browser.
         session.permanent = True
+        # New login, new session ID: one planted beforehand stops working.
+        regenerate(session)
         user = request.form["nm"]
         # When you close the browser the session does not persist
         session["user"] = user
         """ DATABASE SECTION """
-        found_user = users.query.filter_by(name=user).first()
+        # was: users.query.filter_by(name=user).first() on every login
+        found_user = user_cache.get(user)
         # This will return and delete one object, doesn't go into
         # effect till it is committed
         # found_user = users.query.filter_by(name=user).delete()
         if found_user:
             session["email"] = found_user.email
+        elif coalescer:
+            # Two first logins with one name can share a batch: the second
+            # insert is a no-op instead of failing the whole batch.
+            coalescer.run(lambda conn: conn.execute(
+                insert(users).values(name=user).on_conflict_do_nothing()))
+            user_cache.invalidate(user)  # outside the session's events
         else:
             usr = users(name=user, email=None)
             db.session.add(usr)
             # Remember rollbacks and priciples of atomicity
-            db.session.commit()
+            try:
+                db.session.commit()
+            except IntegrityError:
+                # A concurrent first login with the same name committed
+                # first (name is unique): use their row.
+                db.session.rollback()
+                user_cache.invalidate(user)
+                found_user = user_cache.get(user)
+                if found_user:
+                    session["email"] = found_user.email
 
         flash("You are now logged in.")
         return redirect(url_for("user", usr=user))
@@ -107,10 +234,20 @@ def user():
             # Grab email from the html template
             email = request.form["email"]
             """ DATABASE SECTION """
-            found_user = users.query.filter_by(name=user).first()
-            found_user.email = email
-            # Remember rollbacks and priciples of atomicity
-            db.session.commit()
+            # The cache gives us the primary key; loading by it is the
+            # cheapest query there is. The commit below invalidates the
+            # cached entry for this name.
+            user_id = user_cache.get(user).id
+            if coalescer:
+                coalescer.run(lambda conn: conn.execute(
+                    update(users).where(users._id == user_id)
+                    .values(email=email)))
+                user_cache.invalidate(user)
+            else:
+                found_user = db.session.get(users, user_id)
+                found_user.email = email
+                # Remember rollbacks and priciples of atomicity
+                db.session.commit()
             flash("Email was saved!")
         else:
             email = session["email"] if "email" in session else None
@@ -130,5 +267,5 @@ def logout():
 
 if __name__ == "__main__":
     with app.app_context():
-        db.create_all()
+        init_db()
     app.run(debug=True)  # debug means you don't need to rerun on changes
@@ -0,0 +1,222 @@
+"""
+Server-side sessions: the cookie holds an ID, the data stays with us.
+
+Flask's default session *is* the cookie: the whole dict is serialized,
+signed and sent on every response, then sent back, verified and
+deserialized on every request. That cost grows with whatever the app
+puts in the session. `ServerSessionInterface` swaps the storage:
+
+    browser cookie   session=<random 256-bit ID>        (always ~45 bytes)
+    in memory        LRU  ID -> (expires_at, JSON)      hot sessions
+    on disk          SQLite  sessions(sid, data, expires)   survives restarts
+
+Reading a hot session skips SQLite: a dict lookup plus parsing the stored
+text, so every request works on its own copy - nested values included -
+and nothing it changes is seen elsewhere until the session is saved. A
+request that does not change the session writes nothing - the session is
+only serialized (Flask's tagged JSON, as for cookies) when it was
+modified. As with Flask's cookie sessions, changing a nested value
+(`session["cart"].append(x)`) does not count: set `session.modified`.
+
+Expiry follows `app.permanent_session_lifetime` for every session; a
+non-permanent one still loses its cookie when the browser closes. Keeping
+a permanent session alive with SESSION_REFRESH_EACH_REQUEST would mean a
+write per request, so the stored expiry is only pushed forward once it is
+`touch_after` seconds stale. Expired rows are deleted by a sweep of at most
+`sweep_batch` rows that runs at most every `sweep_every` seconds, piggy-
+backing on a request instead of stopping the world.
+
+The LRU assumes one process serves the app (like `app.run()`). With
+several workers, pass `front_size=0` so every request reads SQLite.
+
+Call `regenerate(session)` when a user logs in: the session keeps its
+data under a fresh ID and the old ID stops working, so an ID planted in
+the browser before login (session fixation) is worthless afterwards.
+
+    app.session_interface = ServerSessionInterface(
+        os.path.join(app.instance_path, "sessions.sqlite3"))
+"""
+
+import secrets
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from flask.json.tag import TaggedJSONSerializer
+from flask.sessions import SessionInterface, SessionMixin
+from werkzeug.datastructures import CallbackDict
+
+
+class ServerSession(CallbackDict, SessionMixin):
+    def __init__(self, initial=None, sid: Optional[str] = None,
+                 new: bool = False) -> None:
+        def on_update(self) -> None:
+            self.modified = True
+
+        super().__init__(initial, on_update)
+        self.sid = sid
+        self.new = new
+        self.modified = False
+        self.stored_expires = 0.0
+        self.replaced_sid: Optional[str] = None  # deleted on save
+
+
+def regenerate(session) -> None:
+    """Move `session` to a new ID; the old one is dropped when it is saved.
+    A no-op for Flask's cookie sessions, which have no ID to steal."""
+    if isinstance(session, ServerSession):
+        if not session.new and session.replaced_sid is None:
+            session.replaced_sid = session.sid
+        session.sid = secrets.token_urlsafe(32)
+        session.modified = True
+
+
+class SessionStore:
+    """SQLite table of sessions behind an in-memory LRU."""
+
+    def __init__(self, path: str, front_size: int = 10_000) -> None:
+        self.front_size = front_size
+        self.serializer = TaggedJSONSerializer()
+        self._lock = threading.Lock()
+        # sid -> (expires_at, serialized data): never a dict that some
+        # request's session could still be holding and changing
+        self._front = OrderedDict()
+        self._db = sqlite3.connect(path, check_same_thread=False,
+                                   isolation_level=None)
+        self._db.execute("PRAGMA journal_mode = WAL")
+        self._db.execute("PRAGMA synchronous = NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS sessions ("
+            " sid TEXT PRIMARY KEY, data TEXT NOT NULL, expires REAL NOT NULL)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS ix_sessions_expires"
+                         " ON sessions (expires)")
+
+    def get(self, sid: str, now: float):
+        """Return (expires_at, data) for a live session, else None."""
+        with self._lock:
+            entry = self._front.get(sid)
+            if entry is not None:
+                if entry[0] > now:
+                    self._front.move_to_end(sid)
+                    return entry[0], self.serializer.loads(entry[1])
+                del self._front[sid]
+                return None
+            row = self._db.execute(
+                "SELECT expires, data FROM sessions"
+                " WHERE sid = ? AND expires > ?", (sid, now)).fetchone()
+            if row is None:
+                return None
+            self._remember(sid, row)
+            return row[0], self.serializer.loads(row[1])
+
+    def save(self, sid: str, data: dict, expires: float) -> None:
+        text = self.serializer.dumps(data)
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO sessions (sid, data, expires)"
+                " VALUES (?, ?, ?)", (sid, text, expires))
+            self._remember(sid, (expires, text))
+
+    def touch(self, sid: str, expires: float) -> None:
+        with self._lock:
+            self._db.execute("UPDATE sessions SET expires = ? WHERE sid = ?",
+                             (expires, sid))
+            entry = self._front.get(sid)
+            if entry is not None:
+                self._front[sid] = (expires, entry[1])
+
+    def delete(self, sid: str) -> None:
+        with self._lock:
+            self._db.execute("DELETE FROM sessions WHERE sid = ?", (sid,))
+            self._front.pop(sid, None)
+
+    def sweep(self, now: float, batch: int = 500) -> int:
+        """Delete up to `batch` expired sessions; return how many went."""
+        with self._lock:
+            deleted = self._db.execute(
+                "DELETE FROM sessions WHERE sid IN (SELECT sid FROM sessions"
+                " WHERE expires <= ? LIMIT ?)", (now, batch)).rowcount
+        return deleted
+
+    def _remember(self, sid: str, entry) -> None:
+        if self.front_size <= 0:
+            return
+        self._front[sid] = entry
+        self._front.move_to_end(sid)
+        if len(self._front) > self.front_size:
+            self._front.popitem(last=False)
+
+
+class ServerSessionInterface(SessionInterface):
+    session_class = ServerSession
+
+    def __init__(self, path: str, front_size: int = 10_000,
+                 touch_after: float = 60.0, sweep_every: float = 60.0,
+                 sweep_batch: int = 500) -> None:
+        self.store = SessionStore(path, front_size)
+        self.touch_after = touch_after
+        self.sweep_every = sweep_every
+        self.sweep_batch = sweep_batch
+        self._next_sweep = 0.0
+
+    def open_session(self, app, request) -> ServerSession:
+        now = time.time()
+        sid = request.cookies.get(self.get_cookie_name(app))
+        entry = self.store.get(sid, now) if sid else None
+        if entry is None:
+            # Unknown or expired: always a fresh ID, never the client's.
+            return self.session_class(sid=secrets.token_urlsafe(32), new=True)
+        # entry[1] was just parsed for this request alone.
+        session = self.session_class(entry[1], sid=sid)
+        session.stored_expires = entry[0]
+        return session
+
+    def save_session(self, app, session: ServerSession, response) -> None:
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+        secure = self.get_cookie_secure(app)
+        partitioned = self.get_cookie_partitioned(app)
+        samesite = self.get_cookie_samesite(app)
+        httponly = self.get_cookie_httponly(app)
+        now = time.time()
+        self._maybe_sweep(now)
+
+        if session.accessed:
+            response.vary.add("Cookie")
+
+        if session.replaced_sid is not None:
+            self.store.delete(session.replaced_sid)
+            session.replaced_sid = None
+
+        if not session:
+            if session.modified and not session.new:
+                self.store.delete(session.sid)
+                response.delete_cookie(
+                    name, domain=domain, path=path, secure=secure,
+                    partitioned=partitioned, samesite=samesite,
+                    httponly=httponly)
+                response.vary.add("Cookie")
+            return
+
+        expires = now + app.permanent_session_lifetime.total_seconds()
+        if session.modified:
+            self.store.save(session.sid, dict(session), expires)
+        elif (self.should_set_cookie(app, session)
+              and expires - session.stored_expires > self.touch_after):
+            self.store.touch(session.sid, expires)
+
+        if not self.should_set_cookie(app, session):
+            return
+        response.set_cookie(
+            name, session.sid, expires=self.get_expiration_time(app, session),
+            httponly=httponly, domain=domain, path=path, secure=secure,
+            partitioned=partitioned, samesite=samesite)
+        response.vary.add("Cookie")
+
+    def _maybe_sweep(self, now: float) -> None:
+        if now >= self._next_sweep:
+            self._next_sweep = now + self.sweep_every
+            self.store.sweep(now, self.sweep_batch)
@@ -0,0 +1,182 @@
+"""
+SQLite performance profiles and a group-commit write coalescer.
+
+Profiles
+--------
+Out of the box SQLite uses a rollback journal and `synchronous=FULL`:
+every commit fsyncs (more than once), and a writer locks out readers.
+PRAGMAs change that, but most of them are per *connection*, and
+SQLAlchemy opens connections whenever its pool needs one - so the
+profile is applied from the engine's "connect" event:
+
+    journal_mode   WAL: readers never block the writer and vice versa,
+                   and a commit appends to the log instead of rewriting
+                   pages in place
+    synchronous    NORMAL in WAL mode fsyncs at checkpoints, not on every
+                   commit. A power cut can lose the last few commits but
+                   never corrupts the file. FULL keeps every commit.
+    mmap_size      read pages straight from the OS page cache
+    cache_size     page cache per connection (negative means KiB)
+    busy_timeout   wait this long for a lock instead of failing at once
+
+    apply_profile(engine, PROFILES["fast"])
+
+Write coalescing
+----------------
+Even with WAL, SQLite has a single writer and each commit is a trip to
+the disk. `WriteCoalescer` gives the process one writer thread: requests
+hand it a small unit of work and block on a future, and the thread runs
+everything that queued up meanwhile in *one* transaction - one commit for
+a whole batch of logins. If the batch fails, each job is retried in its
+own transaction, so one bad write cannot fail its neighbours.
+
+    coalescer = WriteCoalescer(engine)
+    coalescer.run(lambda conn: conn.execute(stmt))   # blocks until committed
+"""
+
+import queue
+import threading
+from concurrent.futures import Future
+from dataclasses import dataclass
+from typing import Callable, Optional
+
+from sqlalchemy import event
+
+
+@dataclass(frozen=True)
+class SQLiteProfile:
+    journal_mode: Optional[str] = None  # None leaves a setting alone
+    synchronous: Optional[str] = None
+    mmap_size: Optional[int] = None  # bytes
+    cache_size: Optional[int] = None  # pages, or -KiB
+    busy_timeout: Optional[int] = None  # milliseconds
+
+    def pragmas(self):
+        for name in ("journal_mode", "synchronous", "mmap_size",
+                     "cache_size", "busy_timeout"):
+            value = getattr(self, name)
+            if value is not None:
+                yield f"PRAGMA {name} = {value}"
+
+
+PROFILES = {
+    # SQLite's own defaults: what the app did before profiles existed.
+    "off": SQLiteProfile(),
+    # WAL, but still an fsync on every commit.
+    "durable": SQLiteProfile(journal_mode="WAL", synchronous="FULL",
+                             busy_timeout=5000),
+    "fast": SQLiteProfile(journal_mode="WAL", synchronous="NORMAL",
+                          mmap_size=256 * 2**20, cache_size=-64_000,
+                          busy_timeout=5000),
+}
+
+
+def apply_profile(engine, profile: SQLiteProfile) -> None:
+    """Run the profile's PRAGMAs on every connection `engine` opens."""
+    statements = list(profile.pragmas())
+    if not statements or engine.dialect.name != "sqlite":
+        return
+
+    @event.listens_for(engine, "connect")
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for statement in statements:
+            cursor.execute(statement)
+        cursor.close()
+
+    engine.dispose()  # connections opened before now lack the PRAGMAs
+
+
+_STOP = object()
+
+
+class WriteCoalescer:
+    """One writer thread that commits queued jobs in batches."""
+
+    def __init__(self, engine, max_batch: int = 128,
+                 max_delay: float = 0.0) -> None:
+        # max_delay > 0 waits that long for stragglers before committing a
+        # batch; 0 batches only what queued during the previous commit.
+        self.engine = engine
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.batches = 0
+        self.jobs = 0
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._loop, daemon=True,
+                                        name="sqlite-writer")
+        self._thread.start()
+
+    def submit(self, job: Callable) -> Future:
+        """Queue `job(connection)`; the future resolves after the commit."""
+        future = Future()
+        self._queue.put((job, future))
+        return future
+
+    def run(self, job: Callable):
+        return self.submit(job).result()
+
+    def close(self) -> None:
+        self._queue.put(_STOP)
+        self._thread.join()
+
+    def _loop(self) -> None:
+        # The writer keeps a connection of its own. Borrowing one from the
+        # pool per batch can deadlock: the requests waiting on us may be
+        # holding every pooled connection.
+        self._conn = self.engine.connect()
+        try:
+            self._drain()
+        finally:
+            self._conn.close()
+
+    def _drain(self) -> None:
+        while True:
+            first = self._queue.get()
+            if first is _STOP:
+                return
+            batch, stop = [first], False
+            while len(batch) < self.max_batch:
+                try:
+                    item = self._queue.get(timeout=self.max_delay) \
+                        if self.max_delay else self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    stop = True
+                    break
+                batch.append(item)
+            self._commit(batch)
+            if stop:
+                return
+
+    def _commit(self, batch) -> None:
+        batch = [(job, future) for job, future in batch
+                 if future.set_running_or_notify_cancel()]
+        if not batch:
+            return
+        if len(batch) == 1:
+            self._commit_alone(*batch[0])
+            return
+        try:
+            with self._conn.begin():
+                results = [job(self._conn) for job, _ in batch]
+        except Exception:
+            for item in batch:  # find the bad job, commit the rest
+                self._commit_alone(*item)
+            return
+        self.batches += 1
+        self.jobs += len(batch)
+        for (_, future), result in zip(batch, results):
+            future.set_result(result)
+
+    def _commit_alone(self, job, future) -> None:
+        try:
+            with self._conn.begin():
+                result = job(self._conn)
+        except Exception as exc:
+            future.set_exception(exc)
+        else:
+            self.batches += 1
+            self.jobs += 1
+            future.set_result(result)
@@ -0,0 +1,89 @@
+import threading
+
+import pytest
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.exc import IntegrityError
+from sqlite_tuning import PROFILES, WriteCoalescer, apply_profile
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'test.sqlite3'}")
+    apply_profile(engine, PROFILES["fast"])
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE t (name TEXT UNIQUE)"))
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def coalescer(engine):
+    coalescer = WriteCoalescer(engine)
+    yield coalescer
+    coalescer.close()
+
+
+def insert(name):
+    return lambda conn: conn.execute(
+        text("INSERT INTO t VALUES (:name)"), {"name": name}).rowcount
+
+
+def names(engine):
+    with engine.connect() as conn:
+        return sorted(conn.execute(text("SELECT name FROM t")).scalars())
+
+
+def hold_writer(coalescer):
+    """Keep the writer busy until the returned event is set, so the jobs
+    submitted meanwhile queue up into one batch."""
+    busy, release = threading.Event(), threading.Event()
+
+    def job(conn):
+        busy.set()
+        release.wait(5)
+
+    coalescer.submit(job)
+    assert busy.wait(5)
+    return release
+
+
+@pytest.mark.parametrize("name, journal_mode, synchronous", [
+    ("off", "delete", 2), ("durable", "wal", 2), ("fast", "wal", 1)])
+def test_profiles_set_their_pragmas_on_every_connection(
+        tmp_path, name, journal_mode, synchronous):
+    engine = create_engine(f"sqlite:///{tmp_path / 'p.sqlite3'}")
+    apply_profile(engine, PROFILES[name])
+    for _ in range(2):  # a second, separate connection too
+        with engine.connect() as conn:
+            assert conn.exec_driver_sql(
+                "PRAGMA journal_mode").scalar() == journal_mode
+            assert conn.exec_driver_sql(
+                "PRAGMA synchronous").scalar() == synchronous
+        engine.dispose()
+
+
+def test_concurrent_jobs_share_one_commit(engine, coalescer):
+    commits = []
+    event.listen(engine, "commit", lambda conn: commits.append(conn))
+    release = hold_writer(coalescer)
+    futures = [coalescer.submit(insert(f"u{i}")) for i in range(5)]
+    release.set()
+    assert [f.result(5) for f in futures] == [1] * 5
+    assert len(commits) == 2  # the held job, then all five together
+    assert coalescer.batches == 2 and coalescer.jobs == 6
+    assert names(engine) == [f"u{i}" for i in range(5)]
+
+
+def test_a_failing_job_fails_only_its_own_caller(engine, coalescer):
+    coalescer.run(insert("taken"))
+    release = hold_writer(coalescer)
+    good = coalescer.submit(insert("a"))
+    bad = coalescer.submit(insert("taken"))  # violates UNIQUE
+    also_good = coalescer.submit(insert("b"))
+    release.set()
+    assert good.result(5) == also_good.result(5) == 1
+    with pytest.raises(IntegrityError):
+        bad.result(5)
+    assert names(engine) == ["a", "b", "taken"]
+    # The writer is still alive after the failure.
+    assert coalescer.run(insert("c")) == 1
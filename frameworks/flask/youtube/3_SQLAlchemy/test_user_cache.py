@@ -0,0 +1,81 @@
+from sqlalchemy import text
+
+
+def add_user(main, name, email=None):
+    with main.app.app_context():
+        main.db.session.add(main.users(name=name, email=email))
+        main.db.session.commit()
+
+
+def test_a_miss_loads_and_a_hit_does_not(main):
+    add_user(main, "tim", "tim@example.com")
+    cache = main.user_cache
+    with main.app.app_context():
+        assert cache.get("tim").email == "tim@example.com"
+        assert cache.get("tim").email == "tim@example.com"
+        assert cache.get("nobody") is None
+        assert cache.get("nobody") is None  # "no such user" is cached too
+    assert (cache.hits, cache.misses) == (2, 2)
+
+
+def test_commits_drop_renamed_and_deleted_users(main):
+    add_user(main, "tim")
+    add_user(main, "joe")
+    cache = main.user_cache
+    with main.app.app_context():
+        tim_id = cache.get("tim").id
+        assert cache.get("bill") is None
+        main.db.session.get(main.users, tim_id).name = "bill"
+        main.db.session.commit()
+        assert cache.get("tim") is None
+        assert cache.get("bill").id == tim_id
+        joe = main.db.session.get(main.users, cache.get("joe").id)
+        main.db.session.delete(joe)
+        main.db.session.commit()
+        assert cache.get("joe") is None
+
+
+def test_a_rolled_back_change_invalidates_nothing(main):
+    add_user(main, "tim", "old@example.com")
+    cache = main.user_cache
+    with main.app.app_context():
+        user = main.db.session.get(main.users, cache.get("tim").id)
+        user.email = "new@example.com"
+        main.db.session.flush()
+        main.db.session.rollback()
+        misses = cache.misses
+        assert cache.get("tim").email == "old@example.com"
+        assert cache.misses == misses  # still cached
+
+
+def test_login_lookups_use_the_name_index(main):
+    with main.app.app_context():
+        plan = main.db.session.execute(text(
+            "EXPLAIN QUERY PLAN SELECT id, name, email FROM users "
+            "WHERE name = 'tim'")).all()
+    assert "USING INDEX ix_users_name" in " ".join(row[-1] for row in plan)
+
+
+def test_login_creates_each_user_once(main, client):
+    for _ in range(2):
+        client.get("/logout")
+        assert client.post("/login", data={"nm": "tim"}).status_code == 302
+    with main.app.app_context():
+        assert main.db.session.execute(text(
+            "SELECT count(*) FROM users WHERE name = 'tim'")).scalar() == 1
+
+
+def test_losing_a_first_login_race_is_not_an_error(main, client):
+    with main.app.app_context():
+        assert main.user_cache.get("tim") is None  # cached: no such user
+        # Another request inserts tim behind the cache's back.
+        main.db.session.execute(text(
+            "INSERT INTO users (name, email) VALUES ('tim', 'tim@x.org')"))
+        main.db.session.commit()
+    response = client.post("/login", data={"nm": "tim"})
+    assert response.status_code == 302
+    with client.session_transaction() as session:
+        assert session["email"] == "tim@x.org"
+    with main.app.app_context():
+        assert main.db.session.execute(text(
+            "SELECT count(*) FROM users WHERE name = 'tim'")).scalar() == 1
@@ -0,0 +1,48 @@
+import re
+
+import pytest
+from sqlalchemy import insert
+
+
+@pytest.fixture
+def seeded(main):
+    with main.app.app_context():
+        main.db.session.execute(insert(main.users), [
+            {"name": f"user{i}", "email": f"user{i}@example.com"}
+            for i in range(300)])
+        main.db.session.commit()
+    return main
+
+
+def names(response):
+    return re.findall(r"Name: (\w+),", response.get_data(as_text=True))
+
+
+def test_pages_follow_the_next_link_to_the_end(seeded, client):
+    seen, url = [], "/view?limit=120"
+    while url:
+        response = client.get(url)
+        seen += names(response)
+        link = re.search(r'href="(/view\?[^"]+)"', response.get_data(as_text=True))
+        url = link and link.group(1).replace("&amp;", "&")
+    assert seen == [f"user{i}" for i in range(300)]
+
+
+@pytest.mark.parametrize("limit", ["-5", "-1", "0"])
+def test_a_limit_below_one_shows_one_row(seeded, client, limit):
+    response = client.get(f"/view?limit={limit}")
+    assert response.status_code == 200
+    assert names(response) == ["user0"]
+    assert "after=1&amp;limit=1" in response.get_data(as_text=True)
+
+
+def test_a_huge_limit_is_capped(seeded, client, monkeypatch):
+    monkeypatch.setattr(seeded, "VIEW_MAX_PAGE_SIZE", 50)
+    response = client.get("/view?limit=100000")
+    assert len(names(response)) == 50
+
+
+def test_stream_lists_everyone(seeded, client):
+    response = client.get("/view?stream=1")
+    assert names(response) == [f"user{i}" for i in range(300)]
+    assert "Next page" not in response.get_data(as_text=True)
@@ -0,0 +1,105 @@
+"""
+Read-through cache for user lookups by name.
+
+Every request to /login and /user looks a user up by name.  With an index
+on `users.name` that is an O(log n) B-tree probe instead of a full table
+scan, but it is still a round trip through the ORM.  `UserCache` keeps the
+answer in a per-process LRU:
+
+    user_cache.get(name)  ->  CachedUser(id, name, email) or None
+
+A miss runs the query and remembers the result - including "no such
+user", so logging in as a new name does not hit the database twice.
+
+Invalidation hangs off SQLAlchemy session events: `after_flush` notes the
+names of every users row inserted, changed or deleted, and `after_commit`
+drops exactly those names (a rollback just forgets the list).  A cache in
+another process cannot see our commits, so entries also expire after
+`ttl` seconds.
+
+We cache small immutable tuples, never ORM objects: those belong to the
+session (and thread) that loaded them.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, NamedTuple, Optional
+
+from sqlalchemy import event, inspect
+
+_PENDING = "user_cache_names"  # key in session.info
+
+
+class CachedUser(NamedTuple):
+    id: int
+    name: str
+    email: Optional[str]
+
+
+class UserCache:
+    def __init__(self, loader: Callable[[str], Optional[CachedUser]],
+                 maxsize: int = 10_000, ttl: float = 60.0) -> None:
+        self.loader = loader
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()  # Flask serves requests on threads
+        self._entries = OrderedDict()  # name -> (expires_at, CachedUser|None)
+        self._invalidations = 0
+
+    def get(self, name: str) -> Optional[CachedUser]:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(name)
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(name)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+            invalidations = self._invalidations
+        user = self.loader(name)  # outside the lock: it is a DB query
+        with self._lock:
+            if invalidations != self._invalidations:
+                # A commit landed while we were loading; what we read may
+                # predate it, so serve it but do not cache it.
+                return user
+            self._entries[name] = (now + self.ttl, user)
+            self._entries.move_to_end(name)
+            if len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return user
+
+    def invalidate(self, *names: str) -> None:
+        with self._lock:
+            self._invalidations += 1
+            for name in names:
+                self._entries.pop(name, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def watch(self, session, model) -> None:
+        """Invalidate on commit whenever `session` writes `model` rows."""
+
+        @event.listens_for(session, "after_flush")
+        def remember_names(sess, flush_context):
+            names = sess.info.setdefault(_PENDING, set())
+            for obj in (*sess.new, *sess.dirty, *sess.deleted):
+                if isinstance(obj, model):
+                    # A renamed user is stale under the old name as well.
+                    history = inspect(obj).attrs.name.history
+                    names.update(n for n in (*history.added, *history.deleted,
+                                             *history.unchanged) if n)
+
+        @event.listens_for(session, "after_commit")
+        def invalidate_committed(sess):
+            names = sess.info.pop(_PENDING, None)
+            if names:
+                self.invalidate(*names)
+
+        @event.listens_for(session, "after_rollback")
+        def forget_pending(sess):
+            sess.info.pop(_PENDING, None)
@@ -0,0 +1,137 @@
+"""
+Fingerprinted, precompressed static files for a blueprint.
+
+Flask's static handler sends `Cache-Control: no-cache`, so the browser
+asks again on every page view ("still the same?" -> 304), and it sends
+the bytes uncompressed. Both are there because a URL like
+/cat/static/style.css can start meaning different content at any time.
+
+The fix is to never change what a URL means. When the blueprint is
+registered, `AssetPipeline` copies every file in its static folder to a
+build folder under a name that contains a hash of its content, and
+writes a gzipped twin next to it when that is worth it:
+
+    static/style.css  ->  build/style.3f2a9c1b7d0e.css
+                          build/style.3f2a9c1b7d0e.css.gz
+
+A hashed URL can then be cached for a year (`immutable`: do not even
+revalidate) - new content gets a new name. A client that sends
+`Accept-Encoding: gzip` gets the .gz file as is, so nothing is compressed
+per request. Templates ask for the logical name:
+
+    <link rel="stylesheet" href="{{ asset_url('style.css') }}">
+
+The build runs once at startup; call `build()` again after changing a
+file while the app is running.
+"""
+
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+from typing import Dict, NamedTuple, Optional
+
+from flask import abort, request, send_file, url_for
+
+ONE_YEAR = 365 * 24 * 60 * 60
+
+
+class BuiltAsset(NamedTuple):
+    path: str
+    gzip_path: Optional[str]
+    mimetype: str
+    digest: str
+
+
+class AssetPipeline:
+    def __init__(self, blueprint, build_folder: str = "build",
+                 url_path: str = "/assets", endpoint: str = "asset",
+                 min_gzip_size: int = 256) -> None:
+        self.blueprint = blueprint
+        self.build_folder = os.path.join(blueprint.root_path, build_folder)
+        self.endpoint = f"{blueprint.name}.{endpoint}"
+        self.min_gzip_size = min_gzip_size
+        self.manifest: Dict[str, str] = {}  # "style.css" -> hashed name
+        self._built: Dict[str, BuiltAsset] = {}  # hashed name -> files
+        blueprint.add_url_rule(f"{url_path}/<path:filename>", endpoint,
+                               self.serve)
+        blueprint.app_template_global("asset_url")(self.url_for)
+        blueprint.record_once(lambda state: self.build())
+
+    def build(self) -> None:
+        source = self.blueprint.static_folder
+        os.makedirs(self.build_folder, exist_ok=True)
+        manifest, built = {}, {}
+        for folder, _, files in os.walk(source):
+            for name in files:
+                path = os.path.join(folder, name)
+                logical = os.path.relpath(path, source).replace(os.sep, "/")
+                with open(path, "rb") as f:
+                    data = f.read()
+                digest = hashlib.sha256(data).hexdigest()[:12]
+                stem, ext = os.path.splitext(logical)
+                hashed = f"{stem}.{digest}{ext}"
+                manifest[logical] = hashed
+                built[hashed] = self._write(hashed, data, digest, logical)
+        _write_atomic(os.path.join(self.build_folder, "manifest.json"),
+                      json.dumps(manifest, indent=2, sort_keys=True).encode())
+        self.manifest, self._built = manifest, built
+
+    def _write(self, hashed: str, data: bytes, digest: str,
+               logical: str) -> BuiltAsset:
+        target = os.path.join(self.build_folder, *hashed.split("/"))
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        # Same name, same content: files from an earlier build are reused.
+        if not os.path.exists(target):
+            _write_atomic(target, data)
+        gzip_path = None
+        if len(data) >= self.min_gzip_size:
+            gzip_path = target + ".gz"
+            if not os.path.exists(gzip_path):
+                packed = gzip.compress(data, compresslevel=9, mtime=0)
+                # JPEGs and the like are compressed already: keep the .gz
+                # only if it saves at least a tenth.
+                if len(packed) <= len(data) * 0.9:
+                    _write_atomic(gzip_path, packed)
+            if not os.path.exists(gzip_path):
+                gzip_path = None
+        mimetype = mimetypes.guess_type(logical)[0] or \
+            "application/octet-stream"
+        return BuiltAsset(target, gzip_path, mimetype, digest)
+
+    def url_for(self, filename: str, **values) -> str:
+        hashed = self.manifest.get(filename)
+        if hashed is None:
+            # Not a built asset: the plain, revalidated static URL.
+            return url_for(f"{self.blueprint.name}.static", filename=filename,
+                           **values)
+        return url_for(self.endpoint, filename=hashed, **values)
+
+    def serve(self, filename: str):
+        asset = self._built.get(filename)
+        if asset is None:
+            abort(404)
+        compressed = asset.gzip_path is not None and \
+            request.accept_encodings.quality("gzip") > 0
+        response = send_file(
+            asset.gzip_path if compressed else asset.path,
+            mimetype=asset.mimetype, max_age=ONE_YEAR, conditional=True,
+            # One ETag per representation, or a cache could hand gzipped
+            # bytes to a client that never asked for them.
+            etag=asset.digest + ("-gz" if compressed else ""))
+        if compressed:
+            response.content_encoding = "gzip"
+        response.cache_control.public = True
+        response.cache_control.immutable = True
+        if asset.gzip_path is not None:
+            response.vary.add("Accept-Encoding")
+        return response
+
+
+def _write_atomic(path: str, data: bytes) -> None:
+    # Several workers may build at once; readers must never see half a file.
+    temp = f"{path}.{os.getpid()}.tmp"
+    with open(temp, "wb") as f:
+        f.write(data)
+    os.replace(temp, path)
@@ -1,5 +1,7 @@
 from flask import Blueprint, render_template
 
+from .assets import AssetPipeline
+
 # Always name this after the file, the second import will always be
 # __name__ pretty much. You should also link up your static and
 # templates folders.
@@ -8,7 +10,11 @@ from flask import Blueprint, render_template
 second = Blueprint("second",
                    __name__,
                    static_folder="static",
-                   template_folder="template")
+                   template_folder="templates")
+
+# Serves the static folder under content-hashed names, gzipped and cached
+# for a year, at /cat/assets/. Templates link files with asset_url().
+assets = AssetPipeline(second)
 
 
 @second.route("/home")
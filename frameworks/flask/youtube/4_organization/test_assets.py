@@ -0,0 +1,116 @@
+import gzip
+import importlib.util
+import os
+import re
+import sys
+
+import pytest
+from cat.assets import ONE_YEAR, AssetPipeline
+from flask import Blueprint, Flask
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+CSS = b"body { color: rebeccapurple; }\n" * 40  # big enough to gzip
+
+
+@pytest.fixture
+def site(tmp_path):
+    static = tmp_path / "static"
+    static.mkdir()
+    (static / "style.css").write_bytes(CSS)
+    (static / "tiny.js").write_bytes(b"let x = 1;\n")
+    blueprint = Blueprint("t", __name__, static_folder=str(static),
+                          root_path=str(tmp_path))
+    assets = AssetPipeline(blueprint)
+    app = Flask(__name__)
+    app.register_blueprint(blueprint, url_prefix="/t")
+    return app, assets, static
+
+
+def asset_url(app, name):
+    with app.test_request_context():
+        return app.jinja_env.globals["asset_url"](name)
+
+
+def test_urls_carry_a_hash_of_the_content(site):
+    app, assets, static = site
+    url = asset_url(app, "style.css")
+    assert re.fullmatch(r"/t/assets/style\.[0-9a-f]{12}\.css", url)
+    (static / "style.css").write_bytes(CSS + b"a { color: red; }\n")
+    assets.build()
+    new_url = asset_url(app, "style.css")
+    assert new_url != url
+    client = app.test_client()
+    assert client.get(new_url).status_code == 200
+    assert client.get(url).status_code == 404  # old content is gone
+    assert asset_url(app, "missing.css") == "/t/static/missing.css"
+
+
+def test_assets_are_cached_for_a_year_without_revalidation(site):
+    app, _, _ = site
+    response = app.test_client().get(asset_url(app, "style.css"))
+    cache = response.cache_control
+    assert cache.max_age == ONE_YEAR and cache.public and cache.immutable
+    assert response.mimetype == "text/css"
+
+
+def test_gzip_goes_to_clients_that_accept_it(site):
+    app, _, _ = site
+    response = app.test_client().get(asset_url(app, "style.css"),
+                                     headers={"Accept-Encoding": "gzip"})
+    assert response.content_encoding == "gzip"
+    assert gzip.decompress(response.data) == CSS
+    assert "Accept-Encoding" in response.vary
+
+
+@pytest.mark.parametrize("accept", [None, "identity", "gzip;q=0, br"])
+def test_other_clients_get_the_plain_bytes(site, accept):
+    app, _, _ = site
+    headers = {} if accept is None else {"Accept-Encoding": accept}
+    response = app.test_client().get(asset_url(app, "style.css"),
+                                     headers=headers)
+    assert response.content_encoding is None
+    assert response.data == CSS
+    assert "Accept-Encoding" in response.vary
+
+
+def test_small_files_are_not_gzipped(site):
+    app, _, _ = site
+    response = app.test_client().get(asset_url(app, "tiny.js"),
+                                     headers={"Accept-Encoding": "gzip"})
+    assert response.content_encoding is None
+    assert response.data == b"let x = 1;\n"
+    assert "Accept-Encoding" not in response.vary
+
+
+def test_etags_answer_304_per_representation(site):
+    app, _, _ = site
+    client, url = app.test_client(), asset_url(app, "style.css")
+    gz = {"Accept-Encoding": "gzip"}
+    plain_tag = client.get(url).headers["ETag"]
+    gzip_tag = client.get(url, headers=gz).headers["ETag"]
+    assert plain_tag != gzip_tag
+    assert client.get(url, headers={"If-None-Match": plain_tag}
+                      ).status_code == 304
+    assert client.get(url, headers={**gz, "If-None-Match": gzip_tag}
+                      ).status_code == 304
+    # The plain ETag does not vouch for the gzipped bytes.
+    response = client.get(url, headers={**gz, "If-None-Match": plain_tag})
+    assert response.status_code == 200
+    assert gzip.decompress(response.data) == CSS
+
+
+def test_the_cat_page_links_its_fingerprinted_assets():
+    spec = importlib.util.spec_from_file_location(
+        "organization_main", os.path.join(HERE, "main.py"))
+    module = importlib.util.module_from_spec(spec)
+    sys.modules["organization_main"] = module
+    try:
+        spec.loader.exec_module(module)
+    finally:
+        del sys.modules["organization_main"]
+    client = module.app.test_client()
+    page = client.get("/cat/").get_data(as_text=True)
+    links = re.findall(r'(?:href|src)="(/cat/assets/[^"]+)"', page)
+    assert len(links) == 2
+    for link in links:
+        assert client.get(link).status_code == 200
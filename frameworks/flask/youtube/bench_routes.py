@@ -0,0 +1,281 @@
+"""
+Benchmark: per-route cost of the four Flask apps, and where it goes.
+
+Imports each chapter's `app` and drives its routes through Flask's test
+client (no sockets, no server). Routes that need a login use a client
+that is already logged in, with the session a browser would carry; /login
+posts come from a logged-out client, as they would. The SQLAlchemy app
+runs against a throwaway database seeded with `--users` users.
+
+For every route it reports requests per second, latency percentiles and
+how the time splits between:
+
+    template   render_template() - Flask's before_render_template and
+               template_rendered signals
+    orm        db.session execute/get/commit (queries, flushes, commits)
+    sql        the part of orm spent running statements on the cursor -
+               SQLAlchemy's before/after_cursor_execute engine events
+    session    loading and saving the session - open_session and
+               save_session on the app's session interface
+    other      everything else: routing, the view, Werkzeug, the client,
+               and the template of /view?stream=1, which is rendered
+               outside render_template()
+
+Run with:
+    python bench_routes.py --requests 500 --users 10000
+    python bench_routes.py --apps 3_SQLAlchemy
+"""
+
+import argparse
+import copy
+import functools
+import importlib.util
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List
+
+from flask import before_render_template, template_rendered
+from sqlalchemy import event
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+CATEGORIES = ("template", "orm", "sql", "session")  # sql is part of orm
+
+
+@dataclass
+class Route:
+    name: str
+    # Returns a callable that makes one request, so per-request set-up
+    # (a fresh client, a random name) stays out of the timing.
+    prepare: Callable[[random.Random], Callable]
+    heavy: bool = False  # runs a twentieth as many requests
+
+
+@dataclass
+class Timer:
+    """Seconds spent per category, summed over a route's requests."""
+
+    spent: Dict[str, float] = field(default_factory=lambda: defaultdict(float))
+    _started: Dict[str, float] = field(default_factory=dict)
+    _depth: Dict[str, int] = field(default_factory=lambda: defaultdict(int))
+
+    def start(self, category: str) -> None:
+        # Only the outermost of nested calls (get() inside the cache's
+        # execute(), say) is counted.
+        self._depth[category] += 1
+        if self._depth[category] == 1:
+            self._started[category] = time.perf_counter()
+
+    def stop(self, category: str) -> None:
+        self._depth[category] -= 1
+        if self._depth[category] == 0:
+            self.spent[category] += \
+                time.perf_counter() - self._started.pop(category)
+
+    def timed(self, category: str, fn: Callable) -> Callable:
+        def wrapper(*args, **kwargs):
+            self.start(category)
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                self.stop(category)
+
+        return wrapper
+
+
+# -- loading the apps ----------------------------------------------------
+
+
+def load(chapter: str):
+    """Import <chapter>/main.py under its own module name."""
+    folder = os.path.join(HERE, chapter)
+    sys.path.insert(0, folder)  # for the chapter's own modules
+    name = f"bench_{chapter}"
+    spec = importlib.util.spec_from_file_location(
+        name, os.path.join(folder, "main.py"))
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module  # Flask finds templates through it
+    spec.loader.exec_module(module)
+    return module
+
+
+def instrument(app, timer: Timer, db=None) -> None:
+    before_render_template.connect(
+        lambda sender, **extra: timer.start("template"), app, weak=False)
+    template_rendered.connect(
+        lambda sender, **extra: timer.stop("template"), app, weak=False)
+    # Flask's default interface is one instance shared by every app.
+    interface = copy.copy(app.session_interface)
+    interface.open_session = timer.timed("session", interface.open_session)
+    interface.save_session = timer.timed("session", interface.save_session)
+    app.session_interface = interface
+    if db is not None:
+        for name in ("execute", "get", "commit"):
+            setattr(db.session, name,
+                    timer.timed("orm", getattr(db.session, name)))
+        event.listen(db.engine, "before_cursor_execute",
+                     lambda *args: timer.start("sql"))
+        event.listen(db.engine, "after_cursor_execute",
+                     lambda *args: timer.stop("sql"))
+
+
+def logged_in(app, name: str, **extra_session):
+    client = app.test_client()
+    client.post("/login", data={"nm": name})
+    with client.session_transaction() as session:
+        session.update(extra_session)
+    client.get("/user")  # consume the login flash, as the redirect would
+    return client
+
+
+# -- the four chapters ---------------------------------------------------
+
+
+def basics(timer: Timer, users: int) -> List[Route]:
+    app = load("1_basics").app
+    instrument(app, timer)
+    client = app.test_client()
+    return [
+        Route("GET /", lambda r: lambda: client.get("/")),
+        Route("GET /login", lambda r: lambda: client.get("/login")),
+        Route("POST /login", lambda r: lambda: client.post(
+            "/login", data={"nm": f"user{r.randrange(users)}"})),
+        Route("GET /<usr>", lambda r: lambda: client.get(
+            f"/user{r.randrange(users)}")),
+    ]
+
+
+def sessions(timer: Timer, users: int) -> List[Route]:
+    os.environ["SESSIONS_DATABASE"] = os.path.join(tempfile.mkdtemp(),
+                                                   "sessions.sqlite3")
+    app = load("2_sessions").app
+    instrument(app, timer)
+    client = logged_in(app, "user0")
+
+    def post_login(r):
+        fresh = app.test_client()
+        return lambda: fresh.post("/login",
+                                  data={"nm": f"user{r.randrange(users)}"})
+
+    return [
+        Route("GET /", lambda r: lambda: client.get("/")),
+        Route("GET /login",
+              lambda r: functools.partial(app.test_client().get, "/login")),
+        Route("POST /login", post_login),
+        Route("GET /user", lambda r: lambda: client.get("/user")),
+    ]
+
+
+def sqlalchemy(timer: Timer, users: int) -> List[Route]:
+    folder = tempfile.mkdtemp()
+    os.environ["USERS_DATABASE_URI"] = \
+        f"sqlite:///{os.path.join(folder, 'users.sqlite3')}"
+    os.environ["SESSIONS_DATABASE"] = os.path.join(folder, "sessions.sqlite3")
+    main = load("3_SQLAlchemy")
+    app = main.app
+    with app.app_context():
+        main.init_db()
+        main.db.session.execute(
+            main.users.__table__.insert(),
+            [{"name": f"user{i}", "email": f"user{i}@example.com"}
+             for i in range(users)])
+        main.db.session.commit()
+        instrument(app, timer, main.db)
+    client = logged_in(app, "user0", email="user0@example.com")
+
+    def post_login(r):
+        fresh = app.test_client()
+        return lambda: fresh.post("/login",
+                                  data={"nm": f"user{r.randrange(users)}"})
+
+    def post_email(r):
+        email = f"user0+{r.randrange(10**6)}@example.com"
+        return lambda: client.post("/user", data={"email": email})
+
+    return [
+        Route("GET /", lambda r: lambda: client.get("/")),
+        Route("POST /login", post_login),
+        Route("GET /user", lambda r: lambda: client.get("/user")),
+        Route("POST /user", post_email),
+        Route("GET /view", lambda r: lambda: client.get("/view")),
+        Route("GET /view?after=", lambda r: lambda: client.get(
+            "/view", query_string={"after": r.randrange(users)})),
+        Route("GET /view?stream=1",
+              lambda r: lambda: b"".join(
+                  client.get("/view?stream=1", buffered=False).response),
+              heavy=True),
+    ]
+
+
+def organization(timer: Timer, users: int) -> List[Route]:
+    app = load("4_organization").app
+    instrument(app, timer)
+    client = app.test_client()
+    with app.test_request_context():
+        css = app.jinja_env.globals["asset_url"]("style.css")
+    return [
+        Route("GET /", lambda r: lambda: client.get("/")),
+        Route("GET /cat/", lambda r: lambda: client.get("/cat/")),
+        Route("GET asset (gzip)", lambda r: lambda: client.get(
+            css, headers={"Accept-Encoding": "gzip"})),
+    ]
+
+
+CHAPTERS = {
+    "1_basics": basics,
+    "2_sessions": sessions,
+    "3_SQLAlchemy": sqlalchemy,
+    "4_organization": organization,
+}
+
+
+# -- running -------------------------------------------------------------
+
+
+def measure(route: Route, timer: Timer, requests: int,
+            rng: random.Random) -> None:
+    if route.heavy:
+        requests = max(5, requests // 20)
+    route.prepare(rng)()  # warm-up: first-request set-up, caches
+    timer.spent.clear()
+    samples = []
+    for _ in range(requests):
+        request = route.prepare(rng)
+        start = time.perf_counter()
+        request()
+        samples.append(time.perf_counter() - start)
+    total = sum(samples)
+    q = statistics.quantiles(samples, n=100)
+    split = dict((c, timer.spent[c] / total * 100) for c in CATEGORIES)
+    print(f"  {route.name:<20} {requests / total:8.0f}/s  "
+          f"p50={q[49] * 1000:7.2f}  p95={q[94] * 1000:7.2f}  "
+          f"p99={q[98] * 1000:7.2f} ms   "
+          + "  ".join(f"{c} {p:4.1f}%" for c, p in split.items())
+          + f"  other {100 - sum(split.values()) + split['sql']:4.1f}%")
+
+
+def run(chapters: List[str], requests: int, users: int) -> None:
+    rng = random.Random(0)
+    for chapter in chapters:
+        timer = Timer()
+        routes = CHAPTERS[chapter](timer, users)
+        print(chapter)
+        for route in routes:
+            measure(route, timer, requests, rng)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--apps", nargs="+", choices=list(CHAPTERS),
+                        default=list(CHAPTERS))
+    parser.add_argument("--requests", type=int, default=500,
+                        help="requests per route")
+    parser.add_argument("--users", type=int, default=10_000,
+                        help="users seeded into the SQLAlchemy app")
+    args = parser.parse_args()
+    run(args.apps, args.requests, args.users)
@@ -0,0 +1,77 @@
+"""
+Benchmark: inserting users with save_user() versus UserRepository.
+
+    per call    save_user(): connect, insert, commit, close - every row
+    pooled      UserRepository.save_user(): pooled connection, one commit
+                per row
+    bulk        UserRepository.save_users(): executemany, one commit per
+                chunk
+
+The per-call path does an fsync per row, so it is timed on
+`--per-call-rows` rows and reported per row alongside the rest.
+
+Run with:
+    python bench_sqlite.py --rows 100000 --per-call-rows 2000
+"""
+
+import argparse
+import os
+import sqlite3
+import tempfile
+import time
+
+from sqlite import DURABILITY, UserRepository, save_user
+
+
+def users(n):
+    return ((f"user{i}", i % 100) for i in range(n))
+
+
+def report(label, rows, seconds, total_rows):
+    print(f"{label:<22} {rows:>7} rows  {rows / seconds:10.0f} rows/s  "
+          f"{seconds / rows * 1e6:8.1f} us/row  "
+          f"~{seconds / rows * total_rows:7.2f} s for {total_rows}")
+
+
+def per_call(rows, total_rows):
+    # save_user() always writes ./users.db, with SQLite's default journal
+    sqlite3.connect("users.db").execute(
+        "CREATE TABLE users (name TEXT, age INTEGER)").connection.close()
+    start = time.perf_counter()
+    for name, age in users(rows):
+        save_user(name, age)
+    report("per call", rows, time.perf_counter() - start, total_rows)
+
+
+def pooled(rows, total_rows, durability):
+    with UserRepository(f"pooled-{durability}.db",
+                        durability=durability) as repo:
+        repo.save_user("warm", 0)
+        start = time.perf_counter()
+        for name, age in users(rows):
+            repo.save_user(name, age)
+        report(f"pooled ({durability})", rows, time.perf_counter() - start,
+               total_rows)
+
+
+def bulk(rows, durability):
+    with UserRepository(f"bulk-{durability}.db",
+                        durability=durability) as repo:
+        repo.save_user("warm", 0)
+        start = time.perf_counter()
+        assert repo.save_users(users(rows)) == rows
+        report(f"bulk ({durability})", rows, time.perf_counter() - start,
+               rows)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--per-call-rows", type=int, default=2000)
+    args = parser.parse_args()
+    os.chdir(tempfile.mkdtemp())
+    per_call(args.per_call_rows, args.rows)
+    for durability in DURABILITY:
+        pooled(args.per_call_rows, args.rows, durability)
+    for durability in DURABILITY:
+        bulk(args.rows, durability)
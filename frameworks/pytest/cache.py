@@ -0,0 +1,206 @@
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+
+"""
+A TTL cache for slow lookups (HTTP calls, mostly) that also protects the
+thing behind it from a stampede:
+
+    fresh          younger than `ttl`: served from memory
+    stale          older than `ttl` but younger than `ttl + stale_ttl`:
+                   served from memory *and* refreshed in the background
+                   (stale-while-revalidate) - nobody waits
+    missing        loaded by the first caller; everyone who asks for the
+                   same key meanwhile waits for that one load instead of
+                   starting their own (single-flight)
+
+Thread code calls `get(key, loader)`, asyncio code `await aget(key,
+loader)` with a loader that returns an awaitable. Both share the stored
+values; loads are coalesced among thread callers and among async callers
+separately. A failed load is not cached: everyone waiting on it gets the
+exception, and the next caller tries again. A failed background refresh
+leaves the stale value in place until it runs out.
+
+The TTL can be set per call, or worked out from the loaded value - a
+"no such thing" answer, say, can be kept for less time than a real one.
+
+`stats()` counts hits, misses, coalesced waits, stale hits, refreshes
+and errors.
+"""
+
+
+class _Entry:
+    __slots__ = ("value", "fresh_until", "stale_until")
+
+    def __init__(self, value, fresh_until, stale_until):
+        self.value = value
+        self.fresh_until = fresh_until
+        self.stale_until = stale_until
+
+
+class _Flight:
+    """ One load in progress, for thread callers """
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class SingleFlightCache:
+    def __init__(self, ttl=60.0, stale_ttl=0.0, max_entries=1024,
+                 clock=time.monotonic):
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.max_entries = max_entries
+        self.clock = clock
+        self.hits = self.misses = self.coalesced = 0
+        self.stale_hits = self.refreshes = self.errors = 0
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> _Entry, oldest first
+        self._flights = {}  # key -> _Flight
+        self._async_flights = {}  # key -> (event loop, Task)
+        self._background = set()  # keeps refresh tasks from being GC'd
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses,
+                "coalesced": self.coalesced, "stale_hits": self.stale_hits,
+                "refreshes": self.refreshes, "errors": self.errors}
+
+    def invalidate(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def _lookup(self, key, now):
+        """ (fresh value found, entry); call with the lock held """
+        entry = self._entries.get(key)
+        if entry is None or now >= entry.stale_until:
+            return False, None
+        self._entries.move_to_end(key)
+        if now < entry.fresh_until:
+            self.hits += 1
+            return True, entry
+        self.stale_hits += 1
+        return False, entry
+
+    def _store(self, key, value, ttl, stale_ttl):
+        """ Call with the lock held """
+        ttl = self.ttl if ttl is None else ttl
+        if callable(ttl):
+            ttl = ttl(value)
+        stale_ttl = self.stale_ttl if stale_ttl is None else stale_ttl
+        now = self.clock()
+        self._entries[key] = _Entry(value, now + ttl, now + ttl + stale_ttl)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    # -- threads ---------------------------------------------------------
+
+    def get(self, key, loader, ttl=None, stale_ttl=None):
+        """ The cached value for key, calling loader() to (re)load it;
+        ttl and stale_ttl override the defaults for this key, and ttl may
+        also be a function of the loaded value """
+        with self._lock:
+            fresh, entry = self._lookup(key, self.clock())
+            if fresh:
+                return entry.value
+            flight = self._flights.get(key)
+            if entry is not None:  # stale: answer now, refresh behind
+                if flight is None:
+                    self.refreshes += 1
+                    flight = self._flights[key] = _Flight()
+                    threading.Thread(
+                        target=self._load,
+                        args=(key, loader, flight, ttl, stale_ttl),
+                        daemon=True).start()
+                return entry.value
+            leader = flight is None
+            if leader:
+                self.misses += 1
+                flight = self._flights[key] = _Flight()
+            else:
+                self.coalesced += 1
+        if leader:
+            self._load(key, loader, flight, ttl, stale_ttl)
+        else:
+            flight.done.wait()
+        if flight.error is not None:
+            raise flight.error
+        return flight.value
+
+    def _load(self, key, loader, flight, ttl, stale_ttl):
+        try:
+            value = loader()
+        except BaseException as exc:  # waiters must hear about it, always
+            with self._lock:
+                self.errors += 1
+                del self._flights[key]
+            flight.error = exc
+        else:
+            with self._lock:
+                # Store and retire the flight together, so no caller can
+                # find neither and load again.
+                self._store(key, value, ttl, stale_ttl)
+                del self._flights[key]
+            flight.value = value
+        flight.done.set()
+
+    # -- asyncio ---------------------------------------------------------
+
+    async def aget(self, key, loader, ttl=None, stale_ttl=None):
+        """ get() for coroutines; loader() must return an awaitable """
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            fresh, entry = self._lookup(key, self.clock())
+            if fresh:
+                return entry.value
+            flight = self._async_flights.get(key)
+            if flight is not None and flight[0] is not loop:
+                flight = None  # left over from another event loop
+            if entry is not None:
+                if flight is None:
+                    self.refreshes += 1
+                    task = self._start(loop, key, loader, ttl, stale_ttl)
+                    self._background.add(task)
+                    task.add_done_callback(self._background.discard)
+                return entry.value
+            if flight is None:
+                self.misses += 1
+                task = self._start(loop, key, loader, ttl, stale_ttl)
+            else:
+                self.coalesced += 1
+                task = flight[1]
+        # shield: a caller that gives up must not cancel everyone's load
+        return await asyncio.shield(task)
+
+    def _start(self, loop, key, loader, ttl, stale_ttl):
+        """ Call with the lock held """
+        task = loop.create_task(self._aload(key, loader, ttl, stale_ttl))
+        self._async_flights[key] = (loop, task)
+        # A refresh nobody awaits must not log "exception never retrieved"
+        task.add_done_callback(
+            lambda t: t.cancelled() or t.exception())
+        return task
+
+    async def _aload(self, key, loader, ttl, stale_ttl):
+        task = asyncio.current_task()
+        try:
+            value = await loader()
+        except Exception:
+            with self._lock:
+                self.errors += 1
+            raise
+        else:
+            with self._lock:
+                self._store(key, value, ttl, stale_ttl)
+            return value
+        finally:
+            with self._lock:
+                if self._async_flights.get(key, (None, None))[1] is task:
+                    del self._async_flights[key]
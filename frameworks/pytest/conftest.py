@@ -0,0 +1,18 @@
+import time
+
+import pytest
+
+
+@pytest.fixture
+def wait_until():
+    """ wait_until(condition) polls condition() until it is true, and fails
+    the test if that takes longer than `timeout` seconds """
+
+    def wait(condition, timeout=5):
+        deadline = time.monotonic() + timeout
+        while not condition():
+            if time.monotonic() > deadline:
+                pytest.fail("gave up waiting")
+            time.sleep(0.001)
+
+    return wait
@@ -1,18 +1,207 @@
+from collections.abc import MutableMapping
+
+
 class Database:
     """ Simulates a basic user database """
     """ Make sure you reset the database between runs of tests """
 
-    def __init__(self):
-        self.data = {}  # Simulating an in-memory database
+    def __init__(self, index_names=False):
+        # Optional secondary index: name -> frozenset of user ids
+        self.index_names = index_names
+        self.data = _Table({}, {} if index_names else None)
+
+    @property
+    def names(self):
+        return self.data.names
 
     def add_user(self, user_id, name):
         if user_id in self.data:
             raise ValueError("User already exists")
         self.data[user_id] = name
 
+    def add_users(self, users):
+        """ Adds many (user_id, name) pairs: all of them, or none """
+        users = list(users)
+        ids = [user_id for user_id, _ in users]
+        if len(set(ids)) != len(ids) or any(i in self.data for i in ids):
+            raise ValueError("User already exists")
+        self.data.update(users)
+
     def get_user(self, user_id):
         return self.data.get(user_id, None)
 
+    def get_users(self, user_ids):
+        """ One name (or None) per id, in order """
+        get = self.data.get
+        return [get(user_id) for user_id in user_ids]
+
+    def find_by_name(self, name):
+        """ Ids of every user with this name """
+        names = self.names
+        if names is not None:
+            return set(names.get(name, ()))
+        return {i for i, n in self.data.items() if n == name}
+
     def delete_user(self, user_id):
-        if user_id in self.data:
-            del self.data[user_id]
+        self.data.pop(user_id, None)
+
+    def clear(self):
+        self.data.clear()
+
+    def snapshot(self):
+        """ Freezes the current contents so they can be restored later
+
+        Nothing is copied: the current dicts become the read-only base of
+        the snapshot, and this database keeps going on an empty layer of
+        changes on top of them.
+        """
+        snap = Snapshot(_flatten(self.data.rows), _flatten(self.data.names))
+        self.restore(snap)
+        return snap
+
+    def restore(self, snap):
+        """ Goes back to a snapshot; costs the same for 10 rows or 10M """
+        names = None
+        if self.index_names:
+            if snap.names is None:
+                # Taken without an index: build one, once per snapshot.
+                snap.names = _index_of(snap.data)
+            names = _Layer(snap.names)
+        self.data = _Table(_Layer(snap.data), names)
+
+
+class _Table(MutableMapping):
+    """ The users, id -> name; every write, through any method, keeps the
+    name index (if there is one) in step """
+
+    def __init__(self, rows, names):
+        self.rows = rows
+        self.names = names
+        # get() goes straight to the rows; get_users calls it per id.
+        self.get = rows.get
+
+    def __getitem__(self, user_id):
+        return self.rows[user_id]
+
+    def __contains__(self, user_id):
+        return user_id in self.rows
+
+    def __iter__(self):
+        return iter(self.rows)
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __setitem__(self, user_id, name):
+        if self.names is not None:
+            if user_id in self.rows:
+                self._unindex(user_id, self.rows[user_id])
+            self._index(user_id, name)
+        self.rows[user_id] = name
+
+    def __delitem__(self, user_id):
+        name = self.rows[user_id]
+        del self.rows[user_id]
+        if self.names is not None:
+            self._unindex(user_id, name)
+
+    def update(self, *args, **kwargs):
+        if self.names is None:
+            self.rows.update(*args, **kwargs)
+        else:
+            super().update(*args, **kwargs)
+
+    def clear(self):
+        self.rows.clear()
+        if self.names is not None:
+            self.names.clear()
+
+    def _index(self, user_id, name):
+        # Sets are replaced, never changed in place, because a snapshot
+        # may share them.
+        self.names[name] = self.names.get(name, frozenset()) | {user_id}
+
+    def _unindex(self, user_id, name):
+        remaining = self.names[name] - {user_id}
+        if remaining:
+            self.names[name] = remaining
+        else:
+            del self.names[name]
+
+
+def _index_of(rows):
+    names = {}
+    for user_id, name in rows.items():
+        names.setdefault(name, set()).add(user_id)
+    return {name: frozenset(ids) for name, ids in names.items()}
+
+
+class Snapshot:
+    """ Frozen database contents; share one between as many tests as you
+    like, each restore() gets its own copy-on-write view of it """
+
+    def __init__(self, data, names):
+        self.data = data
+        self.names = names
+
+
+def _flatten(mapping):
+    if isinstance(mapping, _Layer):
+        if not mapping.top and not mapping.removed:
+            return mapping.base  # unchanged since the last restore
+        return dict(mapping.items())
+    return mapping
+
+
+class _Layer(MutableMapping):
+    """ A dict that reads through to a shared `base` it never modifies:
+    writes go to `top`, deletes of base keys are remembered in `removed` """
+
+    def __init__(self, base):
+        self.base = base
+        self.top = {}
+        self.removed = set()
+        self._size = len(base)
+
+    def __getitem__(self, key):
+        if key in self.top:
+            return self.top[key]
+        if key in self.removed:
+            raise KeyError(key)
+        return self.base[key]
+
+    def __contains__(self, key):
+        return key in self.top or (key in self.base
+                                   and key not in self.removed)
+
+    def get(self, key, default=None):
+        return self[key] if key in self else default
+
+    def __setitem__(self, key, value):
+        if key not in self:
+            self._size += 1
+        self.top[key] = value
+        self.removed.discard(key)
+
+    def __delitem__(self, key):
+        if key not in self:
+            raise KeyError(key)
+        self.top.pop(key, None)
+        if key in self.base:
+            self.removed.add(key)
+        self._size -= 1
+
+    def __iter__(self):
+        yield from self.top
+        for key in self.base:
+            if key not in self.top and key not in self.removed:
+                yield key
+
+    def __len__(self):
+        return self._size
+
+    def clear(self):
+        self.base = {}
+        self.top = {}
+        self.removed = set()
+        self._size = 0
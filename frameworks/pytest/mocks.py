@@ -1,9 +1,31 @@
+import asyncio
+
 import requests
 
+from cache import SingleFlightCache
 
-def get_weather(city):
+""" Weather changes slowly and cities are few, so answers are cached for
+five minutes and may be served up to ten minutes stale while a fresh one
+is fetched in the background. When a spike of requests asks for the same
+city at once, one of them fetches it and the rest wait for that answer
+(see cache.py). """
+
+weather_cache = SingleFlightCache(ttl=300, stale_ttl=600)
+
+
+def _fetch_weather(city):
     response = requests.get(f"https://api.weather.com/v1/{city}")
     if response.status_code == 200:
         return response.json()
     else:
         raise ValueError("Could not fetch weather data")
+
+
+def get_weather(city):
+    return weather_cache.get(city, lambda: _fetch_weather(city))
+
+
+async def get_weather_async(city):
+    # requests blocks, so the fetch runs on a worker thread
+    return await weather_cache.aget(
+        city, lambda: asyncio.to_thread(_fetch_weather, city))
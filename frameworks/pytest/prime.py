@@ -1,3 +1,13 @@
+import threading
+from itertools import compress
+from math import isqrt
+
+try:
+    import numpy as np
+except ImportError:  # the NumPy path is optional
+    np = None
+
+
 def is_prime(n):
     if n < 2:
         return False
@@ -5,3 +15,198 @@ def is_prime(n):
         if n % i == 0:
             return False
     return True
+
+
+"""
+Batch primality
+===============
+`is_prime` trial-divides up to sqrt(n): fine for 25, hopeless for
+millions of numbers or for 64-bit ones (2**32 divisions each).
+`are_prime(numbers)` gives exactly the same answers, choosing per input:
+
+    dense, small   the numbers cover much of 0..max(numbers): sieve up to
+                   max once (cached, and extended segment by segment when
+                   a later batch needs more), then every answer is a
+                   lookup
+    anything else  a lookup if the cached sieve already covers n, else
+                   deterministic Miller-Rabin
+    NumPy arrays   the same, vectorized: lookups as one fancy index and
+                   Miller-Rabin on whole arrays for n < 2**32 (where
+                   x * x still fits in uint64); bigger ones one by one
+
+Miller-Rabin with the first 13 primes as witnesses is exact below
+3.3 * 10**24, which covers every 64-bit number with room to spare.
+"""
+
+SIEVE_MAX = 1 << 24  # largest cached sieve: 16 MB of flags
+SEGMENT = 1 << 20  # sieve this many numbers at a time
+DENSE = 32  # sieve when max(numbers) <= DENSE * len(numbers)
+MR_LIMIT = 3_317_044_064_679_887_385_961_981
+_WITNESSES = (2, 3, 5, 7, 11, 13, 17, 19, 23, 29, 31, 37, 41)
+
+
+def is_prime_mr(n):
+    """ Deterministic Miller-Rabin for n < MR_LIMIT """
+    if n < 2:
+        return False
+    if n >= MR_LIMIT:
+        raise ValueError("Miller-Rabin is only exact below MR_LIMIT")
+    for p in _WITNESSES:
+        if n % p == 0:
+            return n == p
+    d, s = n - 1, 0
+    while d % 2 == 0:
+        d //= 2
+        s += 1
+    for a in _WITNESSES:
+        x = pow(a, d, n)
+        if x == 1 or x == n - 1:
+            continue
+        for _ in range(s - 1):
+            x = x * x % n
+            if x == n - 1:
+                break
+        else:
+            return False
+    return True
+
+
+class _Sieve:
+    """ flags[n] == 1 iff n is prime, for 0 <= n < limit """
+
+    def __init__(self):
+        self.flags = bytearray(b"\x00\x00\x01\x01")
+        self._lock = threading.Lock()
+
+    @property
+    def limit(self):
+        return len(self.flags)
+
+    def extend(self, limit):
+        limit = min(limit, SIEVE_MAX)
+        with self._lock:
+            while self.limit < limit:
+                # One segment at a time, and never past limit**2, so the
+                # primes up to sqrt(hi) are always already sieved.
+                hi = min(limit, self.limit ** 2, self.limit + SEGMENT)
+                self._sieve_segment(self.limit, hi)
+
+    def _sieve_segment(self, lo, hi):
+        segment = bytearray(b"\x01") * (hi - lo)
+        root = isqrt(hi - 1)
+        for p in compress(range(root + 1), self.flags[:root + 1]):
+            start = max(p * p, -(-lo // p) * p)
+            segment[start - lo::p] = bytes(len(range(start - lo, hi - lo, p)))
+        # A new object rather than +=: NumPy may be viewing the old one.
+        self.flags = self.flags + segment
+
+    def primes(self, lo, hi):
+        """ Primes in [lo, hi); windows past the cache are sieved alone """
+        if hi > SIEVE_MAX ** 2:
+            raise ValueError("primes_between only sieves below SIEVE_MAX**2")
+        self.extend(hi if hi <= SIEVE_MAX else isqrt(hi) + 1)
+        # One read: another thread's extend() swaps in longer flags.
+        flags = self.flags
+        limit = len(flags)
+        if hi <= limit:
+            return list(compress(range(lo, hi), flags[lo:hi]))
+        primes = list(compress(range(lo, limit), flags[lo:]))
+        lo = max(lo, limit)
+        for start in range(lo, hi, SEGMENT):
+            end = min(start + SEGMENT, hi)
+            segment = bytearray(b"\x01") * (end - start)
+            for p in compress(range(isqrt(end - 1) + 1), flags):
+                first = max(p * p, -(-start // p) * p)
+                segment[first - start::p] = bytes(
+                    len(range(first - start, end - start, p)))
+            primes.extend(compress(range(start, end), segment))
+        return primes
+
+
+_sieve = _Sieve()
+
+
+def primes_between(lo, hi):
+    """ Every prime p with lo <= p < hi, for hi <= SIEVE_MAX**2 """
+    return _sieve.primes(max(lo, 0), hi)
+
+
+def are_prime(numbers):
+    """ is_prime for every number, but fast
+
+    Returns a list of bools, or a bool array for a NumPy array.
+    """
+    if np is not None and isinstance(numbers, np.ndarray):
+        return _are_prime_array(numbers)
+    numbers = list(numbers)
+    if not numbers:
+        return []
+    top = max(numbers)
+    if top < SIEVE_MAX and top <= DENSE * len(numbers):
+        _sieve.extend(top + 1)
+    # One read: another thread's extend() swaps in longer flags.
+    flags = _sieve.flags
+    limit = len(flags)
+    return [bool(flags[n]) if 0 <= n < limit else is_prime_mr(n)
+            for n in numbers]
+
+
+def _are_prime_array(numbers):
+    if numbers.dtype.kind not in "iu":
+        raise TypeError("are_prime needs an integer array")
+    flat = numbers.ravel()
+    result = np.zeros(flat.shape, dtype=bool)
+    if flat.size == 0:
+        return result.reshape(numbers.shape)
+    top = int(flat.max())
+    if top < SIEVE_MAX and top <= DENSE * flat.size:
+        _sieve.extend(top + 1)
+    flags = np.frombuffer(_sieve.flags, dtype=np.uint8)
+    positive = flat >= 2
+    small = positive & (flat < flags.size)
+    result[small] = flags[flat[small]].astype(bool)
+    mid = positive & ~small & (flat < 2**32)
+    result[mid] = _mr_u32(flat[mid].astype(np.uint64))
+    for i in np.flatnonzero(positive & (flat >= 2**32)):
+        result[i] = is_prime_mr(int(flat[i]))
+    return result.reshape(numbers.shape)
+
+
+def _mr_u32(n):
+    """ Miller-Rabin on a uint64 array of n < 2**32; witnesses 2, 7 and 61
+    are exact below 4,759,123,141 """
+    # Most composites have a small factor: weed them out with a few cheap
+    # vectorized remainders, and run the expensive test on the rest.
+    result = np.ones(n.shape, dtype=bool)
+    for p in _sieve.primes(2, 200):
+        result &= (n % np.uint64(p) != 0) | (n == p)
+    todo = np.flatnonzero(result & (n >= 200 ** 2))
+    m = n[todo]
+    d = m - np.uint64(1)
+    s = np.zeros(m.shape, dtype=np.int64)
+    while True:
+        even = (d & np.uint64(1)) == 0
+        if not even.any():
+            break
+        d = np.where(even, d >> np.uint64(1), d)
+        s += even
+    ok_all = np.ones(m.shape, dtype=bool)
+    for a in (2, 7, 61):
+        x = _powmod(np.uint64(a) % m, d, m)
+        ok = (x == 1) | (x == m - np.uint64(1))
+        for r in range(1, int(s.max(initial=0))):
+            x = x * x % m
+            ok |= (x == m - np.uint64(1)) & (r < s)
+        ok_all &= ok
+    result[todo] = ok_all
+    return result
+
+
+def _powmod(base, exponent, n):
+    result = np.ones(n.shape, dtype=np.uint64)
+    while exponent.any():
+        odd = (exponent & np.uint64(1)) == 1
+        result = np.where(odd, result * base % n, result)
+        base = base * base % n
+        exponent = exponent >> np.uint64(1)
+    return result
@@ -1,14 +1,169 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
 import requests
+from requests.adapters import HTTPAdapter
+
+from cache import SingleFlightCache
+
+""" Looking users up one at a time with a bare requests.get opens a new
+connection (TCP + TLS handshake) per user, and waits for each answer
+before asking the next question. APIClient keeps connections open in a
+pooled session, asks up to `max_concurrency` questions at once in
+get_users, and remembers answers for `cache_ttl` seconds - including
+"no such user", for `negative_ttl`, so a missing ID is not fetched
+again on every call. AsyncAPIClient does the same for asyncio code.
+
+The answers live in a SingleFlightCache (see cache.py), so callers
+asking for the same user at once share one request. """
+
+BASE_URL = "https://api.example.com"
+_MISSING = object()  # cached answer for a user the API does not have
+
+
+class _CachedLookups:
+    """ The caching rules, shared by the sync and async clients.
+
+    A closed client still answers from its cache but never fetches: a
+    load, including a stale-while-revalidate refresh the cache starts in
+    the background, raises instead of using the closed connection pool.
+    """
+
+    def __init__(self, base_url, cache_ttl, negative_ttl, cache):
+        self.closed = False
+        self.base_url = base_url.rstrip("/")
+        self.cache_ttl = cache_ttl
+        self.negative_ttl = negative_ttl
+        self.cache = (cache if cache is not None
+                      else SingleFlightCache(max_entries=10_000))
+
+    def _url(self, user_id):
+        return f"{self.base_url}/users/{user_id}"
 
+    def _check_open(self):
+        if self.closed:
+            raise RuntimeError(f"{type(self).__name__} is closed")
 
-class APIClient:
+    def _ttl(self, data):
+        return self.negative_ttl if data is _MISSING else self.cache_ttl
+
+    @staticmethod
+    def _answer(status_code, json):
+        """ Turns a response into user data, _MISSING for a missing user """
+        if status_code == 200:
+            return json()
+        if status_code == 404:
+            return _MISSING
+        raise ValueError("API request failed")  # not cached: try again
+
+    @staticmethod
+    def _user(data):
+        return None if data is _MISSING else data
+
+    @staticmethod
+    def _found(data):
+        if data is None:
+            raise ValueError("API request failed")
+        return data
+
+
+class APIClient(_CachedLookups):
     """ Simulates an external API client. """
 
+    def __init__(self, base_url=BASE_URL, pool_size=10, max_concurrency=8,
+                 timeout=5.0, cache_ttl=60.0, negative_ttl=10.0, cache=None):
+        super().__init__(base_url, cache_ttl, negative_ttl, cache)
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def _fetch(self, user_id):
+        return self._user(self.cache.get(
+            user_id, lambda: self._load(user_id), ttl=self._ttl))
+
+    def _load(self, user_id):
+        self._check_open()
+        response = self.session.get(self._url(user_id), timeout=self.timeout)
+        return self._answer(response.status_code, response.json)
+
     def get_user_data(self, user_id):
-        response = requests.get(f"https://api.example.com/users/{user_id}")
-        if response.status_code == 200:
-            return response.json()
-        raise ValueError("API request failed")
+        return self._found(self._fetch(user_id))
+
+    def get_users(self, user_ids):
+        """ {user_id: data, or None if there is no such user}
+
+        A failed lookup (a server error, a dropped connection) fails the
+        whole call, but only after every other lookup has finished and
+        been cached: asking again fetches just the ones that failed.
+        """
+        user_ids = list(dict.fromkeys(user_ids))  # each ID once, in order
+        with ThreadPoolExecutor(self.max_concurrency) as pool:
+            return dict(zip(user_ids, pool.map(self._fetch, user_ids)))
+
+    def close(self):
+        self.closed = True
+        self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class AsyncAPIClient(_CachedLookups):
+    """ APIClient for asyncio code, on an httpx connection pool """
+
+    def __init__(self, base_url=BASE_URL, pool_size=10, max_concurrency=8,
+                 timeout=5.0, cache_ttl=60.0, negative_ttl=10.0, cache=None):
+        import httpx  # only the async client needs it
+
+        super().__init__(base_url, cache_ttl, negative_ttl, cache)
+        self.max_concurrency = max_concurrency
+        self.client = httpx.AsyncClient(
+            timeout=timeout, limits=httpx.Limits(max_connections=pool_size))
+
+    async def _fetch(self, user_id):
+        return self._user(await self.cache.aget(
+            user_id, lambda: self._load(user_id), ttl=self._ttl))
+
+    async def _load(self, user_id):
+        self._check_open()
+        response = await self.client.get(self._url(user_id))
+        return self._answer(response.status_code, response.json)
+
+    async def get_user_data(self, user_id):
+        return self._found(await self._fetch(user_id))
+
+    async def get_users(self, user_ids):
+        user_ids = list(dict.fromkeys(user_ids))
+        limit = asyncio.Semaphore(self.max_concurrency)
+
+        async def fetch(user_id):
+            async with limit:
+                return await self._fetch(user_id)
+
+        # Like APIClient.get_users: let every lookup finish (and be
+        # cached) before the first error is raised.
+        results = await asyncio.gather(*(fetch(i) for i in user_ids),
+                                       return_exceptions=True)
+        for result in results:
+            if isinstance(result, BaseException):
+                raise result
+        return dict(zip(user_ids, results))
+
+    async def aclose(self):
+        self.closed = True
+        await self.client.aclose()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.aclose()
 
 
 class UserService:
@@ -21,3 +176,10 @@ class UserService:
         """ Fetches a user and returns their username in uppercase """
         user_data = self.api_client.get_user_data(user_id)
         return user_data["name"].upper()
+
+    def get_usernames(self, user_ids):
+        """ Like get_username for many users, in one batch; a missing user
+        gives None """
+        users = self.api_client.get_users(user_ids)
+        return {user_id: None if data is None else data["name"].upper()
+                for user_id, data in users.items()}
@@ -0,0 +1,175 @@
+import asyncio
+import threading
+
+import pytest
+from cache import SingleFlightCache
+
+"""
+The clock is a list we move by hand, so "five minutes later" takes no
+time at all. Loaders that must be slow wait on an Event instead of
+sleeping, so every caller is surely waiting before the load finishes.
+"""
+
+
+@pytest.fixture
+def now():
+    return [0.0]
+
+
+@pytest.fixture
+def cache(now):
+    return SingleFlightCache(ttl=10, stale_ttl=20, clock=lambda: now[0])
+
+
+def test_fresh_values_come_from_memory(cache, now):
+    calls = []
+    load = lambda: calls.append(1) or len(calls)  # noqa: E731
+    assert cache.get("k", load) == 1
+    now[0] = 9
+    assert cache.get("k", load) == 1
+    now[0] = 31  # past ttl + stale_ttl: load again, and wait for it
+    assert cache.get("k", load) == 2
+    assert cache.stats() == {"hits": 1, "misses": 2, "coalesced": 0,
+                             "stale_hits": 0, "refreshes": 0, "errors": 0}
+
+
+def test_per_key_ttl(cache, now):
+    cache.get("short", lambda: 1, ttl=1, stale_ttl=0)
+    cache.get("long", lambda: 1)
+    now[0] = 2
+    assert cache.get("short", lambda: 2) == 2
+    assert cache.get("long", lambda: 2) == 1
+
+
+def test_ttl_can_depend_on_the_value(cache, now):
+    by_value = lambda value: 1 if value is None else 100  # noqa: E731
+    cache.get("missing", lambda: None, ttl=by_value, stale_ttl=0)
+    cache.get("found", lambda: "x", ttl=by_value, stale_ttl=0)
+    now[0] = 2
+    assert cache.get("missing", lambda: "now here") == "now here"
+    assert cache.get("found", lambda: "y") == "x"
+
+
+def test_full_cache_drops_the_least_recently_used(now):
+    cache = SingleFlightCache(max_entries=2, clock=lambda: now[0])
+    for key in "abc":
+        cache.get(key, key.upper)
+    cache.get("b", lambda: "reloaded")  # a hit makes it the newest
+    cache.get("d", lambda: "D")
+    assert [cache.get(k, lambda: None) for k in "bd"] == ["B", "D"]
+    assert cache.get("a", lambda: "gone") == "gone"
+
+
+def test_concurrent_threads_share_one_load(cache, wait_until):
+    release = threading.Event()
+    calls = []
+
+    def slow_load():
+        calls.append(1)
+        release.wait(5)
+        return "value"
+
+    results = []
+    threads = [threading.Thread(
+        target=lambda: results.append(cache.get("k", slow_load)))
+        for _ in range(20)]
+    for t in threads:
+        t.start()
+    # everyone but the leader is waiting
+    wait_until(lambda: cache.coalesced >= 19)
+    release.set()
+    for t in threads:
+        t.join()
+    assert results == ["value"] * 20 and len(calls) == 1
+    assert cache.misses == 1 and cache.coalesced == 19
+
+
+def test_errors_reach_every_waiter_and_are_not_cached(cache, wait_until):
+    release = threading.Event()
+
+    def failing_load():
+        release.wait(5)
+        raise ValueError("down")
+
+    errors = []
+
+    def call():
+        try:
+            cache.get("k", failing_load)
+        except ValueError as exc:
+            errors.append(exc)
+
+    threads = [threading.Thread(target=call) for _ in range(5)]
+    for t in threads:
+        t.start()
+    wait_until(lambda: cache.coalesced >= 4)
+    release.set()
+    for t in threads:
+        t.join()
+    assert len(errors) == 5 and cache.errors == 1
+    assert cache.get("k", lambda: "back") == "back"
+
+
+def test_stale_value_is_served_while_refreshing(cache, now, wait_until):
+    cache.get("k", lambda: "old")
+    now[0] = 15  # stale
+    release = threading.Event()
+    refreshed = threading.Event()
+
+    def refresh():
+        release.wait(5)
+        refreshed.set()
+        return "new"
+
+    assert cache.get("k", refresh) == "old"  # does not wait
+    assert cache.get("k", refresh) == "old"  # no second refresh
+    release.set()
+    refreshed.wait(5)
+    wait_until(lambda: not cache._flights)
+    assert cache.get("k", refresh) == "new"
+    assert cache.refreshes == 1 and cache.stale_hits == 2
+
+
+def test_failed_refresh_keeps_the_stale_value(cache, now, wait_until):
+    cache.get("k", lambda: "old")
+    now[0] = 15
+
+    def broken():
+        raise ValueError("down")
+
+    assert cache.get("k", broken) == "old"
+    wait_until(lambda: not cache._flights)
+    assert cache.get("k", broken) == "old" and cache.errors == 1
+
+
+@pytest.mark.asyncio
+async def test_concurrent_tasks_share_one_load(cache, now):
+    calls = []
+
+    async def slow_load():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return "value"
+
+    results = await asyncio.gather(
+        *(cache.aget("k", slow_load) for _ in range(50)))
+    assert results == ["value"] * 50 and len(calls) == 1
+    assert cache.misses == 1 and cache.coalesced == 49
+
+    now[0] = 15  # stale: served at once, refreshed in a task
+    assert await cache.aget("k", slow_load) == "value"
+    await asyncio.sleep(0.05)
+    assert len(calls) == 2 and cache.refreshes == 1
+
+
+@pytest.mark.asyncio
+async def test_a_cancelled_waiter_does_not_cancel_the_load(cache):
+    async def slow_load():
+        await asyncio.sleep(0.02)
+        return "value"
+
+    impatient = asyncio.ensure_future(cache.aget("k", slow_load))
+    patient = asyncio.ensure_future(cache.aget("k", slow_load))
+    await asyncio.sleep(0)
+    impatient.cancel()
+    assert await patient == "value"
@@ -24,3 +24,96 @@ def test_delete_user(db):
     db.add_user(2, "Bob")
     db.delete_user(2)
     assert db.get_user(2) is None
+
+
+def test_add_users_is_all_or_nothing(db):
+    db.add_users([(1, "Alice"), (2, "Bob")])
+    assert db.get_users([2, 3, 1]) == ["Bob", None, "Alice"]
+    with pytest.raises(ValueError, match="User already exists"):
+        db.add_users([(3, "Carol"), (1, "Alice again")])
+    with pytest.raises(ValueError, match="User already exists"):
+        db.add_users([(4, "Dan"), (4, "Dan")])
+    assert db.get_users([3, 4]) == [None, None]
+
+
+""" Seeding a big database for every test is slow. Seed it once per
+module, take a snapshot, and let every test restore it: restoring copies
+nothing, and what one test changes the next one never sees. """
+
+
+@pytest.fixture(scope="module")
+def seeded():
+    database = Database(index_names=True)
+    database.add_users((i, f"user{i % 1000}") for i in range(100_000))
+    return database.snapshot()
+
+
+@pytest.fixture
+def big_db(seeded):
+    database = Database(index_names=True)
+    database.restore(seeded)
+    return database
+
+
+def test_changes_stay_out_of_the_snapshot(big_db, seeded):
+    big_db.delete_user(5)
+    big_db.add_user(100_000, "user5")
+    big_db.data[7] = "renamed"
+    assert big_db.get_users([5, 7, 100_000]) == [None, "renamed", "user5"]
+    assert len(big_db.data) == 100_000
+    fresh = Database()
+    fresh.restore(seeded)
+    assert fresh.get_users([5, 7, 100_000]) == ["user5", "user7", None]
+
+
+def test_clear_does_not_touch_the_snapshot(big_db, seeded):
+    big_db.data.clear()
+    assert big_db.get_user(1) is None and len(big_db.data) == 0
+    big_db.restore(seeded)
+    assert big_db.get_user(1) == "user1"
+
+
+def test_snapshot_of_a_restored_database(big_db):
+    big_db.add_user(-1, "new")
+    snap = big_db.snapshot()
+    big_db.delete_user(-1)
+    big_db.restore(snap)
+    assert big_db.get_user(-1) == "new"
+
+
+def test_name_index_follows_writes(big_db):
+    assert big_db.find_by_name("user5") == set(range(5, 100_000, 1000))
+    big_db.delete_user(5)
+    big_db.add_user(-5, "user5")
+    expected = set(range(1005, 100_000, 1000)) | {-5}
+    assert big_db.find_by_name("user5") == expected
+    unindexed = Database()
+    unindexed.add_users(big_db.data.items())
+    assert unindexed.find_by_name("user5") == expected
+
+
+def test_name_index_follows_direct_writes(big_db):
+    big_db.data[5] = "renamed"
+    assert 5 not in big_db.find_by_name("user5")
+    assert big_db.find_by_name("renamed") == {5}
+    del big_db.data[1005]
+    assert 1005 not in big_db.find_by_name("user5")
+    big_db.data.clear()
+    assert big_db.find_by_name("user5") == set()
+    assert big_db.find_by_name("renamed") == set()
+
+
+def test_restoring_an_unindexed_snapshot_keeps_the_index(seeded):
+    plain = Database()
+    plain.add_users([(1, "a"), (2, "b"), (3, "a")])
+    snap = plain.snapshot()
+    indexed = Database(index_names=True)
+    indexed.restore(snap)
+    assert indexed.data.names is not None
+    assert indexed.find_by_name("a") == {1, 3}
+    indexed.data[1] = "b"
+    assert indexed.find_by_name("a") == {3}
+    assert indexed.find_by_name("b") == {1, 2}
+    plain.restore(seeded)
+    assert plain.data.names is None
+    assert plain.find_by_name("user5") == set(range(5, 100_000, 1000))
@@ -8,8 +8,21 @@ which is what a unit test is meant to do.
 TODO: What is an upstream dependency? Downstream?
 """
 
+import asyncio
+import threading
+
 import pytest
-from mocks import get_weather
+import mocks
+from cache import SingleFlightCache
+from mocks import get_weather, get_weather_async
+
+
+@pytest.fixture(autouse=True)
+def weather_cache(monkeypatch):
+    """ get_weather caches; every test starts with an empty cache """
+    cache = SingleFlightCache(ttl=300, stale_ttl=600)
+    monkeypatch.setattr(mocks, "weather_cache", cache)
+    return cache
 
 
 def test_get_weather(mocker):
@@ -27,3 +40,56 @@ def test_get_weather(mocker):
     # Assertions
     assert result == {"tempurature": 25, "condition": "Sunny"}
     mock_get.assert_called_once_with("https://api.weather.com/v1/Dubai")
+
+
+def test_a_spike_for_one_city_makes_one_request(mocker, weather_cache,
+                                                 wait_until):
+    release = threading.Event()
+
+    def slow_get(url):
+        release.wait(5)  # hold the request until the whole spike waits
+        response = mocker.Mock(status_code=200)
+        response.json.return_value = {"condition": "Rain"}
+        return response
+
+    mock_get = mocker.patch("mocks.requests.get", side_effect=slow_get)
+    results = []
+    threads = [threading.Thread(
+        target=lambda: results.append(get_weather("London")))
+        for _ in range(100)]
+    for t in threads:
+        t.start()
+    wait_until(lambda: weather_cache.coalesced >= 99)
+    release.set()
+    for t in threads:
+        t.join()
+
+    assert results == [{"condition": "Rain"}] * 100
+    mock_get.assert_called_once_with("https://api.weather.com/v1/London")
+    assert get_weather("London") == {"condition": "Rain"}  # from memory
+    assert weather_cache.stats()["hits"] == 1
+
+
+def test_failures_are_not_cached(mocker):
+    mock_get = mocker.patch("mocks.requests.get")
+    mock_get.return_value.status_code = 503
+    with pytest.raises(ValueError, match="Could not fetch weather data"):
+        get_weather("Oslo")
+    mock_get.return_value.status_code = 200
+    mock_get.return_value.json.return_value = {"condition": "Snow"}
+    assert get_weather("Oslo") == {"condition": "Snow"}
+    assert mock_get.call_count == 2
+
+
+@pytest.mark.asyncio
+async def test_async_callers_share_one_request(mocker, weather_cache):
+    mock_get = mocker.patch("mocks.requests.get")
+    mock_get.return_value.status_code = 200
+    mock_get.return_value.json.return_value = {"condition": "Sunny"}
+
+    results = await asyncio.gather(
+        *(get_weather_async("Dubai") for _ in range(50)))
+
+    assert results == [{"condition": "Sunny"}] * 50
+    mock_get.assert_called_once_with("https://api.weather.com/v1/Dubai")
+    assert weather_cache.coalesced == 49
@@ -1,5 +1,7 @@
+import random
+
 import pytest
-from prime import is_prime
+from prime import MR_LIMIT, are_prime, is_prime, is_prime_mr, primes_between
 
 
 @pytest.mark.parametrize("num, expected", [
@@ -15,3 +17,68 @@ from prime import is_prime
 def test_is_prime(num, expected):
     """ Parameterization saves us from a lot of typing """
     assert is_prime(num) == expected
+
+
+""" are_prime must agree with is_prime on every input, whichever method
+it picks. No hand-picked table covers that, so these are property tests:
+many seeded random inputs, each checked against is_prime itself. """
+
+def test_are_prime_dense_range_matches_is_prime():
+    numbers = list(range(-10, 50_000))
+    assert are_prime(numbers) == [is_prime(n) for n in numbers]
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_are_prime_sparse_numbers_match_is_prime(seed):
+    rng = random.Random(seed)
+    numbers = [rng.randrange(10**9) for _ in range(100)]
+    numbers += [rng.randrange(10**5) for _ in range(100)]
+    assert are_prime(numbers) == [is_prime(n) for n in numbers]
+
+
+def test_sieve_extends_for_a_bigger_batch():
+    assert are_prime(range(1000)) == [is_prime(n) for n in range(1000)]
+    numbers = range(100_000, 300_000)
+    assert are_prime(numbers) == [is_prime(n) for n in numbers]
+
+
+@pytest.mark.parametrize("n, expected", [
+    (2**61 - 1, True),
+    (2**64 - 59, True),  # largest 64-bit prime
+    (2**64 - 1, False),
+    (561, False),  # Carmichael number
+    (3215031751, False),  # fools Miller-Rabin with witnesses 2, 3, 5, 7
+    (3825123056546413051, False),  # ...and 2 up to 23
+    (4294967291 * 4294967279, False),  # two large prime factors
+])
+def test_are_prime_large_64_bit_numbers(n, expected):
+    assert are_prime([n]) == [expected]
+    assert is_prime_mr(n) == expected
+
+
+def test_miller_rabin_refuses_numbers_it_cannot_settle():
+    with pytest.raises(ValueError):
+        is_prime_mr(MR_LIMIT)
+
+
+def test_primes_between_a_window_past_the_cache():
+    lo = 10**12
+    assert primes_between(lo, lo + 500) == \
+        [n for n in range(lo, lo + 500) if is_prime(n)]
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_numpy_path_matches_is_prime(seed):
+    np = pytest.importorskip("numpy")
+    rng = np.random.default_rng(seed)
+    numbers = np.concatenate([
+        rng.integers(-10, 30_000, 2000),
+        rng.integers(0, 2**32, 2000),
+        rng.integers(2**32, 2**62, 20),
+    ]).reshape(6, -1)
+    result = are_prime(numbers)
+    assert result.shape == numbers.shape and result.dtype == bool
+    assert result.ravel().tolist() == \
+        are_prime(numbers.ravel().tolist())
+    small = numbers[numbers < 10**6]
+    assert are_prime(small).tolist() == [is_prime(int(n)) for n in small]
@@ -1,5 +1,11 @@
+import asyncio
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
 import pytest
-from service import UserService, APIClient
+from cache import SingleFlightCache
+from service import UserService, APIClient, AsyncAPIClient
 
 """
 Here we mock an entire class!!
@@ -23,3 +29,167 @@ def test_get_username_with_mock(mocker):
     # Assertions
     assert result == "LETICE"
     mock_api_client.get_user_data.assert_called_once_with(1)
+
+
+"""
+End to end: the clients talk HTTP to a small stand-in for the real API
+running in a thread on localhost. Users 1-100 exist, /users/500 is a
+server error, anything else is a 404. The server counts the requests it
+gets and the most it ever handled at once. Clearing `release` holds
+every request until the test sets it again, so a test can be sure
+requests overlap instead of hoping they do.
+"""
+
+class StandIn(BaseHTTPRequestHandler):
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            server.requests += 1
+            server.active += 1
+            server.peak = max(server.peak, server.active)
+        server.release.wait(5)
+        user_id = int(self.path.rsplit("/", 1)[-1])
+        if user_id == 500:
+            self.send_response(500)
+            body = b""
+        elif 1 <= user_id <= 100:
+            self.send_response(200)
+            body = json.dumps({"id": user_id, "name": f"user{user_id}"})
+            body = body.encode()
+        else:
+            self.send_response(404)
+            body = b""
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+        with server.lock:
+            server.active -= 1
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def api():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StandIn)
+    server.lock = threading.Lock()
+    server.requests = server.active = server.peak = 0
+    server.release = threading.Event()
+    server.release.set()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    server.url = f"http://127.0.0.1:{server.server_address[1]}"
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def in_thread(function, *args):
+    """ Starts function(*args) in a thread; returns (thread, results) """
+    results = []
+    thread = threading.Thread(
+        target=lambda: results.append(function(*args)), daemon=True)
+    thread.start()
+    return thread, results
+
+
+def test_get_users_fetches_concurrently_within_the_limit(api, wait_until):
+    api.release.clear()
+    with APIClient(api.url, max_concurrency=4) as client:
+        thread, results = in_thread(
+            client.get_users, list(range(1, 21)) + [3, 404])
+        wait_until(lambda: api.active == 4)  # the limit, all held at once
+        api.release.set()
+        thread.join(5)
+    users = results[0]
+    assert users[7] == {"id": 7, "name": "user7"}
+    assert users[404] is None and len(users) == 21
+    assert api.requests == 21  # 3 asked for twice, fetched once
+    assert api.peak == 4
+
+
+def test_cache_remembers_users_and_misses(api):
+    now = [0.0]
+    cache = SingleFlightCache(clock=lambda: now[0])
+    with APIClient(api.url, cache=cache, cache_ttl=60,
+                   negative_ttl=5) as client:
+        service = UserService(client)
+        assert service.get_username(1) == "USER1"
+        assert service.get_usernames([1, 2, 999]) == {
+            1: "USER1", 2: "USER2", 999: None}
+        with pytest.raises(ValueError):
+            client.get_user_data(999)
+        assert api.requests == 3  # 1, 2 and 999 once each
+        now[0] = 6  # the miss has expired, the users have not
+        client.get_users([1, 2, 999])
+        assert api.requests == 4
+
+
+def test_callers_asking_at_once_share_one_request(api, wait_until):
+    api.release.clear()
+    with APIClient(api.url) as client:
+        threads = [in_thread(client.get_user_data, 1)[0] for _ in range(10)]
+        wait_until(lambda: client.cache.coalesced >= 9)
+        api.release.set()
+        for t in threads:
+            t.join(5)
+    assert api.requests == 1 and client.cache.coalesced == 9
+
+
+def test_a_closed_client_does_not_refresh(api, wait_until):
+    now = [0.0]
+    cache = SingleFlightCache(ttl=10, stale_ttl=60, clock=lambda: now[0])
+    with APIClient(api.url, cache=cache, cache_ttl=10) as client:
+        client.get_user_data(1)
+    now[0] = 20  # stale: served, and a refresh would normally start
+    assert client.get_user_data(1) == {"id": 1, "name": "user1"}
+    wait_until(lambda: not cache._flights)
+    assert api.requests == 1 and cache.errors == 1
+    with pytest.raises(RuntimeError, match="closed"):
+        client.get_user_data(2)
+
+
+def test_server_errors_are_not_cached(api):
+    with APIClient(api.url) as client:
+        for _ in range(2):
+            with pytest.raises(ValueError, match="API request failed"):
+                client.get_user_data(500)
+    assert api.requests == 2
+
+
+def test_a_failed_lookup_fails_the_batch_but_keeps_the_rest(api):
+    with APIClient(api.url) as client:
+        with pytest.raises(ValueError, match="API request failed"):
+            client.get_users([1, 2, 500, 3])
+        assert api.requests == 4  # nobody gave up early
+        assert client.get_users([1, 2, 3])[3] == {"id": 3, "name": "user3"}
+        assert api.requests == 4  # and their answers were cached
+
+
+@pytest.mark.asyncio
+async def test_async_client(api, wait_until):
+    api.release.clear()
+    async with AsyncAPIClient(api.url, max_concurrency=5) as client:
+        batch = asyncio.ensure_future(client.get_users(range(1, 31)))
+        # Wait in a thread, so the event loop can keep sending requests
+        await asyncio.to_thread(wait_until, lambda: api.active == 5)
+        api.release.set()
+        users = await batch
+        assert [u["name"] for u in users.values()] == \
+            [f"user{i}" for i in range(1, 31)]
+        assert await client.get_users([404]) == {404: None}
+        assert (await client.get_user_data(30))["id"] == 30  # cached
+        with pytest.raises(ValueError):
+            await client.get_user_data(404)  # negatively cached
+    assert api.requests == 31
+    assert api.peak == 5
+
+
+@pytest.mark.asyncio
+async def test_async_failed_lookup_keeps_the_rest(api):
+    async with AsyncAPIClient(api.url) as client:
+        with pytest.raises(ValueError, match="API request failed"):
+            await client.get_users([1, 500, 2])
+        assert api.requests == 3
+        assert len(await client.get_users([1, 2])) == 2
+    assert api.requests == 3
@@ -1,4 +1,8 @@
-from sqlite import save_user
+import sqlite3
+import threading
+
+import pytest
+from sqlite import UserRepository, save_user
 
 
 def test_save_user(mocker):
@@ -11,3 +15,114 @@ def test_save_user(mocker):
     mock_cursor.execute.assert_called_once_with(
         "INSERT INTO users (name, age) VALUES (?, ?)", ("Alice", 30)
     )
+
+
+""" The repository runs against a real database in pytest's tmp_path:
+what we want to know is whether the rows really land. """
+
+
+@pytest.fixture
+def repo(tmp_path):
+    with UserRepository(str(tmp_path / "users.db"), chunk_size=3) as repo:
+        yield repo
+
+
+def count(repo):
+    with repo.connection() as conn:
+        return conn.execute("SELECT COUNT(*) FROM users").fetchone()[0]
+
+
+def test_save_users_in_chunks(repo):
+    users = ((f"user{i}", i) for i in range(10))  # any iterable will do
+    assert repo.save_users(users) == 10
+    with repo.connection() as conn:
+        rows = conn.execute("SELECT name, age FROM users").fetchall()
+    assert rows == [(f"user{i}", i) for i in range(10)]
+
+
+def test_failed_chunk_rolls_back_only_itself(repo):
+    users = [("a", 1), ("b", 2), ("c", 3), ("d", 4), ("e",)]  # bad row
+    with pytest.raises(sqlite3.ProgrammingError):
+        repo.save_users(users)
+    assert count(repo) == 3  # the first chunk was committed
+    repo.save_user("f", 6)  # and the connection is still usable
+    assert count(repo) == 4
+
+
+def test_connections_are_reused(repo, mocker):
+    connect = mocker.spy(sqlite3, "connect")
+    for i in range(5):
+        repo.save_user("Alice", i)
+    repo.save_users([("Bob", 1)])
+    assert connect.call_count == 1
+
+
+@pytest.mark.parametrize("durability, level", [
+    ("full", 2), ("normal", 1), ("off", 0)])
+def test_durability_modes(tmp_path, durability, level):
+    with UserRepository(str(tmp_path / "u.db"), durability=durability) as r:
+        with r.connection() as conn:
+            assert conn.execute("PRAGMA synchronous").fetchone()[0] == level
+    with pytest.raises(ValueError):
+        UserRepository(durability="sometimes")
+
+
+def borrow_in_thread(repo):
+    """ Runs save_user in a thread; returns (thread, errors) """
+    errors = []
+
+    def run():
+        try:
+            repo.save_user("waiter", 1)
+        except Exception as exc:
+            errors.append(exc)
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    return thread, errors
+
+
+def test_failed_connect_frees_its_slot(tmp_path, mocker):
+    with UserRepository(str(tmp_path / "u.db"), pool_size=1) as repo:
+        mocker.patch.object(repo, "_connect", side_effect=[
+            sqlite3.OperationalError("unable to open database file"),
+            repo._connect()])
+        with pytest.raises(sqlite3.OperationalError):
+            repo.save_user("Alice", 1)
+        thread, errors = borrow_in_thread(repo)
+        thread.join(timeout=5)
+        assert not thread.is_alive() and not errors
+
+
+def test_open_transaction_is_rolled_back_on_return(repo):
+    with repo.connection() as conn:
+        conn.execute("BEGIN")
+        conn.execute("INSERT INTO users VALUES ('a', 1)")
+    with pytest.raises(RuntimeError):
+        with repo.connection() as conn:
+            conn.execute("BEGIN")
+            conn.execute("INSERT INTO users VALUES ('b', 2)")
+            raise RuntimeError
+    with repo.connection() as same:
+        assert same is conn and not same.in_transaction
+    assert count(repo) == 0
+
+
+def test_closed_repository_refuses_work(repo):
+    repo.close()
+    with pytest.raises(sqlite3.ProgrammingError, match="closed"):
+        repo.save_user("Alice", 1)
+    with pytest.raises(sqlite3.ProgrammingError, match="closed"):
+        repo.save_users([("Bob", 2)])
+
+
+def test_close_wakes_waiters_and_closes_borrowed_connections(tmp_path):
+    repo = UserRepository(str(tmp_path / "u.db"), pool_size=1)
+    with repo.connection() as conn:
+        thread, errors = borrow_in_thread(repo)  # waits for conn
+        repo.close()
+        thread.join(timeout=5)
+        assert not thread.is_alive()
+        assert isinstance(errors[0], sqlite3.ProgrammingError)
+    with pytest.raises(sqlite3.ProgrammingError):
+        conn.execute("SELECT 1")